@@ -0,0 +1,100 @@
+"""
+Prazos por requisição e controle de admissão do /predict
+
+O prazo vem do header X-Request-Timeout-Ms (limitado ao padrão do servidor)
+e é conferido entre as etapas de encode e score; com o prazo esgotado ou o
+cliente desconectado o trabalho restante é abandonado.
+
+O controle de admissão estima o custo de cada requisição (caracteres que vão
+passar pelo encoder + vagas pontuadas) e recusa logo na entrada o que não
+cabe na capacidade livre do worker, em vez de enfileirar trabalho que só
+terminaria depois do timeout do cliente.
+"""
+import time
+import threading
+from typing import Optional
+
+
+class RequestCancelled(Exception):
+    """Trabalho da requisição interrompido antes do fim"""
+    reason = "cancelled"
+
+    def __init__(self, stage: str):
+        super().__init__(f"{self.reason} em {stage}")
+        self.stage = stage
+
+
+class DeadlineExceeded(RequestCancelled):
+    reason = "deadline"
+
+
+class ClientDisconnected(RequestCancelled):
+    reason = "disconnect"
+
+
+class Deadline:
+    """Instante limite da requisição (sem limite com timeout_ms <= 0)"""
+
+    def __init__(self, timeout_ms: float, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + timeout_ms / 1000 if timeout_ms > 0 else None
+
+    @classmethod
+    def from_header(cls, header: Optional[str], default_ms: float) -> "Deadline":
+        """Prazo pedido pelo cliente, nunca maior que o padrão do servidor"""
+        try:
+            requested = float(header) if header else 0.0
+        except ValueError:
+            requested = 0.0
+        if requested > 0 and default_ms > 0:
+            return cls(min(requested, default_ms))
+        return cls(requested if requested > 0 else default_ms)
+
+    def remaining(self) -> Optional[float]:
+        """Segundos restantes (None sem prazo)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and self.clock() >= self.expires_at
+
+    def check(self, stage: str):
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+
+class AdmissionController:
+    """Capacidade em unidades de custo compartilhada pelas requisições em andamento"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def fits(self, cost: int) -> bool:
+        """Se a requisição cabe no worker mesmo sem concorrência"""
+        return not self.enabled or cost <= self.capacity
+
+    def try_acquire(self, cost: int) -> bool:
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.in_flight + cost > self.capacity:
+                return False
+            self.in_flight += cost
+            return True
+
+    def release(self, cost: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - cost)
+
+    @property
+    def available(self) -> int:
+        return self.capacity - self.in_flight
@@ -0,0 +1,271 @@
+"""
+Autotune de workers × threads do torch × batch do encoder
+
+Executa o caminho real de encode + score do ModelManager sob carga sintética
+para cada combinação da grade, na máquina atual, e escolhe a configuração de
+maior throughput cujo p95 cabe no SLO de latência. O resultado é emitido
+como variáveis de ambiente lidas na inicialização:
+
+    WEB_CONCURRENCY     -> app/gunicorn_conf.py (número de workers)
+    TORCH_NUM_THREADS   -> startup do worker / post_fork (threads intra-op)
+    ENCODE_BATCH_SIZE   -> ModelManager.encode_batch_size
+
+Uso:
+    python -m app.autotune --slo-ms 300 --output autotune.env
+    docker compose --env-file autotune.env up -d
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.runtime import available_cpus
+
+logger = logging.getLogger(__name__)
+
+# Vocabulário para textos sintéticos quando o catálogo não está disponível
+SYNTHETIC_VOCABULARY = (
+    "desenvolvedor analista engenheiro python java sap sql dados cloud aws azure "
+    "projetos gestão requisitos sistemas suporte infraestrutura redes segurança "
+    "experiência conhecimento inglês avançado equipe cliente negócio processos "
+    "implantação testes integração apis web mobile frontend backend devops"
+).split()
+
+
+def physical_cores() -> int:
+    """Núcleos físicos entre as CPUs disponíveis (ignora irmãos SMT/hyperthreading)"""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return available_cpus()
+
+    cores = set()
+    for cpu in cpus:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = f.read().strip()
+            with open(f"{base}/core_id") as f:
+                core = f.read().strip()
+        except OSError:
+            return available_cpus()
+        cores.add((package, core))
+
+    return max(1, min(len(cores), available_cpus()))
+
+
+def build_grid(cores: int, batch_sizes: List[int],
+               workers: Optional[List[int]] = None,
+               threads: Optional[List[int]] = None) -> List[Tuple[int, int, int]]:
+    """Combinações (workers, threads, batch) que não excedem os núcleos disponíveis"""
+    def powers_of_two(limit):
+        values = []
+        value = 1
+        while value <= limit:
+            values.append(value)
+            value *= 2
+        if limit not in values:
+            values.append(limit)
+        return values
+
+    worker_options = workers or powers_of_two(cores)
+    thread_options = threads or powers_of_two(cores)
+
+    grid = []
+    for n_workers in worker_options:
+        for n_threads in thread_options:
+            if n_workers * n_threads > cores:
+                continue
+            for batch_size in batch_sizes:
+                grid.append((n_workers, n_threads, batch_size))
+    return grid
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por interpolação linear (q entre 0 e 100)"""
+    if not values:
+        return float("inf")
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def select_best(results: List[Dict], slo_ms: float) -> Tuple[Dict, bool]:
+    """Maior throughput dentro do SLO; sem configuração viável, a de menor p95"""
+    feasible = [r for r in results if r["p95_ms"] <= slo_ms]
+    if feasible:
+        best = max(feasible, key=lambda r: (r["throughput_rps"], -r["workers"] * r["threads"]))
+        return best, True
+    return min(results, key=lambda r: r["p95_ms"]), False
+
+
+def format_env(config: Dict) -> str:
+    """Configuração escolhida no formato de arquivo .env"""
+    return (
+        f"WEB_CONCURRENCY={config['workers']}\n"
+        f"TORCH_NUM_THREADS={config['threads']}\n"
+        f"ENCODE_BATCH_SIZE={config['batch_size']}\n"
+    )
+
+
+def synthetic_payloads(manager, n_requests: int, jobs_per_request: int,
+                       cv_words: int, job_words: int, seed: int = 42) -> List[Tuple[str, List[str]]]:
+    """Payloads (texto do candidato, textos das vagas) com tamanhos de produção"""
+    rng = random.Random(seed)
+
+    # Usa textos reais do catálogo quando disponíveis
+    store = getattr(manager, "job_texts", None)
+    catalog = list(store.texts(limit=2000)) if store is not None else []
+    catalog = [text for text in catalog if text]
+    vocabulary = " ".join(catalog).split() or SYNTHETIC_VOCABULARY
+
+    def text(n_words):
+        return " ".join(rng.choice(vocabulary) for _ in range(n_words))
+
+    payloads = []
+    for _ in range(n_requests):
+        jobs = [rng.choice(catalog) if catalog else text(job_words) for _ in range(jobs_per_request)]
+        payloads.append((text(cv_words), jobs))
+    return payloads
+
+
+def run_request(manager, candidate_text: str, job_texts: List[str]):
+    """Mesmo caminho de encode + score do endpoint /predict"""
+    candidate_embedding = manager.generate_embedding(candidate_text)
+    job_embeddings = manager.generate_embeddings(job_texts)
+    manager.calculate_similarities(candidate_embedding, job_embeddings)
+    manager.predict_matches(candidate_embedding, job_embeddings)
+
+
+def _worker_loop(manager, payloads, n_threads, batch_size, duration, start_barrier, results_queue):
+    import torch
+
+    torch.set_num_threads(n_threads)
+    manager.encode_batch_size = batch_size
+
+    # Aquecimento fora da medição
+    run_request(manager, *payloads[0])
+    start_barrier.wait()
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        run_request(manager, *payloads[i % len(payloads)])
+        latencies.append((time.perf_counter() - started) * 1000)
+        i += 1
+
+    results_queue.put(latencies)
+
+
+def benchmark_config(manager, payloads, n_workers: int, n_threads: int,
+                     batch_size: int, duration: float) -> Dict:
+    """Mede throughput e latência de uma configuração com workers em processos (fork)"""
+    import multiprocessing
+
+    context = multiprocessing.get_context("fork")
+    start_barrier = context.Barrier(n_workers + 1)
+    results_queue = context.Queue()
+
+    processes = [
+        context.Process(target=_worker_loop,
+                        args=(manager, payloads[i::n_workers] or payloads, n_threads, batch_size,
+                              duration, start_barrier, results_queue))
+        for i in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+
+    start_barrier.wait()
+    started = time.perf_counter()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results_queue.get())
+    elapsed = time.perf_counter() - started
+
+    for process in processes:
+        process.join()
+
+    return {
+        "workers": n_workers,
+        "threads": n_threads,
+        "batch_size": batch_size,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def _parse_int_list(value: Optional[str]) -> Optional[List[int]]:
+    if not value:
+        return None
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Autotune de workers, threads do torch e batch do encoder")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="SLO de latência p95 por requisição (ms)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga por configuração")
+    parser.add_argument("--jobs-per-request", type=int, default=50)
+    parser.add_argument("--cv-words", type=int, default=400)
+    parser.add_argument("--job-words", type=int, default=120)
+    parser.add_argument("--batch-sizes", default="8,16,32,64")
+    parser.add_argument("--workers", default=None, help="Lista de workers a testar (padrão: potências de 2)")
+    parser.add_argument("--threads", default=None, help="Lista de threads a testar (padrão: potências de 2)")
+    parser.add_argument("--allow-smt", action="store_true",
+                        help="Usa CPUs lógicas em vez de núcleos físicos como limite da grade")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "model"))
+    parser.add_argument("--output", default=None, help="Arquivo .env de saída")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # O processo pai só carrega os modelos; as threads são definidas em cada worker após o fork
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ["MODEL_DIR"] = args.model_dir
+    from app.main import model_manager as manager
+
+    cores = available_cpus() if args.allow_smt else physical_cores()
+    grid = build_grid(cores, _parse_int_list(args.batch_sizes),
+                      _parse_int_list(args.workers), _parse_int_list(args.threads))
+    logger.info(f"{len(grid)} configurações em {cores} núcleos, {args.duration}s cada")
+
+    payloads = synthetic_payloads(manager, 64, args.jobs_per_request, args.cv_words, args.job_words)
+
+    results = []
+    print(f"{'workers':>8} {'threads':>8} {'batch':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for n_workers, n_threads, batch_size in grid:
+        result = benchmark_config(manager, payloads, n_workers, n_threads, batch_size, args.duration)
+        results.append(result)
+        print(f"{n_workers:>8} {n_threads:>8} {batch_size:>6} {result['throughput_rps']:>9.2f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}", flush=True)
+
+    best, within_slo = select_best(results, args.slo_ms)
+    if within_slo:
+        print(f"\nMelhor configuração dentro do SLO de {args.slo_ms:.0f}ms (p95={best['p95_ms']:.1f}ms, "
+              f"{best['throughput_rps']:.2f} req/s):")
+    else:
+        print(f"\nNenhuma configuração atende o SLO de {args.slo_ms:.0f}ms; menor p95 "
+              f"({best['p95_ms']:.1f}ms):")
+
+    env = format_env(best)
+    print(env, end="")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(f"# Gerado por python -m app.autotune (SLO p95={args.slo_ms:.0f}ms, {cores} núcleos)\n")
+            f.write(env)
+        logger.info(f"Configuração salva em {args.output}")
+
+    return 0 if within_slo else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Captura amostrada de tráfego real do /predict
+
+Com CAPTURE_SAMPLE_RATE > 0 uma fração das requisições é registrada
+(payload, headers que mudam a resposta, instante de chegada, duração e
+status, inclusive das recusadas pelo controle de admissão) em arquivos JSON-lines
+comprimidos com gzip. A requisição apenas enfileira o registro; a
+compressão e a escrita acontecem em uma thread em background. Os arquivos
+são lidos por python -m app.replay.
+"""
+import os
+import sys
+import gzip
+import json
+import queue
+import atexit
+import random
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+class TrafficCapture:
+    """Fila limitada + thread que grava capturas em .jsonl.gz rotacionados"""
+
+    def __init__(self, capture_dir: str, sample_rate: float = 0.0, max_queue: int = 1000,
+                 records_per_file: int = 10000, flush_interval: float = 1.0,
+                 seed: Optional[int] = None):
+        self.capture_dir = capture_dir
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.records_per_file = records_per_file
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self.on_drop: Optional[Callable[[], None]] = None
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._random_pid = os.getpid()
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._file = None
+        self._file_records = 0
+        self._file_index = 0
+        self.path: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def should_capture(self) -> bool:
+        """Sorteia se a requisição atual entra na amostra"""
+        if not self.enabled:
+            return False
+        if self._random_pid != os.getpid():
+            self._reseed()
+        return self._random.random() < self.sample_rate
+
+    def _reseed(self):
+        # Workers criados por fork herdam o estado do gerador do master e
+        # sorteariam a mesma sequência; cada processo mistura o próprio pid
+        pid = os.getpid()
+        self._random = random.Random(None if self.seed is None else f"{self.seed}-{pid}")
+        self._random_pid = pid
+
+    def record(self, payload: Dict, received_at: float, duration_ms: float,
+               status_code: int, endpoint: str = "/predict", headers: Optional[Dict[str, str]] = None):
+        """Enfileira uma requisição capturada sem bloquear o chamador"""
+        # Inicia a thread no processo atual (também após fork dos workers)
+        if self._pid != os.getpid():
+            self._start()
+
+        entry = {
+            "ts": received_at,
+            "endpoint": endpoint,
+            "duration_ms": duration_ms,
+            "status": status_code,
+            "payload": payload,
+        }
+        if headers:
+            entry["headers"] = headers
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop()
+
+    def _start(self):
+        os.makedirs(self.capture_dir, exist_ok=True)
+        self._pid = os.getpid()
+        if self._random_pid != self._pid:
+            self._reseed()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._file = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0):
+        """Grava o que está na fila e fecha o arquivo atual"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_file()
+        self._pid = None
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                sys.stderr.write(f"Falha ao gravar captura de tráfego: {e}\n")
+
+    def _write_batch(self, batch):
+        for entry in batch:
+            if self._file is None or self._file_records >= self.records_per_file:
+                self._open_next_file()
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file_records += 1
+            self.written += 1
+        # Sync flush: o arquivo fica legível até o último lote mesmo se o processo morrer
+        self._file.flush()
+
+    def _open_next_file(self):
+        self._close_file()
+        self._file_index += 1
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(
+            self.capture_dir, f"capture-{timestamp}-{os.getpid()}-{self._file_index:04d}.jsonl.gz"
+        )
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._file_records = 0
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,324 @@
+"""
+Monitor de drift em streaming para embeddings e scores
+
+A cada requisição os embeddings de candidatos e vagas atualizam, em O(dimensões)
+por vetor, a média e a variância por dimensão (Welford/Chan) e uma amostra de
+reservatório de tamanho fixo; os scores atualizam histogramas. Periodicamente a
+janela atual é comparada com estatísticas de referência derivadas de
+candidate_embeddings.npy / job_embeddings.npy e a janela é reiniciada.
+
+Com start() a avaliação roda em uma thread em background, fora das
+requisições, e a referência dos scores (que passa pela rede neural) pode ser
+calculada nela na primeira avaliação (from_embeddings(lazy_scores=True)):
+no Gunicorn o master pré-carregado não roda o torch.
+
+Nenhuma requisição bruta é guardada: só agregados e a amostra de embeddings.
+"""
+import time
+import threading
+import logging
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STREAMS = ("candidate", "job")
+SCORES = ("similarity", "ml_score")
+
+
+class StreamingMoments:
+    """Média e variância por dimensão atualizadas em lote (Chan et al.)"""
+
+    def __init__(self, dim: int):
+        self.count = 0
+        self.mean = np.zeros(dim, dtype=np.float64)
+        self.m2 = np.zeros(dim, dtype=np.float64)
+
+    def update(self, batch: np.ndarray):
+        batch = np.asarray(batch, dtype=np.float64).reshape(-1, self.mean.shape[0])
+        n = batch.shape[0]
+        if n == 0:
+            return
+
+        batch_mean = batch.mean(axis=0)
+        batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0)
+        delta = batch_mean - self.mean
+        total = self.count + n
+
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.zeros_like(self.m2)
+        return self.m2 / (self.count - 1)
+
+
+class ReservoirSample:
+    """Amostra uniforme de tamanho fixo sobre um fluxo de vetores (algoritmo R)"""
+
+    def __init__(self, size: int, dim: int, seed: Optional[int] = None):
+        self.size = size
+        self.seen = 0
+        self.data = np.zeros((size, dim), dtype=np.float32)
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, batch: np.ndarray):
+        batch = np.asarray(batch, dtype=np.float32).reshape(-1, self.data.shape[1])
+        n = batch.shape[0]
+        if n == 0:
+            return
+
+        # Preenche as posições livres
+        free = max(0, min(self.size - self.seen, n))
+        if free:
+            self.data[self.seen:self.seen + free] = batch[:free]
+
+        # Demais vetores substituem uma posição com probabilidade size / (posição + 1)
+        if free < n:
+            positions = self.seen + np.arange(free, n)
+            slots = self._rng.integers(0, positions + 1)
+            accepted = slots < self.size
+            self.data[slots[accepted]] = batch[free:][accepted]
+
+        self.seen += n
+
+    @property
+    def sample(self) -> np.ndarray:
+        return self.data[:min(self.seen, self.size)]
+
+
+class ScoreHistogram:
+    """Histograma de scores em bins fixos"""
+
+    def __init__(self, bins: int = 20, low: float = 0.0, high: float = 1.0):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values: np.ndarray):
+        values = np.clip(np.asarray(values, dtype=np.float64).reshape(-1), self.edges[0], self.edges[-1])
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray, eps: float = 1e-4) -> float:
+    """PSI entre duas distribuições discretas (contagens ou proporções)"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    expected = np.maximum(expected / max(expected.sum(), eps), eps)
+    actual = np.maximum(actual / max(actual.sum(), eps), eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _cosine_to(vectors: np.ndarray, centroid: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(centroid)
+    return (vectors @ centroid) / np.maximum(norms, 1e-12)
+
+
+class ReferenceStats:
+    """Estatísticas de referência de um conjunto de embeddings"""
+
+    def __init__(self, embeddings: np.ndarray, max_rows: int = 50_000,
+                 chunk_size: int = 8192, bins: int = 20):
+        # Subamostra com passo fixo para limitar o custo na inicialização (mmap friendly)
+        step = max(1, int(np.ceil(embeddings.shape[0] / max_rows)))
+        moments = StreamingMoments(embeddings.shape[1])
+        for start in range(0, embeddings.shape[0], chunk_size * step):
+            moments.update(embeddings[start:start + chunk_size * step:step])
+
+        self.dim = embeddings.shape[1]
+        self.mean = moments.mean
+        self.variance = moments.variance
+        self.centroid = moments.mean.astype(np.float32)
+
+        sample = np.asarray(embeddings[::step][:max_rows], dtype=np.float32)
+        self.centroid_histogram = ScoreHistogram(bins=bins, low=-1.0, high=1.0)
+        self.centroid_histogram.update(_cosine_to(sample, self.centroid))
+
+
+def score_references(candidate_embeddings: np.ndarray, job_embeddings: np.ndarray,
+                     ml_scorer: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+                     n_reference_pairs: int = 5000, seed: int = 42, bins: int = 20) -> Dict[str, np.ndarray]:
+    """Histogramas de referência dos scores: pares aleatórios do catálogo"""
+    rng = np.random.default_rng(seed)
+    n_candidates = max(1, int(np.sqrt(n_reference_pairs)))
+    n_jobs = max(1, n_reference_pairs // n_candidates)
+    candidate_rows = np.sort(rng.integers(0, candidate_embeddings.shape[0], n_candidates))
+    job_rows = np.sort(rng.integers(0, job_embeddings.shape[0], n_jobs))
+    candidates = np.asarray(candidate_embeddings[candidate_rows], dtype=np.float32)
+    jobs = np.asarray(job_embeddings[job_rows], dtype=np.float32)
+
+    similarity = ScoreHistogram(bins=bins)
+    ml_score = ScoreHistogram(bins=bins)
+    for candidate in candidates:
+        similarity.update(_cosine_to(jobs, candidate))
+        if ml_scorer is not None:
+            ml_score.update(ml_scorer(candidate, jobs))
+
+    references = {"similarity": similarity.counts}
+    if ml_scorer is not None:
+        references["ml_score"] = ml_score.counts
+    return references
+
+
+class DriftMonitor:
+    """Compara janelas de tráfego com a referência e publica os scores de drift"""
+
+    def __init__(self, references: Dict[str, ReferenceStats],
+                 score_references: Optional[Dict[str, np.ndarray]] = None,
+                 reservoir_size: int = 1000, eval_interval: float = 60.0,
+                 min_samples: int = 50, bins: int = 20,
+                 on_evaluate: Optional[Callable[[Dict], None]] = None, seed: Optional[int] = None,
+                 score_reference_loader: Optional[Callable[[], Dict[str, np.ndarray]]] = None):
+        self.references = references
+        self.score_references = score_references or {}
+        # Referência dos scores calculada na primeira avaliação (no worker, não no master)
+        self.score_reference_loader = score_reference_loader
+        self.reservoir_size = reservoir_size
+        self.eval_interval = eval_interval
+        self.min_samples = min_samples
+        self.bins = bins
+        self.on_evaluate = on_evaluate
+        self.last_result: Dict = {}
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._last_eval = time.monotonic()
+        self._reference_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reset_window()
+
+    @classmethod
+    def from_embeddings(cls, candidate_embeddings: np.ndarray, job_embeddings: np.ndarray,
+                        ml_scorer: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+                        n_reference_pairs: int = 5000, seed: int = 42, lazy_scores: bool = False,
+                        **kwargs) -> "DriftMonitor":
+        """
+        Cria o monitor com referência nos embeddings do catálogo. Com
+        lazy_scores a referência dos scores (ml_scorer) só é calculada na
+        primeira avaliação.
+        """
+        bins = kwargs.get("bins", 20)
+        references = {
+            "candidate": ReferenceStats(candidate_embeddings, bins=bins),
+            "job": ReferenceStats(job_embeddings, bins=bins),
+        }
+
+        def load_score_references() -> Dict[str, np.ndarray]:
+            return score_references(candidate_embeddings, job_embeddings, ml_scorer,
+                                    n_reference_pairs=n_reference_pairs, seed=seed, bins=bins)
+
+        if lazy_scores:
+            return cls(references, seed=seed, score_reference_loader=load_score_references, **kwargs)
+        return cls(references, load_score_references(), seed=seed, **kwargs)
+
+    def start(self):
+        """Avalia a cada eval_interval em uma thread, fora das requisições (chamar no worker)"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="drift-evaluator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        try:
+            self.load_score_references()
+        except Exception as e:
+            logger.error(f"Referência de scores do drift indisponível: {e}")
+        while not self._stop.wait(max(self.eval_interval, 0.01)):
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.error(f"Falha ao avaliar drift: {e}")
+
+    def load_score_references(self):
+        """Calcula a referência dos scores adiada por lazy_scores (uma vez)"""
+        with self._reference_lock:
+            if self.score_reference_loader is not None:
+                self.score_references = self.score_reference_loader()
+                self.score_reference_loader = None
+
+    def _reset_window(self):
+        self._moments = {stream: StreamingMoments(ref.dim) for stream, ref in self.references.items()}
+        self._reservoirs = {
+            stream: ReservoirSample(self.reservoir_size, ref.dim, seed=self._seed)
+            for stream, ref in self.references.items()
+        }
+        self._histograms = {score: ScoreHistogram(bins=self.bins) for score in SCORES}
+
+    def update_embeddings(self, stream: str, embeddings: np.ndarray):
+        """Acumula embeddings de um fluxo ('candidate' ou 'job') na janela atual"""
+        reference = self.references.get(stream)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if reference is None or embeddings.size == 0 or embeddings.shape[-1] != reference.dim:
+            return
+
+        embeddings = embeddings.reshape(-1, reference.dim)
+        with self._lock:
+            self._moments[stream].update(embeddings)
+            self._reservoirs[stream].update(embeddings)
+        self.maybe_evaluate()
+
+    def update_scores(self, similarity_scores: np.ndarray, ml_scores: np.ndarray):
+        """Acumula os scores da requisição nos histogramas da janela"""
+        with self._lock:
+            self._histograms["similarity"].update(similarity_scores)
+            self._histograms["ml_score"].update(ml_scores)
+        self.maybe_evaluate()
+
+    def maybe_evaluate(self) -> Optional[Dict]:
+        """Avalia a janela quando o intervalo expira e há amostras suficientes (sem a thread de start)"""
+        if self._thread is not None or time.monotonic() - self._last_eval < self.eval_interval:
+            return None
+        return self.evaluate()
+
+    def evaluate(self, force: bool = False) -> Optional[Dict]:
+        """Calcula os scores de drift da janela atual e reinicia a janela"""
+        self.load_score_references()
+        with self._lock:
+            counts = {stream: moments.count for stream, moments in self._moments.items()}
+            if not force and max(counts.values(), default=0) < self.min_samples:
+                return None
+
+            result = {"embeddings": {}, "scores": {}, "samples": counts}
+
+            for stream, reference in self.references.items():
+                moments = self._moments[stream]
+                if moments.count == 0:
+                    continue
+
+                # Deslocamento da média em desvios-padrão da referência, médio entre dimensões
+                scale = np.sqrt(reference.variance + 1e-12)
+                mean_shift = float(np.mean(np.abs(moments.mean - reference.mean) / scale))
+
+                # PSI da distribuição de cosseno até o centróide de referência
+                histogram = ScoreHistogram(bins=len(reference.centroid_histogram.counts), low=-1.0, high=1.0)
+                histogram.update(_cosine_to(self._reservoirs[stream].sample, reference.centroid))
+                psi = population_stability_index(reference.centroid_histogram.counts, histogram.counts)
+
+                result["embeddings"][stream] = {"mean_shift": mean_shift, "psi": psi}
+
+            for score, histogram in self._histograms.items():
+                reference_counts = self.score_references.get(score)
+                if reference_counts is None or histogram.total == 0:
+                    continue
+                result["scores"][score] = {"psi": population_stability_index(reference_counts, histogram.counts)}
+
+            self._reset_window()
+            self._last_eval = time.monotonic()
+            self.last_result = result
+
+        logger.info(f"Drift avaliado: {result['embeddings']} {result['scores']}")
+        if self.on_evaluate is not None:
+            self.on_evaluate(result)
+        return result
@@ -0,0 +1,109 @@
+"""
+Encoder de sentenças empacotado em model/encoder
+
+A API carrega o all-MiniLM-L6-v2 de um diretório local, sem acesso à rede.
+Os pesos ficam em model.safetensors, que é mapeado em memória na carga em
+vez de desserializado com pickle como o pytorch_model.bin do hub. Sem os
+arquivos o ModelManager falha na inicialização, antes de carregar o resto.
+
+O diretório é gerado uma vez, em uma máquina com acesso ao hub:
+    python -m app.encoder --output model/encoder
+
+ENCODER_DIR aponta a API para outro diretório; a imagem Docker gera o
+encoder em um estágio do build e usa ENCODER_DIR=/opt/encoder.
+"""
+import os
+import sys
+import hashlib
+import argparse
+from typing import List, Optional
+
+ENCODER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+REQUIRED_FILES = ("modules.json", "config.json", "tokenizer_config.json", "model.safetensors")
+TOKENIZER_FILES = ("tokenizer.json", "vocab.txt")
+
+
+def missing_encoder_files(path: str) -> List[str]:
+    """Arquivos obrigatórios ausentes no diretório do encoder"""
+    missing = [name for name in REQUIRED_FILES if not os.path.isfile(os.path.join(path, name))]
+    if not any(os.path.isfile(os.path.join(path, name)) for name in TOKENIZER_FILES):
+        missing.append(" ou ".join(TOKENIZER_FILES))
+    return missing
+
+
+def check_encoder(path: str):
+    """Falha com a lista do que falta, antes de qualquer carga pesada"""
+    missing = missing_encoder_files(path)
+    if missing:
+        raise FileNotFoundError(
+            f"Encoder local incompleto em {path} (faltando: {', '.join(missing)}); "
+            f"gere com: python -m app.encoder --output {path}"
+        )
+
+
+def encoder_fingerprint(path: str) -> str:
+    """Hash de todos os arquivos do encoder (config, tokenizer e pesos)"""
+    digest = hashlib.sha256()
+    files = sorted(os.path.relpath(os.path.join(root, file), path)
+                   for root, _, names in os.walk(path) for file in names)
+    for name in files:
+        digest.update(name.encode("utf-8"))
+        with open(os.path.join(path, name), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_encoder(path: str, device: str = "cpu"):
+    """SentenceTransformer a partir do diretório local"""
+    from sentence_transformers import SentenceTransformer
+
+    check_encoder(path)
+    return SentenceTransformer(path, device=device)
+
+
+def convert_to_safetensors(path: str) -> List[str]:
+    """Troca os pytorch_model.bin salvos pelo sentence-transformers por model.safetensors"""
+    import torch
+    from safetensors.torch import save_file
+
+    converted = []
+    for root, _, files in os.walk(path):
+        if "pytorch_model.bin" not in files:
+            continue
+        bin_path = os.path.join(root, "pytorch_model.bin")
+        state_dict = torch.load(bin_path, map_location="cpu")
+        # Tensores que compartilham memória não são aceitos pelo safetensors
+        save_file({name: tensor.contiguous().clone() for name, tensor in state_dict.items()},
+                  os.path.join(root, "model.safetensors"), metadata={"format": "pt"})
+        os.remove(bin_path)
+        converted.append(os.path.join(root, "model.safetensors"))
+    return converted
+
+
+def export_encoder(output: str, name: str = ENCODER_NAME) -> List[str]:
+    """Baixa o encoder do hub e grava a cópia local usada pela API"""
+    from sentence_transformers import SentenceTransformer
+
+    SentenceTransformer(name, device="cpu").save(output)
+    convert_to_safetensors(output)
+    check_encoder(output)
+    return sorted(
+        os.path.relpath(os.path.join(root, file), output)
+        for root, _, files in os.walk(output) for file in files
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Gera a cópia local do encoder de sentenças")
+    parser.add_argument("--output", default=os.getenv("ENCODER_DIR", os.path.join(os.getenv("MODEL_DIR", "model"), "encoder")))
+    parser.add_argument("--name", default=ENCODER_NAME, help="Modelo no hub do Hugging Face")
+    args = parser.parse_args(argv)
+
+    files = export_encoder(args.output, args.name)
+    print(f"Encoder salvo em {args.output}: {', '.join(files)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Configuração do Gunicorn para o modo multi-worker
+
+Uso: gunicorn -c app/gunicorn_conf.py app.main:app
+
+- preload_app: modelos e embeddings são carregados uma vez no master, antes
+  do fork; os workers compartilham essa memória via copy-on-write e os
+  arquivos .npy são mapeados com mmap (page cache compartilhado).
+- PROMETHEUS_MULTIPROC_DIR: cada worker grava suas métricas no diretório e
+  /metrics agrega todos os processos.
+- As threads do PyTorch são divididas entre os workers (TORCH_NUM_THREADS
+  sobrescreve o cálculo automático).
+- Cada worker grava seus logs em api.<pid>.log; quando ele sai o arquivo é
+  rotacionado e só os dos workers encerrados mais recentes são mantidos.
+  Outros processos filhos criados por fork não abrem arquivo nem thread de
+  log (o primeiro registro descartado avisa no stderr).
+"""
+import gc
+import os
+import shutil
+
+# O master só carrega os modelos; evita iniciar o pool OpenMP antes do fork,
+# o que pode travar os workers. Cada worker define suas threads em post_fork.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    """Limpa métricas multiprocesso de execuções anteriores do container"""
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def when_ready(server):
+    """Congela os objetos do master para o GC dos workers não tocar nessas páginas"""
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Modelos pré-carregados no master; iniciando {workers} workers")
+
+
+def post_fork(server, worker):
+    """Divide as threads do PyTorch entre os workers e reinicia a gravação de logs"""
+    from app.log_pipeline import start_worker_logging
+    from app.runtime import configure_torch_threads
+
+    start_worker_logging()
+    configure_torch_threads(workers)
+
+
+def child_exit(server, worker):
+    """Rotaciona o log do worker encerrado e remove do agregado as suas métricas live"""
+    from app.log_pipeline import retire_worker_logs
+
+    retire_worker_logs(worker.pid)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,380 @@
+"""
+Ingestão em streaming de vagas.json / applicants.json
+
+Lê os arquivos JSON do dataset item a item (memória limitada ao lote atual,
+sem json.load do arquivo inteiro), extrai os textos como a API
+(app/text.py), gera os embeddings em lotes e grava os artefatos no formato
+carregado pelo ModelManager:
+
+    job_embeddings.npy / job_texts/ (ver app/text_store.py)
+    candidate_embeddings.npy / candidate_texts/
+
+Durante a execução os embeddings e textos são anexados a arquivos parciais
+com um checkpoint por lote; com --resume uma execução interrompida continua
+do último lote gravado. Os artefatos finais só substituem os existentes
+quando o arquivo de origem foi processado por completo.
+
+Uso:
+    python -m app.ingest --vagas data-files/vagas.json --applicants data-files/applicants.json
+    python -m app.ingest --applicants data-files/applicants.json --resume
+"""
+import os
+import sys
+import json
+import time
+import codecs
+import argparse
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.text import preprocess_text, combine_texts, candidate_fields, job_fields
+from app.text_store import record_text, write_text_store
+
+EMBEDDING_DIM = 384
+
+# Tipo de registro -> (campo de id, extrator de campos, prefixo dos artefatos)
+KINDS = {
+    "job": ("job_id", job_fields, "job"),
+    "candidate": ("candidate_id", candidate_fields, "candidate"),
+}
+
+_WHITESPACE = " \t\n\r"
+# Erros até essa distância do fim do buffer podem ser um literal, número ou
+# escape \uXXXX cortado no fim do bloco (ex.: "tru", "\u12")
+_TRUNCATION_MARGIN = 16
+
+
+def _may_be_truncated(error: json.JSONDecodeError, buffer: str) -> bool:
+    """O erro pode sumir com mais dados? Erros no meio do buffer são JSON inválido"""
+    return error.pos >= len(buffer) - _TRUNCATION_MARGIN or error.msg.startswith("Unterminated string")
+
+
+class StreamingObjectParser:
+    """Itera sobre os pares (chave, valor) de um objeto JSON no topo do arquivo
+
+    Lê o arquivo em blocos e decodifica um valor por vez com
+    JSONDecoder.raw_decode; o buffer só guarda o item atual e o bloco lido.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.total_bytes = os.path.getsize(path)
+        self._decoder = json.JSONDecoder()
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict]]:
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        position = 0
+        eof = False
+
+        with open(self.path, "rb") as f:
+            def fill() -> bool:
+                nonlocal buffer, position, eof
+                if eof:
+                    return False
+                chunk = f.read(self.chunk_size)
+                self.bytes_read += len(chunk)
+                eof = not chunk
+                # Descarta o que já foi consumido antes de anexar o novo bloco
+                buffer = buffer[position:] + utf8.decode(chunk, final=eof)
+                position = 0
+                return True
+
+            def skip(separators: str) -> Optional[str]:
+                """Pula espaços e separadores; devolve o próximo caractere significativo"""
+                nonlocal position
+                while True:
+                    while position < len(buffer) and buffer[position] in separators:
+                        position += 1
+                    if position < len(buffer):
+                        return buffer[position]
+                    if not fill():
+                        return None
+
+            def decode():
+                nonlocal position
+                while True:
+                    try:
+                        value, end = self._decoder.raw_decode(buffer, position)
+                    except json.JSONDecodeError as e:
+                        # Valor cortado no fim do bloco: lê mais e tenta de novo
+                        if not _may_be_truncated(e, buffer) or not fill():
+                            raise
+                        continue
+                    # Número no fim do buffer pode continuar no próximo bloco
+                    if end == len(buffer) and not eof:
+                        fill()
+                        continue
+                    position = end
+                    return value
+
+            if skip(_WHITESPACE) != "{":
+                raise ValueError(f"{self.path}: esperado um objeto JSON no topo do arquivo")
+            position += 1
+            if skip(_WHITESPACE) == "}":
+                return
+
+            while True:
+                # Depois de "{" ou de exatamente uma "," vem uma chave
+                token = skip(_WHITESPACE)
+                if token is None:
+                    raise ValueError(f"{self.path}: arquivo JSON truncado")
+                if token != '"':
+                    raise ValueError(f"{self.path}: esperada uma chave (encontrado {token!r})")
+
+                key = decode()
+                if skip(_WHITESPACE) != ":":
+                    raise ValueError(f"{self.path}: esperado ':' após a chave {key!r}")
+                position += 1
+                skip(_WHITESPACE)
+                yield key, decode()
+
+                token = skip(_WHITESPACE)
+                if token == "}":
+                    return
+                if token is None:
+                    raise ValueError(f"{self.path}: arquivo JSON truncado")
+                if token != ",":
+                    raise ValueError(f"{self.path}: esperado ',' ou '}}' após o valor da chave {key!r}"
+                                     f" (encontrado {token!r})")
+                position += 1
+
+
+def text_record(kind: str, record_id: str, record: Dict) -> Dict:
+    """Registro de texto no formato do notebook (sem a chave embedding)"""
+    id_field, fields, _ = KINDS[kind]
+    text = combine_texts(fields(record).values())
+    return {id_field: record_id, "text": text, "processed_text": preprocess_text(text)}
+
+
+class IngestionWriter:
+    """Anexa embeddings e textos a arquivos parciais com checkpoint por lote"""
+
+    def __init__(self, output_dir: str, kind: str, source: str, dim: int = EMBEDDING_DIM):
+        prefix = KINDS[kind][2]
+        self.output_dir = output_dir
+        self.kind = kind
+        self.source = source
+        self.dim = dim
+        self.embeddings_path = os.path.join(output_dir, f"{prefix}_embeddings.npy")
+        self.texts_path = os.path.join(output_dir, f"{prefix}_texts")
+        self.partial_embeddings = os.path.join(output_dir, f".{prefix}_embeddings.f32.partial")
+        self.partial_texts = os.path.join(output_dir, f".{prefix}_texts.jsonl.partial")
+        self.checkpoint_path = os.path.join(output_dir, f".{prefix}_ingest.json")
+        self.rows = 0
+        self.texts_bytes = 0
+        self._embeddings_file = None
+        self._texts_file = None
+
+    def _source_signature(self) -> Dict:
+        stat = os.stat(self.source)
+        return {"source": os.path.abspath(self.source), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def open(self, resume: bool = False) -> int:
+        """Abre os arquivos parciais; devolve quantos itens já foram gravados"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        checkpoint = self._read_checkpoint() if resume else None
+
+        if checkpoint is not None:
+            self.rows = checkpoint["rows"]
+            self.texts_bytes = checkpoint["texts_bytes"]
+            # Descarta o que foi escrito depois do último checkpoint
+            for path, size in ((self.partial_embeddings, self.rows * self.dim * 4),
+                               (self.partial_texts, self.texts_bytes)):
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+            mode = "ab"
+        else:
+            self.rows = 0
+            self.texts_bytes = 0
+            mode = "wb"
+
+        self._embeddings_file = open(self.partial_embeddings, mode)
+        self._texts_file = open(self.partial_texts, mode)
+        return self.rows
+
+    def _read_checkpoint(self) -> Optional[Dict]:
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (checkpoint.get("signature") != self._source_signature() or checkpoint.get("dim") != self.dim
+                or not os.path.exists(self.partial_embeddings) or not os.path.exists(self.partial_texts)):
+            print(f"Checkpoint de {self.source} não corresponde ao arquivo atual; recomeçando", file=sys.stderr)
+            return None
+        return checkpoint
+
+    def append(self, records: List[Dict], embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(records), self.dim)
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+
+        self._embeddings_file.write(embeddings.tobytes())
+        self._texts_file.write(lines)
+        self._embeddings_file.flush()
+        self._texts_file.flush()
+        os.fsync(self._embeddings_file.fileno())
+        os.fsync(self._texts_file.fileno())
+
+        self.rows += len(records)
+        self.texts_bytes += len(lines)
+        self._write_checkpoint()
+
+    def _write_checkpoint(self):
+        checkpoint = {
+            "signature": self._source_signature(),
+            "dim": self.dim,
+            "rows": self.rows,
+            "texts_bytes": self.texts_bytes,
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def finalize(self, chunk_rows: int = 65536):
+        """Converte os arquivos parciais nos artefatos finais e remove o checkpoint"""
+        self.close()
+
+        # .npy gravado em blocos via memmap, sem carregar todos os embeddings
+        tmp_embeddings = self.embeddings_path + ".tmp"
+        source = np.memmap(self.partial_embeddings, dtype=np.float32, mode="r", shape=(self.rows, self.dim)) \
+            if self.rows else np.zeros((0, self.dim), dtype=np.float32)
+        target = np.lib.format.open_memmap(tmp_embeddings, mode="w+", dtype=np.float32, shape=(self.rows, self.dim))
+        for start in range(0, self.rows, chunk_rows):
+            target[start:start + chunk_rows] = source[start:start + chunk_rows]
+        target.flush()
+        del target, source
+
+        # Store compacto carregado pelo ModelManager, gravado linha a linha
+        id_field = KINDS[self.kind][0]
+        with open(self.partial_texts, encoding="utf-8") as f:
+            write_text_store(self.texts_path, ((record[id_field], record_text(record))
+                                               for record in map(json.loads, f)))
+
+        os.replace(tmp_embeddings, self.embeddings_path)
+        for path in (self.partial_embeddings, self.partial_texts, self.checkpoint_path):
+            os.remove(path)
+
+    def close(self):
+        for f in (self._embeddings_file, self._texts_file):
+            if f is not None:
+                f.close()
+        self._embeddings_file = None
+        self._texts_file = None
+
+
+def ingest_file(source: str, kind: str, output_dir: str, encode: Callable[[List[str]], np.ndarray],
+                batch_size: int = 256, resume: bool = False, chunk_size: int = 1 << 20,
+                progress_interval: float = 10.0, dim: int = EMBEDDING_DIM, stream=sys.stderr) -> Dict:
+    """Processa um arquivo do dataset e grava os artefatos de um tipo ('job' ou 'candidate')"""
+    parser = StreamingObjectParser(source, chunk_size=chunk_size)
+    writer = IngestionWriter(output_dir, kind, source, dim=dim)
+    skip = writer.open(resume=resume)
+    if skip:
+        print(f"[{kind}] retomando após {skip} itens já gravados", file=stream)
+
+    started = time.perf_counter()
+    last_report = started
+    encode_seconds = 0.0
+    parsed = 0
+    batch: List[Dict] = []
+
+    def flush():
+        nonlocal encode_seconds
+        encode_start = time.perf_counter()
+        # Vazio vira "texto vazio", como em ModelManager.generate_embeddings
+        embeddings = encode([record["processed_text"] or "texto vazio" for record in batch])
+        encode_seconds += time.perf_counter() - encode_start
+        writer.append(batch, embeddings)
+        batch.clear()
+
+    try:
+        for record_id, record in parser:
+            parsed += 1
+            if parsed <= skip:
+                continue
+
+            batch.append(text_record(kind, record_id, record if isinstance(record, dict) else {}))
+            if len(batch) >= batch_size:
+                flush()
+
+            now = time.perf_counter()
+            if now - last_report >= progress_interval:
+                last_report = now
+                elapsed = now - started
+                done = writer.rows - skip
+                print(f"[{kind}] {writer.rows} itens | {parser.bytes_read / parser.total_bytes:.1%} do arquivo"
+                      f" | {done / elapsed:.1f} itens/s | {parser.bytes_read / elapsed / 1e6:.1f} MB/s",
+                      file=stream)
+
+        if batch:
+            flush()
+        writer.finalize()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "kind": kind,
+        "source": source,
+        "items": writer.rows,
+        "resumed_from": skip,
+        "elapsed_s": elapsed,
+        "items_per_s": (writer.rows - skip) / elapsed if elapsed > 0 else 0.0,
+        "encode_s": encode_seconds,
+        "embeddings": writer.embeddings_path,
+        "texts": writer.texts_path,
+    }
+    print(f"[{kind}] concluído: {summary['items']} itens em {elapsed:.1f}s"
+          f" ({summary['items_per_s']:.1f} itens/s, encode {encode_seconds:.1f}s)", file=stream)
+    return summary
+
+
+def sentence_encoder(batch_size: int, path: str = os.path.join("model", "encoder")) -> Callable[[List[str]], np.ndarray]:
+    """Encoder usado pela API (cópia local do all-MiniLM-L6-v2, em CPU)"""
+    from app.encoder import load_encoder
+
+    model = load_encoder(path, device='cpu')
+    return lambda texts: np.asarray(model.encode(texts, batch_size=batch_size, device='cpu'))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Gera embeddings e textos processados a partir do dataset")
+    parser.add_argument("--vagas", default=None, help="Caminho do vagas.json")
+    parser.add_argument("--applicants", default=None, help="Caminho do applicants.json")
+    parser.add_argument("--output-dir", default=os.getenv("MODEL_DIR", "model"))
+    parser.add_argument("--encoder", default=os.getenv("ENCODER_DIR"),
+                        help="Diretório do encoder, o mesmo da API (padrão: $ENCODER_DIR ou <output-dir>/encoder)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Itens por lote gravado")
+    parser.add_argument("--encode-batch-size", type=int, default=int(os.getenv("ENCODE_BATCH_SIZE", "32")))
+    parser.add_argument("--resume", action="store_true", help="Continua do último checkpoint")
+    parser.add_argument("--progress-interval", type=float, default=10.0)
+    parser.add_argument("--report", default=None, help="Arquivo JSON com o resumo")
+    args = parser.parse_args(argv)
+
+    sources = [("job", args.vagas), ("candidate", args.applicants)]
+    sources = [(kind, path) for kind, path in sources if path]
+    if not sources:
+        parser.error("informe --vagas e/ou --applicants")
+
+    encode = sentence_encoder(args.encode_batch_size, args.encoder or os.path.join(args.output_dir, "encoder"))
+    summaries = [
+        ingest_file(path, kind, args.output_dir, encode, batch_size=args.batch_size,
+                    resume=args.resume, progress_interval=args.progress_interval)
+        for kind, path in sources
+    ]
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Pré-filtro léxico (BM25) sobre os textos processados das vagas
+
+Índice invertido gravado como arrays compactos, abertos com mmap:
+
+    terms.npy         termos ordenados (bytes UTF-8 de largura fixa)
+    idf.npy           float32[V], idf BM25 de cada termo
+    term_offsets.npy  int64[V + 1]; postings do termo t = [term_offsets[t]:term_offsets[t + 1]]
+    doc_ids.npy       int32, linha do catálogo (mesma ordem de job_embeddings.npy)
+    term_freqs.npy    uint16, frequência do termo na vaga
+    doc_lengths.npy   int32[N], termos por vaga
+
+Na busca híbrida o BM25 escolhe as LEXICAL_CANDIDATES vagas mais aderentes
+às palavras do candidato (ex.: "sap", "java") e só elas passam pelo cosseno
+e pela JobCandidateMatchingNet; o ranking final mistura o score denso com o
+BM25 normalizado (lexical_weight).
+
+Uso:
+    python -m app.lexical --texts model/job_texts --output model/job_lexical
+    python -m app.lexical --texts model/job_texts --output model/job_lexical --benchmark 200
+"""
+import os
+import sys
+import time
+import json
+import array
+import argparse
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAX_TERM_LENGTH = 32
+ARRAYS = ("terms", "idf", "term_offsets", "doc_ids", "term_freqs", "doc_lengths")
+
+
+def tokenize(text: str) -> List[str]:
+    """Termos de um texto já pré-processado (minúsculas, sem pontuação e números)"""
+    return [term for term in text.split() if 2 <= len(term) <= MAX_TERM_LENGTH]
+
+
+class LexicalIndex:
+    """Índice invertido BM25 sobre as linhas do catálogo"""
+
+    def __init__(self, terms: np.ndarray, idf: np.ndarray, term_offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float = 1.2, b: float = 0.75,
+                 max_df_ratio: float = 0.5):
+        self.terms = terms
+        self.idf = idf
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        # Termos presentes em mais que essa fração das vagas (stopwords) são ignorados na busca
+        self.max_df_ratio = max_df_ratio
+        self.num_docs = len(doc_lengths)
+        average_length = float(np.mean(doc_lengths)) if self.num_docs else 0.0
+        # Denominador do BM25 sem o tf, pré-calculado por vaga
+        self.length_norm = (k1 * (1 - b + b * np.asarray(doc_lengths, dtype=np.float32)
+                                  / max(average_length, 1e-6))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], **kwargs) -> "LexicalIndex":
+        vocabulary: Dict[str, int] = {}
+        term_ids = array.array("i")
+        doc_ids = array.array("i")
+        term_freqs = array.array("H")
+        doc_lengths = array.array("i")
+
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc)
+                term_freqs.append(min(tf, 65535))
+            doc_lengths.append(len(tokens))
+
+        # Vocabulário em ordem lexicográfica (busca binária) e postings agrupadas por termo
+        words = list(vocabulary)
+        encoded = [word.encode("utf-8") for word in words]
+        width = max([len(word) for word in encoded] + [1])
+        unsorted_terms = np.array(encoded, dtype=f"S{width}") if encoded else np.zeros(0, dtype="S1")
+        term_order = np.argsort(unsorted_terms, kind="stable")
+        rank = np.empty(len(words), dtype=np.int64)
+        rank[term_order] = np.arange(len(words))
+
+        sorted_term_ids = rank[np.frombuffer(term_ids, dtype=np.int32)] if len(term_ids) else np.zeros(0, np.int64)
+        postings_order = np.argsort(sorted_term_ids, kind="stable")
+        document_frequency = np.bincount(sorted_term_ids, minlength=len(words))
+        term_offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=term_offsets[1:])
+
+        num_docs = len(doc_lengths)
+        idf = np.log1p((num_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        return cls(
+            unsorted_terms[term_order], idf, term_offsets,
+            np.frombuffer(doc_ids, dtype=np.int32)[postings_order].copy(),
+            np.frombuffer(term_freqs, dtype=np.uint16)[postings_order].copy(),
+            np.frombuffer(doc_lengths, dtype=np.int32).copy(),
+            **kwargs
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> "LexicalIndex":
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS]
+        return cls(*arrays, **kwargs)
+
+    def term_id(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        if not len(self.terms) or len(key) > self.terms.dtype.itemsize:
+            return None
+        position = int(np.searchsorted(self.terms, np.array(key, dtype=self.terms.dtype)))
+        if position < len(self.terms) and self.terms[position] == key:
+            return position
+        return None
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 de todas as vagas para os termos do texto (pré-processado) do candidato"""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        max_df = self.max_df_ratio * self.num_docs
+        for term in set(tokenize(query)):
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+            if end - start > max_df:
+                continue
+            docs = np.asarray(self.doc_ids[start:end])
+            tf = np.asarray(self.term_freqs[start:end], dtype=np.float32)
+            # Cada vaga aparece uma vez por termo: a soma indexada não tem colisões
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+        return scores
+
+    def top_k(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Linhas com BM25 > 0, até k, em ordem decrescente de score"""
+        scores = self.scores(query)
+        rows = np.flatnonzero(scores > 0)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
+
+
+def blend_scores(lexical_scores: np.ndarray, dense_scores: np.ndarray, lexical_weight: float) -> np.ndarray:
+    """(1 - w) * score denso + w * BM25 normalizado pelo maior da lista"""
+    lexical_scores = np.asarray(lexical_scores, dtype=np.float64)
+    top = lexical_scores.max() if len(lexical_scores) else 0.0
+    normalized = lexical_scores / top if top > 0 else lexical_scores
+    return (1 - lexical_weight) * np.asarray(dense_scores, dtype=np.float64) + lexical_weight * normalized
+
+
+ScoreRows = Callable[[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+def hybrid_top_k(index: LexicalIndex, query_text: str, candidate_embedding: np.ndarray, score_rows: ScoreRows,
+                 top_k: int, threshold: float = 0.0, score: str = "ml", lexical_weight: float = 0.3,
+                 candidates: int = 500) -> Optional[Dict[str, np.ndarray]]:
+    """Pré-filtro BM25 + rerank denso das vagas sobreviventes
+
+    score_rows(candidate_embedding, rows) devolve (similaridades, scores ML)
+    das linhas pedidas. O threshold vale para o score denso escolhido; a
+    ordem final usa o score misturado. None quando nenhum termo do
+    candidato existe no índice.
+    """
+    rows, lexical_scores = index.top_k(query_text, candidates)
+    if not len(rows):
+        return None
+
+    # Linhas em ordem crescente: leitura sequencial do mmap dos embeddings
+    order = np.argsort(rows)
+    rows, lexical_scores = rows[order], lexical_scores[order]
+    similarity_scores, ml_scores = score_rows(candidate_embedding, rows)
+    dense_scores = ml_scores if score == "ml" else similarity_scores
+
+    keep = np.flatnonzero(dense_scores >= threshold)
+    blended = blend_scores(lexical_scores[keep], dense_scores[keep], lexical_weight)
+    selected = keep[np.argsort(-blended, kind="stable")[:top_k]]
+    return {
+        "indices": rows[selected],
+        "similarity_scores": np.asarray(similarity_scores)[selected],
+        "ml_scores": np.asarray(ml_scores)[selected],
+        "lexical_scores": lexical_scores[selected],
+        "candidates": len(rows),
+    }
+
+
+def benchmark(index: LexicalIndex, queries: List[Tuple[str, np.ndarray]], scorer, top_k: int = 10,
+              candidates: int = 500, lexical_weight: float = 0.3) -> Dict:
+    """Latência da busca híbrida contra o score denso do catálogo inteiro (scorer: ShardScorer)"""
+    def percentiles(values):
+        values = np.asarray(values) * 1000
+        return {"p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95))}
+
+    def score_rows(candidate, rows):
+        return scorer.similarities(candidate, rows), scorer.ml_scores(candidate, rows)
+
+    dense_times, hybrid_times, overlaps = [], [], []
+    for text, embedding in queries:
+        started = time.perf_counter()
+        dense = scorer.top_k(embedding, top_k, threshold=-np.inf, score="ml")["indices"]
+        dense_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        result = hybrid_top_k(index, text, embedding, score_rows, top_k, threshold=-np.inf,
+                              lexical_weight=lexical_weight, candidates=candidates)
+        hybrid_times.append(time.perf_counter() - started)
+        if result is not None:
+            overlaps.append(len(set(dense.tolist()) & set(result["indices"].tolist())) / top_k)
+
+    return {
+        "queries": len(queries),
+        "catalog_size": scorer.rows,
+        "candidates": candidates,
+        "dense": percentiles(dense_times),
+        "hybrid": percentiles(hybrid_times),
+        "overlap_at_k": float(np.mean(overlaps)) if overlaps else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Gera o índice BM25 dos textos das vagas")
+    parser.add_argument("--texts", default=os.path.join("model", "job_texts"), help="Store de textos das vagas")
+    parser.add_argument("--output", default=os.path.join("model", "job_lexical"))
+    parser.add_argument("--benchmark", type=int, default=0,
+                        help="Compara N consultas (textos do catálogo) contra o rerank denso completo")
+    parser.add_argument("--candidates", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from app.text_store import TextStore
+
+    store = TextStore.open(args.texts)
+    started = time.perf_counter()
+    index = LexicalIndex.build(store.texts())
+    index.save(args.output)
+    print(f"Índice com {len(index.terms)} termos e {len(index.doc_ids)} postings "
+          f"gravado em {args.output} ({time.perf_counter() - started:.1f}s)")
+
+    if args.benchmark:
+        from app.sharding import ShardScorer
+
+        # Consultas: textos e embeddings de vagas do próprio catálogo
+        model_dir = os.path.dirname(os.path.abspath(args.output))
+        scorer = ShardScorer.from_file(os.path.join(model_dir, "job_embeddings.npy"),
+                                       model_path=os.path.join(model_dir, "job_matching_neural_model.pth"))
+        rows = np.random.default_rng(0).choice(len(store), size=min(args.benchmark, len(store)), replace=False)
+        queries = [(store.text(row), scorer.embeddings[row]) for row in rows]
+        report = benchmark(index, queries, scorer, candidates=args.candidates)
+        print(json.dumps(report, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
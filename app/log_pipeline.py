@@ -0,0 +1,285 @@
+"""
+Pipeline de logging não bloqueante
+
+O caminho da requisição apenas enfileira registros estruturados em uma fila
+limitada (descartando e contando quando cheia). Uma thread em background
+drena a fila em lotes, serializa em JSON e grava arquivos JSON-lines
+rotacionados no formato esperado pelo promtail (timestamp RFC3339, level,
+message). Arquivos rotacionados (*.log.1, *.log.2...) ficam fora do glob
+*.log do promtail e não são reenviados ao Loki.
+
+Com o Gunicorn cada worker grava em api.<pid>.log. Quando o worker sai
+(child_exit, ex.: reciclado por max_requests) o arquivo é rotacionado para
+api.<pid>.log.1 e só os arquivos dos backup_count workers encerrados mais
+recentes são mantidos. Filhos criados por fork que não são workers não
+gravam logs; o primeiro registro descartado avisa no stderr.
+"""
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+# Campos do registro que não podem ser sobrescritos por extra={"fields": ...}
+RESERVED_FIELDS = ("timestamp", "level", "logger", "message", "pid")
+
+
+def _json_default(value):
+    # Escalares numpy e outros tipos simples
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class QueueLogHandler(logging.Handler):
+    """Handler que só enfileira o registro; nunca bloqueia o chamador"""
+
+    def __init__(self, pipeline: "LogPipeline"):
+        super().__init__()
+        self.pipeline = pipeline
+
+    def emit(self, record: logging.LogRecord):
+        if self.pipeline.detached:
+            self.pipeline.record_detached_drop(record)
+            return
+        try:
+            entry = {
+                "created": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                "pid": record.process,
+                "fields": getattr(record, "fields", None),
+            }
+            if record.exc_info:
+                entry["exception"] = logging.Formatter().formatException(record.exc_info)
+            self.pipeline.queue.put_nowait(entry)
+        except queue.Full:
+            self.pipeline.record_drop()
+        except Exception:
+            self.handleError(record)
+
+
+class LogPipeline:
+    """Fila limitada + thread que grava lotes em JSON-lines rotacionados"""
+
+    def __init__(self, log_dir: str, filename: str = "api.log", max_queue: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 0.5,
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 echo_stream=None):
+        self.log_dir = log_dir
+        self.filename = filename
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.echo_stream = echo_stream
+        self.dropped = 0
+        # Filho criado por fork sem thread de gravação (ver reset_after_fork)
+        self.detached = False
+        self.on_drop: Optional[Callable[[], None]] = None
+        self.queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self.handler = QueueLogHandler(self)
+        self.path = os.path.join(log_dir, filename)
+        self._file = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record_drop(self):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop()
+
+    def record_detached_drop(self, record: logging.LogRecord):
+        """Descarta o registro de um filho sem gravação, avisando uma vez no stderr"""
+        self.dropped += 1
+        if self.dropped == 1:
+            sys.stderr.write(f"Logs do processo {os.getpid()} (filho criado por fork, fora dos workers) "
+                             f"não são gravados; descartado: {record.getMessage()}\n")
+
+    def start(self):
+        self.detached = False
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Encerra a thread após gravar o que ainda está na fila"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def reset_after_fork(self):
+        """
+        Qualquer filho criado por fork: fila nova, sem thread nem arquivo.
+        A thread do processo pai não existe no filho e a fila pode estar com o
+        lock preso; fora dos workers da API (ex.: processos do autotune) os
+        registros são descartados, com um aviso no stderr no primeiro.
+        """
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self._stop = threading.Event()
+        self._file = None
+        self._thread = None
+        self.dropped = 0
+        self.detached = True
+
+    def worker_path(self, pid: int) -> str:
+        base, ext = os.path.splitext(self.filename)
+        return os.path.join(self.log_dir, f"{base}.{pid}{ext}")
+
+    def after_fork_in_child(self):
+        """Workers da API ganham thread e arquivo próprios (chamado em post_fork do Gunicorn)"""
+        self.reset_after_fork()
+        self.path = self.worker_path(os.getpid())
+        self.start()
+
+    def retire_worker(self, pid: int) -> int:
+        """
+        Rotaciona o arquivo do worker encerrado e apaga os arquivos dos workers
+        encerrados além dos backup_count mais recentes; retorna quantos apagou
+        """
+        path = self.worker_path(pid)
+        if os.path.exists(path):
+            rotate_file(path, max(self.backup_count, 1))
+
+        base, ext = os.path.splitext(self.filename)
+        pattern = re.compile(rf"^{re.escape(base)}\.(\d+){re.escape(ext)}(\.\d+)?$")
+        retired: Dict[int, List[str]] = {}
+        try:
+            names = os.listdir(self.log_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            match = pattern.match(name)
+            # Worker com arquivo ativo (api.<pid>.log) ainda está gravando
+            if match and not os.path.exists(self.worker_path(int(match.group(1)))):
+                retired.setdefault(int(match.group(1)), []).append(os.path.join(self.log_dir, name))
+
+        def last_modified(paths: List[str]) -> float:
+            return max((os.path.getmtime(path) for path in paths if os.path.exists(path)), default=0.0)
+
+        removed = 0
+        by_age = sorted(retired.values(), key=last_modified, reverse=True)
+        for paths in by_age[self.backup_count:]:
+            for path in paths:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                sys.stderr.write(f"Falha ao gravar logs: {e}\n")
+
+    def _serialize(self, entry: Dict) -> Dict:
+        record = {
+            "timestamp": datetime.fromtimestamp(entry["created"], timezone.utc).isoformat(),
+            "level": entry["level"],
+            "logger": entry["logger"],
+            "message": entry["message"],
+            "pid": entry["pid"],
+        }
+        if entry.get("exception"):
+            record["exception"] = entry["exception"]
+        for key, value in (entry.get("fields") or {}).items():
+            if key not in RESERVED_FIELDS:
+                record[key] = value
+        return record
+
+    def _write_batch(self, batch: List[Dict]):
+        records = [self._serialize(entry) for entry in batch]
+        data = "".join(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n" for record in records)
+
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() + len(data) > self.max_bytes and self._file.tell() > 0:
+            self._rotate()
+
+        self._file.write(data)
+        self._file.flush()
+
+        if self.echo_stream is not None:
+            self.echo_stream.write("".join(
+                f"{record['timestamp']} - {record['logger']} - {record['level']} - {record['message']}\n"
+                for record in records
+            ))
+            self.echo_stream.flush()
+
+    def _rotate(self):
+        self._file.close()
+        rotate_file(self.path, self.backup_count)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+
+def rotate_file(path: str, backup_count: int):
+    """path -> path.1 -> ... -> path.<backup_count> (o mais antigo é descartado)"""
+    for i in range(backup_count - 1, 0, -1):
+        source = f"{path}.{i}"
+        if os.path.exists(source):
+            os.replace(source, f"{path}.{i + 1}")
+    if backup_count > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+# Pipelines criados por setup_logging neste processo
+_pipelines: List[LogPipeline] = []
+
+
+def setup_logging(log_dir: str, level: str = "INFO", echo: bool = True, **kwargs) -> LogPipeline:
+    """Substitui os handlers do logger raiz pelo pipeline não bloqueante"""
+    pipeline = LogPipeline(log_dir, echo_stream=sys.stderr if echo else None, **kwargs)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(pipeline.handler)
+    root.setLevel(level)
+
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=pipeline.reset_after_fork)
+    _pipelines.append(pipeline)
+
+    return pipeline
+
+
+def start_worker_logging():
+    """Reinicia a gravação no worker do Gunicorn, em api.<pid>.log (ver app/gunicorn_conf.py)"""
+    for pipeline in _pipelines:
+        pipeline.after_fork_in_child()
+
+
+def retire_worker_logs(pid: int):
+    """Rotaciona e limita os arquivos de workers encerrados (child_exit no master)"""
+    for pipeline in _pipelines:
+        pipeline.retire_worker(pid)
@@ -2,74 +2,169 @@
 API FastAPI para Matching de Vagas com Deep Learning e NLP
 """
 import os
+import asyncio
 import logging
+import secrets
 import numpy as np
 import torch
-import torch.nn as nn
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
-import joblib
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import List, Dict, Optional, Annotated
 from sentence_transformers import SentenceTransformer
-import re
-import string
 from datetime import datetime
-import json
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from app.profiling import profiler, save_profile
+from app.runtime import configure_torch_threads
+from app.score_cache import PairScoreCache
+from app.drift import DriftMonitor
+from app.log_pipeline import setup_logging
+from app.capture import TrafficCapture
+from app.serialization import negotiate, prediction_response, rank_matches, job_preview
+from app.text import preprocess_text, combine_texts, CANDIDATE_FIELDS, JOB_FIELDS
+from app.network import JobCandidateMatchingNet, model_version
+from app.encoder import check_encoder, encoder_fingerprint
+from app.text_store import load_text_store
+from app.lexical import LexicalIndex, hybrid_top_k
+from app.admission import AdmissionController, Deadline, RequestCancelled, ClientDisconnected
+from app.sharding import CatalogResult, InProcessCatalog, LocalShardCluster, ShardedCatalog, ShardScorer
+from app.recommendations import RecommendationRefresher, load_ids, load_inputs
+from app.projection import ProjectedCatalog, projection_matches
+from app.sessions import CandidateSession, CandidateSessionStore, default_session_dir
 
-# Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configuração de logging: a requisição só enfileira; uma thread grava JSON-lines em LOG_DIR
+log_pipeline = setup_logging(
+    log_dir=os.getenv("LOG_DIR", "logs"),
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    echo=os.getenv("LOG_TO_STDOUT", "true").lower() == "true",
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+    backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5"))
 )
 logger = logging.getLogger(__name__)
 
+# Configurações via variáveis de ambiente
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("logs", "profiles"))
+MAX_PROFILE_SECONDS = float(os.getenv("MAX_PROFILE_SECONDS", "120"))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+MODEL_DIR = os.getenv("MODEL_DIR", "model")
+# Encoder local (python -m app.encoder); a imagem Docker gera o seu em /opt/encoder
+ENCODER_DIR = os.getenv("ENCODER_DIR", os.path.join(MODEL_DIR, "encoder"))
+# Dimensão dos embeddings do all-MiniLM-L6-v2
+EMBEDDING_DIM = 384
+# Tamanho de lote do encoder (ver python -m app.autotune)
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "32"))
+# Pares (candidato, vaga) mantidos no cache de scores (0 desabilita)
+PAIR_CACHE_SIZE = int(os.getenv("PAIR_CACHE_SIZE", "100000"))
+# Monitor de drift: janela avaliada a cada DRIFT_EVAL_INTERVAL segundos
+DRIFT_MONITOR_ENABLED = os.getenv("DRIFT_MONITOR", "true").lower() == "true"
+DRIFT_EVAL_INTERVAL = float(os.getenv("DRIFT_EVAL_INTERVAL", "60"))
+DRIFT_RESERVOIR_SIZE = int(os.getenv("DRIFT_RESERVOIR_SIZE", "1000"))
+# Fração das requisições do /predict gravadas para replay (0 desabilita)
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", os.path.join("logs", "capture"))
+# Catálogo de vagas em shards: endereços remotos (host:porta,...) ou N processos locais
+CATALOG_SHARDS = [address.strip() for address in os.getenv("CATALOG_SHARDS", "").split(",") if address.strip()]
+CATALOG_LOCAL_SHARDS = int(os.getenv("CATALOG_LOCAL_SHARDS", "0"))
+CATALOG_SHARD_AUTHKEY = os.getenv("CATALOG_SHARD_AUTHKEY", "")
+CATALOG_SHARD_THREADS = int(os.getenv("CATALOG_SHARD_THREADS", "1"))
+CATALOG_DEADLINE_MS = float(os.getenv("CATALOG_DEADLINE_MS", "1000"))
+# Primeiro passo na projeção PCA (python -m app.projection): vagas que recebem o score completo (0 desabilita)
+PROJECTION_DIR = os.getenv("PROJECTION_DIR", os.path.join(MODEL_DIR, "projection"))
+CATALOG_SHORTLIST = int(os.getenv("CATALOG_SHORTLIST", "1000"))
+# Prazo padrão (e máximo) do /predict; o cliente pode reduzir com X-Request-Timeout-Ms (0 = sem prazo)
+REQUEST_TIMEOUT_MS = float(os.getenv("REQUEST_TIMEOUT_MS", "30000"))
+# Vagas codificadas entre duas verificações de prazo/desconexão
+PREDICT_CHUNK_SIZE = max(1, int(os.getenv("PREDICT_CHUNK_SIZE", "64")))
+# Custo em andamento aceito por worker (caracteres para o encoder + vagas; 0 desabilita)
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "4000000"))
+# Busca híbrida: vagas escolhidas pelo BM25 para o rerank denso e peso do BM25 no score final
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "500"))
+LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "0.3"))
+# Tabela materializada de recomendações: k por linha, shortlist por similaridade e intervalo
+# de atualização dentro do worker (padrão 0: a tabela é gerada por python -m app.recommendations
+# ou pelo sidecar do docker-compose, e os workers só reabrem a versão gravada)
+RECOMMENDATION_DIR = os.getenv("RECOMMENDATION_DIR", os.path.join(MODEL_DIR, "recommendations"))
+RECOMMENDATION_TOP_K = int(os.getenv("RECOMMENDATION_TOP_K", "20"))
+RECOMMENDATION_SHORTLIST = int(os.getenv("RECOMMENDATION_SHORTLIST", "200"))
+RECOMMENDATION_REFRESH_INTERVAL = float(os.getenv("RECOMMENDATION_REFRESH_INTERVAL", "0"))
+# Sessões de candidato (POST /candidates/session): diretório compartilhado entre workers, TTL e limite
+SESSION_DIR = os.getenv("SESSION_DIR", default_session_dir())
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", "900"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
 # Métricas Prometheus
 PREDICTION_REQUESTS = Counter('prediction_requests_total', 'Total prediction requests')
 PREDICTION_DURATION = Histogram('prediction_duration_seconds', 'Prediction duration')
 PREDICTION_ERRORS = Counter('prediction_errors_total', 'Total prediction errors')
-ML_SCORE_GAUGE = Gauge('prediction_ml_score_avg', 'Average ML score of predictions')
-MATCH_RATE_GAUGE = Gauge('prediction_match_rate', 'Rate of successful matches')
-PROCESSING_TIME_GAUGE = Gauge('prediction_processing_time_ms', 'Processing time in milliseconds')
-
-# Modelo da rede neural (mesmo do notebook)
-class JobCandidateMatchingNet(nn.Module):
-    def __init__(self, embedding_dim=384, hidden_dim=256):
-        super(JobCandidateMatchingNet, self).__init__()
-        input_dim = embedding_dim * 2
-        self.layers = nn.Sequential(
-            nn.Linear(input_dim, hidden_dim),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(hidden_dim, hidden_dim // 2),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-            nn.Linear(hidden_dim // 2, 64),
-            nn.ReLU(),
-            nn.Linear(64, 1),
-            nn.Sigmoid()
-        )
+# Com múltiplos workers os gauges exportam o valor mais recente entre os processos vivos
+ML_SCORE_GAUGE = Gauge('prediction_ml_score_avg', 'Average ML score of predictions', multiprocess_mode='livemostrecent')
+MATCH_RATE_GAUGE = Gauge('prediction_match_rate', 'Rate of successful matches', multiprocess_mode='livemostrecent')
+PROCESSING_TIME_GAUGE = Gauge('prediction_processing_time_ms', 'Processing time in milliseconds', multiprocess_mode='livemostrecent')
+PAIR_CACHE_HITS = Counter('pair_score_cache_hits_total', 'Candidate-job pairs served from the score cache')
+PAIR_CACHE_MISSES = Counter('pair_score_cache_misses_total', 'Candidate-job pairs scored by the models')
+PAIR_CACHE_HIT_RATIO = Gauge('pair_score_cache_hit_ratio', 'Pair score cache hit ratio since worker start', multiprocess_mode='livemostrecent')
+EMBEDDING_MEAN_SHIFT_GAUGE = Gauge('drift_embedding_mean_shift', 'Mean shift of incoming embeddings in reference std devs', ['stream'], multiprocess_mode='livemostrecent')
+EMBEDDING_PSI_GAUGE = Gauge('drift_embedding_psi', 'PSI of incoming embeddings cosine to reference centroid', ['stream'], multiprocess_mode='livemostrecent')
+SCORE_PSI_GAUGE = Gauge('drift_score_psi', 'PSI of prediction scores vs reference distribution', ['score'], multiprocess_mode='livemostrecent')
+LOG_RECORDS_DROPPED = Counter('log_records_dropped_total', 'Log records dropped because the logging queue was full')
+log_pipeline.on_drop = LOG_RECORDS_DROPPED.inc
+CATALOG_MATCH_DURATION = Histogram('catalog_match_duration_seconds', 'Catalog match duration')
+CATALOG_PARTIAL_RESULTS = Counter('catalog_partial_results_total', 'Catalog matches answered without every shard')
+CATALOG_SHARD_FAILURES = Counter('catalog_shard_failures_total', 'Shard requests that failed or missed the deadline', ['shard'])
+PREDICTION_CANCELLED = Counter('prediction_cancelled_total', 'Predictions abandoned before completion', ['reason'])
+PREDICTION_REJECTED = Counter('prediction_rejected_total', 'Predictions rejected by admission control')
+CAPTURE_RECORDS_DROPPED = Counter('traffic_capture_dropped_total', 'Captured requests dropped because the capture queue was full')
+
+# Captura amostrada de tráfego (ver python -m app.replay)
+traffic_capture = TrafficCapture(CAPTURE_DIR, sample_rate=CAPTURE_SAMPLE_RATE)
+traffic_capture.on_drop = CAPTURE_RECORDS_DROPPED.inc
 
-    def forward(self, candidate_embedding, job_embedding):
-        combined = torch.cat([candidate_embedding, job_embedding], dim=1)
-        output = self.layers(combined)
-        return output
+admission = AdmissionController(ADMISSION_CAPACITY)
+
+candidate_sessions = CandidateSessionStore(SESSION_DIR, ttl=SESSION_TTL_S, max_sessions=SESSION_MAX)
 
 # Modelos Pydantic para request/response
+# Embedding calculado pelo cliente com o mesmo encoder (dispensa o texto)
+Embedding = Annotated[List[Annotated[float, Field(allow_inf_nan=False)]],
+                      Field(min_length=EMBEDDING_DIM, max_length=EMBEDDING_DIM)]
+
 class CandidateData(BaseModel):
     cv_pt: Optional[str] = ""
     cv_en: Optional[str] = ""
     objetivo_profissional: Optional[str] = ""
     conhecimentos_tecnicos: Optional[str] = ""
+    embedding: Optional[Embedding] = None
 
 class JobData(BaseModel):
     titulo_vaga: Optional[str] = ""
     objetivo_vaga: Optional[str] = ""
     principais_atividades: Optional[str] = ""
     competencia_tecnicas_e_comportamentais: Optional[str] = ""
+    # Vaga do catálogo (linha de job_embeddings.npy) ou vetor pronto: sem passar pelo encoder
+    job_id: Optional[str] = None
+    embedding: Optional[Embedding] = None
+    
+    @model_validator(mode="after")
+    def check_job_source(self):
+        if self.job_id is not None and self.embedding is not None:
+            raise ValueError("Informe job_id ou embedding, não os dois")
+        return self
+
+class CandidateRequest(BaseModel):
+    # Dados do candidato ou o handle de POST /candidates/session (texto e embedding já processados)
+    candidate: Optional[CandidateData] = None
+    candidate_handle: Optional[str] = None
+    
+    @model_validator(mode="after")
+    def check_candidate(self):
+        if (self.candidate is None) == (self.candidate_handle is None):
+            raise ValueError("Informe candidate ou candidate_handle")
+        return self
 
-class PredictionRequest(BaseModel):
-    candidate: CandidateData
+class PredictionRequest(CandidateRequest):
     jobs: List[JobData]
     top_k: int = Field(default=5, ge=1, le=20)
     threshold: float = Field(default=0.5, ge=0.0, le=1.0)
@@ -80,97 +175,133 @@ class JobMatch(BaseModel):
     ml_score: float
     job_preview: str
 
+class CatalogMatchRequest(CandidateRequest):
+    top_k: int = Field(default=10, ge=1, le=1000)
+    threshold: float = Field(default=0.5, ge=0.0, le=1.0)
+    score: str = Field(default="ml", pattern="^(ml|similarity)$")
+    # hybrid: pré-filtro BM25 sobre os textos das vagas antes do score denso
+    retrieval: str = Field(default="dense", pattern="^(dense|hybrid)$")
+    lexical_weight: float = Field(default=LEXICAL_WEIGHT, ge=0.0, le=1.0)
+
 class PredictionResponse(BaseModel):
     candidate_processed_text: str
     recommendations: List[JobMatch]
     processing_time_ms: float
     timestamp: str
 
+class CatalogMatch(JobMatch):
+    # job_index é a linha do catálogo (job_embeddings.npy)
+    job_id: Optional[str] = None
+
+class CatalogMatchResponse(PredictionResponse):
+    recommendations: List[CatalogMatch]
+
+class CandidateSessionResponse(BaseModel):
+    handle: str
+    expires_at: str
+    ttl_s: float
+    candidate_processed_text: str
+
+class StoredMatch(BaseModel):
+    # index é a linha de job_embeddings.npy ou candidate_embeddings.npy
+    index: int
+    id: Optional[str] = None
+    similarity_score: float
+    ml_score: float
+    preview: Optional[str] = None
+
+class StoredRecommendationsResponse(BaseModel):
+    # model_version é campo da resposta, não do namespace reservado do pydantic
+    model_config = ConfigDict(protected_namespaces=())
+
+    id: str
+    recommendations: List[StoredMatch]
+    model_version: str
+    built_at: str
+    table_age_s: float
+    # Tabela gerada com outra versão da rede neural ou com outros ids por linha
+    # (text stores atualizados no disco) que os carregados neste worker
+    stale: bool
+
 # Classe para carregar e gerenciar modelos
 class ModelManager:
-    def __init__(self, model_dir: str = "model"):
+    def __init__(self, model_dir: str = "model", encoder_dir: Optional[str] = None):
         self.model_dir = model_dir
+        self.encoder_dir = encoder_dir or os.path.join(model_dir, 'encoder')
         # Forçar uso de CPU para ambiente enxuto
         self.device = torch.device('cpu')
+        self.encode_batch_size = ENCODE_BATCH_SIZE
         logger.info(f"Usando dispositivo: {self.device}")
         self.load_models()
     
     def load_models(self):
         """Carrega apenas os arquivos serializados para predição"""
         try:
-            # Sentence transformer apenas para inferência
+            # Sentence transformer local (ENCODER_DIR, padrão model/encoder), sem acesso ao hub
+            encoder_path = self.encoder_dir
+            check_encoder(encoder_path)
             logger.info("Carregando Sentence Transformer para inferência...")
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+            self.sentence_model = SentenceTransformer(encoder_path, device='cpu')
+            # Entra na versão do modelo: trocar o encoder invalida o cache de pares
+            self.encoder_digest = encoder_fingerprint(encoder_path)
 
             # Rede neural treinada (apenas para predição)
             logger.info("Carregando modelo neural para predição...")
-            self.neural_model = JobCandidateMatchingNet(embedding_dim=384)
+            self.neural_model = JobCandidateMatchingNet(embedding_dim=EMBEDDING_DIM)
             model_path = os.path.join(self.model_dir, 'job_matching_neural_model.pth')
             self.neural_model.load_state_dict(torch.load(model_path, map_location='cpu'))
             self.neural_model.to('cpu')
             self.neural_model.eval()
+            self.model_version = self.compute_model_version()
 
             # Embeddings e textos processados
+            # mmap somente leitura: workers criados por fork compartilham as páginas do page cache
             logger.info("Carregando embeddings e textos processados...")
-            self.candidate_embeddings = np.load(os.path.join(self.model_dir, 'candidate_embeddings.npy'))
-            self.job_embeddings = np.load(os.path.join(self.model_dir, 'job_embeddings.npy'))
-            self.candidate_texts = joblib.load(os.path.join(self.model_dir, 'candidate_texts_processed.joblib'))
-            self.job_texts = joblib.load(os.path.join(self.model_dir, 'job_texts_processed.joblib'))
+            self.candidate_embeddings = np.load(os.path.join(self.model_dir, 'candidate_embeddings.npy'), mmap_mode='r')
+            self.job_embeddings = np.load(os.path.join(self.model_dir, 'job_embeddings.npy'), mmap_mode='r')
+            # Textos em blob UTF-8 mapeado em memória, lidos sob demanda (ver app/text_store.py)
+            self.candidate_texts = load_text_store(self.model_dir, 'candidate')
+            self.job_texts = load_text_store(self.model_dir, 'job')
+            # Índice BM25 opcional para a busca híbrida (python -m app.lexical)
+            self.job_lexical = self.open_job_lexical()
 
             logger.info("Arquivos para predição carregados com sucesso!")
         except Exception as e:
             logger.error(f"Erro ao carregar arquivos de predição: {e}")
             raise
     
+    def open_job_lexical(self) -> Optional[LexicalIndex]:
+        """Índice BM25 das vagas (None se não existe ou não tem as mesmas linhas do catálogo)"""
+        lexical_path = os.path.join(self.model_dir, 'job_lexical')
+        if not os.path.isdir(lexical_path):
+            return None
+        index = LexicalIndex.open(lexical_path)
+        if index.num_docs != len(self.job_embeddings):
+            logger.warning(f"Índice léxico em {lexical_path} tem {index.num_docs} vagas e o catálogo "
+                           f"{len(self.job_embeddings)}; regenere com python -m app.lexical")
+            return None
+        return index
+    
+    def compute_model_version(self) -> str:
+        """Versão do modelo: hash dos pesos da rede neural e do encoder"""
+        return model_version(self.neural_model, self.encoder_digest)
+    
+    def job_row(self, job_id: str) -> Optional[int]:
+        """Linha de job_embeddings.npy da vaga com esse id (None se não estiver no catálogo)"""
+        return self.job_texts.row(job_id)
+    
     def preprocess_text(self, text: str) -> str:
         """Pré-processamento de texto igual ao notebook"""
-        if not text or not isinstance(text, str):
-            return ""
-        
-        # Converter para minúsculas
-        text = text.lower()
-        
-        # Remover pontuação
-        text = text.translate(str.maketrans('', '', string.punctuation))
-        
-        # Remover números
-        text = re.sub(r'\d+', '', text)
-        
-        # Remover espaços extras
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        return text
+        return preprocess_text(text)
     
     def extract_candidate_text(self, candidate: CandidateData) -> str:
         """Extrai e combina textos do candidato"""
-        texts = []
-        
-        if candidate.cv_pt:
-            texts.append(candidate.cv_pt)
-        if candidate.cv_en:
-            texts.append(candidate.cv_en)
-        if candidate.objetivo_profissional:
-            texts.append(candidate.objetivo_profissional)
-        if candidate.conhecimentos_tecnicos:
-            texts.append(candidate.conhecimentos_tecnicos)
-        
-        combined_text = ' '.join([str(text) for text in texts if text and str(text).strip()])
+        combined_text = combine_texts(getattr(candidate, field) for field in CANDIDATE_FIELDS)
         return self.preprocess_text(combined_text)
     
     def extract_job_text(self, job: JobData) -> str:
         """Extrai e combina textos da vaga"""
-        texts = []
-        
-        if job.titulo_vaga:
-            texts.append(job.titulo_vaga)
-        if job.objetivo_vaga:
-            texts.append(job.objetivo_vaga)
-        if job.principais_atividades:
-            texts.append(job.principais_atividades)
-        if job.competencia_tecnicas_e_comportamentais:
-            texts.append(job.competencia_tecnicas_e_comportamentais)
-        
-        combined_text = ' '.join([str(text) for text in texts if text and str(text).strip()])
+        combined_text = combine_texts(getattr(job, field) for field in JOB_FIELDS)
         return self.preprocess_text(combined_text)
     
     def generate_embedding(self, text: str) -> np.ndarray:
@@ -178,27 +309,250 @@ class ModelManager:
         if not text or len(text.strip()) == 0:
             text = "texto vazio"
         
-        embedding = self.sentence_model.encode([text], device=self.device)
+        with profiler.torch_section("generate_embedding"):
+            embedding = self.sentence_model.encode([text], device=self.device)
         return embedding[0]
     
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Gera embeddings para vários textos em lotes de encode_batch_size"""
+        texts = [text if text and len(text.strip()) > 0 else "texto vazio" for text in texts]
+        
+        with profiler.torch_section("generate_embeddings"):
+            embeddings = self.sentence_model.encode(texts, batch_size=self.encode_batch_size, device=self.device)
+        return np.asarray(embeddings)
+    
     def predict_match(self, candidate_embedding: np.ndarray, job_embedding: np.ndarray) -> float:
         """Prediz match usando rede neural"""
         candidate_tensor = torch.FloatTensor(candidate_embedding).unsqueeze(0).to(self.device)
         job_tensor = torch.FloatTensor(job_embedding).unsqueeze(0).to(self.device)
         
-        with torch.no_grad():
+        with torch.no_grad(), profiler.torch_section("predict_match"):
             score = self.neural_model(candidate_tensor, job_tensor).cpu().numpy()[0][0]
         
         return float(score)
     
+    def predict_matches(self, candidate_embedding: np.ndarray, job_embeddings: np.ndarray) -> np.ndarray:
+        """Prediz match de um candidato contra várias vagas em um único forward"""
+        job_tensor = torch.as_tensor(np.asarray(job_embeddings, dtype=np.float32)).to(self.device)
+        candidate_tensor = torch.as_tensor(np.asarray(candidate_embedding, dtype=np.float32)).to(self.device)
+        candidate_tensor = candidate_tensor.unsqueeze(0).expand(job_tensor.shape[0], -1)
+        
+        with torch.no_grad(), profiler.torch_section("predict_matches"):
+            scores = self.neural_model(candidate_tensor, job_tensor).cpu().numpy()
+        
+        return scores.reshape(-1)
+    
     def calculate_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """Calcula similaridade coseno"""
         from sklearn.metrics.pairwise import cosine_similarity
         
         similarity = cosine_similarity([embedding1], [embedding2])[0][0]
         return float(similarity)
+    
+    def calculate_similarities(self, candidate_embedding: np.ndarray, job_embeddings: np.ndarray) -> np.ndarray:
+        """Calcula similaridade coseno do candidato contra várias vagas"""
+        candidate = np.asarray(candidate_embedding, dtype=np.float32)
+        jobs = np.asarray(job_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(jobs, axis=1) * np.linalg.norm(candidate)
+        
+        return (jobs @ candidate) / np.maximum(norms, 1e-12)
+
+model_manager = ModelManager(model_dir=MODEL_DIR, encoder_dir=ENCODER_DIR)
+pair_score_cache = PairScoreCache(maxsize=PAIR_CACHE_SIZE)
+
+def export_drift_metrics(result: Dict):
+    """Publica no Prometheus os scores de drift da última janela"""
+    for stream, values in result["embeddings"].items():
+        EMBEDDING_MEAN_SHIFT_GAUGE.labels(stream=stream).set(values["mean_shift"])
+        EMBEDDING_PSI_GAUGE.labels(stream=stream).set(values["psi"])
+    for score, values in result["scores"].items():
+        SCORE_PSI_GAUGE.labels(score=score).set(values["psi"])
+
+def create_drift_monitor() -> Optional[DriftMonitor]:
+    """Cria o monitor de drift com referência nos embeddings do catálogo"""
+    if not DRIFT_MONITOR_ENABLED:
+        return None
+    try:
+        return DriftMonitor.from_embeddings(
+            model_manager.candidate_embeddings,
+            model_manager.job_embeddings,
+            ml_scorer=model_manager.predict_matches,
+            # A referência dos scores passa pela rede: calculada na thread do worker, não no master
+            lazy_scores=True,
+            reservoir_size=DRIFT_RESERVOIR_SIZE,
+            eval_interval=DRIFT_EVAL_INTERVAL,
+            on_evaluate=export_drift_metrics
+        )
+    except Exception as e:
+        logger.error(f"Monitor de drift desabilitado: {e}")
+        return None
+
+drift_monitor = create_drift_monitor()
+
+def open_job_projection() -> Optional[ProjectedCatalog]:
+    """Catálogo de vagas reduzido para o primeiro passo (None: score completo em todas as vagas)"""
+    if CATALOG_SHORTLIST <= 0 or not os.path.isdir(PROJECTION_DIR):
+        return None
+    if not projection_matches(PROJECTION_DIR, "job", model_manager.job_embeddings):
+        logger.warning(f"Projeção em {PROJECTION_DIR} não foi gerada a partir de job_embeddings.npy atual; "
+                       f"regenere com python -m app.projection")
+        return None
+    return ProjectedCatalog.open(PROJECTION_DIR, "job")
+
+def create_job_catalog():
+    """Catálogo de vagas para /catalog/match: shards remotos, locais ou em processo"""
+    try:
+        deadline = CATALOG_DEADLINE_MS / 1000
+        projection = open_job_projection()
+        if CATALOG_SHARDS:
+            catalog = ShardedCatalog.connect(CATALOG_SHARDS, CATALOG_SHARD_AUTHKEY.encode("utf-8"), deadline=deadline)
+        elif CATALOG_LOCAL_SHARDS > 0:
+            cluster = LocalShardCluster(
+                os.path.join(MODEL_DIR, 'job_embeddings.npy'), CATALOG_LOCAL_SHARDS,
+                model_path=os.path.join(MODEL_DIR, 'job_matching_neural_model.pth'),
+                threads_per_shard=CATALOG_SHARD_THREADS,
+                projection_path=PROJECTION_DIR if projection is not None else None,
+                shortlist=CATALOG_SHORTLIST
+            ).start()
+            catalog = cluster.catalog(deadline=deadline)
+        else:
+            return InProcessCatalog(ShardScorer(model_manager.job_embeddings, model=model_manager.neural_model,
+                                                projection=projection, shortlist=CATALOG_SHORTLIST))
+        catalog.on_shard_failure = lambda shard: CATALOG_SHARD_FAILURES.labels(shard=str(shard)).inc()
+        logger.info(f"Catálogo de vagas com {len(catalog.clients)} shards")
+        return catalog
+    except Exception as e:
+        logger.error(f"Catálogo de vagas indisponível: {e}")
+        return None
+
+job_catalog = create_job_catalog()
+
+# Tabela de recomendações recalculada a partir dos arquivos em MODEL_DIR (ver app/recommendations.py)
+recommendation_refresher = RecommendationRefresher(
+    RECOMMENDATION_DIR,
+    lambda: load_inputs(MODEL_DIR, EMBEDDING_DIM),
+    encoder_path=ENCODER_DIR,
+    load_ids=lambda: load_ids(MODEL_DIR),
+    k=RECOMMENDATION_TOP_K,
+    shortlist=RECOMMENDATION_SHORTLIST,
+    interval=RECOMMENDATION_REFRESH_INTERVAL
+)
+
+def catalog_job_id(row: int) -> Optional[str]:
+    try:
+        return model_manager.job_texts.id(row)
+    except IndexError:
+        return None
+
+def lexical_catalog_top_k(candidate_text: str, candidate_embedding: np.ndarray,
+                          request: CatalogMatchRequest) -> Optional[CatalogResult]:
+    """Pré-filtro BM25 + rerank denso só das vagas sobreviventes, no processo da API"""
+    def score_rows(candidate, rows):
+        job_embeddings = np.asarray(model_manager.job_embeddings[rows], dtype=np.float32)
+        return (model_manager.calculate_similarities(candidate, job_embeddings),
+                model_manager.predict_matches(candidate, job_embeddings))
+    
+    result = hybrid_top_k(model_manager.job_lexical, candidate_text, candidate_embedding, score_rows,
+                          request.top_k, request.threshold, request.score, request.lexical_weight,
+                          candidates=LEXICAL_CANDIDATES)
+    if result is None:
+        return None
+    return CatalogResult(result["indices"], result["similarity_scores"], result["ml_scores"], 1, [])
+
+def request_cost(request: "PredictionRequest") -> int:
+    """Custo estimado do /predict: caracteres que passam pelo encoder + 1 por vaga"""
+    cost = 0 if request.candidate is None or request.candidate.embedding is not None else \
+        sum(len(getattr(request.candidate, field) or "") for field in CANDIDATE_FIELDS)
+    for job in request.jobs:
+        cost += 1
+        if job.embedding is None and job.job_id is None:
+            cost += sum(len(getattr(job, field) or "") for field in JOB_FIELDS)
+    return cost
+
+async def ensure_active(http_request: Request, deadline: Deadline, stage: str):
+    """Interrompe a predição se o prazo acabou ou o cliente desconectou"""
+    deadline.check(stage)
+    # Cede o event loop para que uma desconexão pendente seja processada
+    await asyncio.sleep(0)
+    if await http_request.is_disconnected():
+        raise ClientDisconnected(stage)
+
+def score_job_texts(candidate_embedding: np.ndarray, job_texts: List[str]):
+    """Encode de um lote de vagas e scores contra o candidato (roda fora do event loop)"""
+    job_embeddings = model_manager.generate_embeddings(job_texts)
+    similarities = model_manager.calculate_similarities(candidate_embedding, job_embeddings)
+    ml_scores = model_manager.predict_matches(candidate_embedding, job_embeddings)
+    return job_embeddings, similarities, ml_scores
+
+def score_job_vectors(candidate_embedding: np.ndarray, job_embeddings: np.ndarray):
+    return (model_manager.calculate_similarities(candidate_embedding, job_embeddings),
+            model_manager.predict_matches(candidate_embedding, job_embeddings))
+
+def client_embedding(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+    return None if embedding is None else np.asarray(embedding, dtype=np.float32)
+
+def resolve_candidate(request: CandidateRequest) -> CandidateSession:
+    """
+    Texto processado e embedding do candidato. Sem handle o embedding é o
+    enviado pelo cliente (ou None, a gerar pelo encoder quando necessário).
+    """
+    if request.candidate_handle is not None:
+        session = candidate_sessions.get(request.candidate_handle)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Sessão do candidato expirada ou inexistente")
+        return session
+    embedding = client_embedding(request.candidate.embedding)
+    return CandidateSession(model_manager.extract_candidate_text(request.candidate), embedding,
+                            encoded=embedding is None, expires_at=0.0)
+
+def truncate_text(text: str) -> str:
+    return text[:500] + "..." if len(text) > 500 else text
+
+def stored_recommendations(direction: str, record_id: str, top_k: int) -> StoredRecommendationsResponse:
+    """Top-k gravado na tabela materializada para um candidato (vagas) ou vaga (candidatos)"""
+    table = recommendation_refresher.table
+    if table is None:
+        raise HTTPException(status_code=503, detail="Tabela de recomendações indisponível (gere com python -m app.recommendations)")
+    
+    query_texts, target_texts = (model_manager.candidate_texts, model_manager.job_texts) if direction == "candidate_jobs" \
+        else (model_manager.job_texts, model_manager.candidate_texts)
+    row = query_texts.row(record_id)
+    entries = table.lookup(direction, row, top_k) if row is not None else None
+    if entries is None:
+        raise HTTPException(status_code=404, detail=f"Id {record_id} não encontrado na tabela de recomendações")
+    
+    def target_id(index: int) -> Optional[str]:
+        try:
+            return target_texts.id(index)
+        except IndexError:
+            return None
+    
+    return StoredRecommendationsResponse(
+        id=record_id,
+        recommendations=[
+            StoredMatch(
+                index=index,
+                id=target_id(index),
+                similarity_score=float(similarity),
+                ml_score=float(ml),
+                preview=catalog_preview(index) if direction == "candidate_jobs" else None
+            )
+            for index, similarity, ml in zip(entries.indices.tolist(), entries.similarity_scores, entries.ml_scores)
+        ],
+        model_version=table.model_version,
+        built_at=datetime.fromtimestamp(table.built_at).isoformat(),
+        table_age_s=table.age(),
+        stale=table.model_version != model_manager.model_version or not table.matches_ids({
+            "candidate": model_manager.candidate_texts.ids_fingerprint(),
+            "job": model_manager.job_texts.ids_fingerprint()
+        })
+    )
 
-model_manager = ModelManager()
+def catalog_preview(row: int) -> str:
+    try:
+        return model_manager.job_texts.preview(row)
+    except IndexError:
+        return ""
 
 app = FastAPI(
     title="Job Matching API",
@@ -206,6 +560,40 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("startup")
+async def configure_worker_threads():
+    """
+    Threads configuradas explicitamente (ex.: saída do autotune) valem no worker.
+    Roda depois do fork: no master pré-carregado o pool OpenMP não é iniciado
+    (ver app/gunicorn_conf.py, que também aplica o valor em post_fork).
+    """
+    if os.getenv("TORCH_NUM_THREADS"):
+        configure_torch_threads()
+
+@app.on_event("startup")
+async def start_recommendation_refresh():
+    """
+    A thread é iniciada em cada worker, depois do fork (o master não roda o
+    torch). Por padrão ela só reabre a tabela gravada; com
+    RECOMMENDATION_REFRESH_INTERVAL > 0 um dos workers também a recalcula.
+    """
+    recommendation_refresher.start()
+
+@app.on_event("shutdown")
+async def stop_recommendation_refresh():
+    recommendation_refresher.stop()
+
+@app.on_event("startup")
+async def start_drift_monitor():
+    """Avaliação do drift em uma thread do worker, fora do caminho das requisições"""
+    if drift_monitor is not None:
+        drift_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_drift_monitor():
+    if drift_monitor is not None:
+        drift_monitor.stop()
+
 @app.get("/")
 async def root():
     """Endpoint de health check"""
@@ -229,104 +617,420 @@ async def health_check():
 async def get_metrics():
     """Endpoint para métricas Prometheus"""
     from fastapi import Response
+
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Modo multi-worker: agrega as métricas gravadas por todos os processos
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
+@app.get("/drift")
+async def get_drift():
+    """Resultado da última avaliação de drift deste worker"""
+    if drift_monitor is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "eval_interval_s": drift_monitor.eval_interval,
+        "last_result": drift_monitor.last_result
+    }
+
+def require_admin(x_admin_token: Optional[str]):
+    """Valida o token administrativo (endpoints admin ficam desabilitados sem ADMIN_TOKEN)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Endpoints administrativos desabilitados")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token administrativo inválido")
+
+@app.post("/admin/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(default=10.0, gt=0),
+    torch_profile: bool = False,
+    persist: bool = False,
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    """
+    Captura um profile por amostragem do worker que atender a requisição.
+    Retorna as pilhas Python no formato folded (flamegraph); com torch_profile=true
+    o profile das chamadas do ModelManager é salvo em PROFILE_DIR.
+    """
+    require_admin(x_admin_token)
+
+    if seconds > MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Duração máxima de profiling: {MAX_PROFILE_SECONDS}s")
+
+    try:
+        profiler.start(torch_profile=torch_profile)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        # O event loop continua atendendo requisições enquanto as amostras são coletadas
+        await asyncio.sleep(seconds)
+    finally:
+        result = profiler.stop()
+
+    headers = {
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Worker-Pid": str(os.getpid())
+    }
+    if persist:
+        headers["X-Profile-File"] = save_profile(result["python"], PROFILE_DIR)
+    if torch_profile:
+        headers["X-Torch-Profile-File"] = save_profile(result["torch"], PROFILE_DIR, suffix="torch.folded")
+
+    return PlainTextResponse(result["python"], headers=headers)
+
+@app.post("/candidates/session", response_model=CandidateSessionResponse)
+async def register_candidate_session(candidate: CandidateData):
+    """
+    Processa o candidato uma vez e devolve um handle de vida curta
+    
+    /predict e /catalog/match aceitam candidate_handle no lugar de
+    candidate: o texto processado e o embedding do CV vêm da sessão, sem
+    reenviar nem recodificar o CV. O handle vale SESSION_TTL_S segundos
+    em qualquer worker.
+    """
+    candidate_text = model_manager.extract_candidate_text(candidate)
+    candidate_embedding = client_embedding(candidate.embedding)
+    if candidate_embedding is None and (not candidate_text or len(candidate_text.strip()) == 0):
+        raise HTTPException(status_code=400, detail="Dados do candidato insuficientes para análise")
+    
+    encoded = candidate_embedding is None
+    if encoded:
+        candidate_embedding = await asyncio.to_thread(model_manager.generate_embedding, candidate_text)
+    try:
+        handle, session = candidate_sessions.register(candidate_text, candidate_embedding, encoded=encoded)
+    except OSError as e:
+        # Ex.: SESSION_DIR sem espaço (ENOSPC no /dev/shm); o cliente pode reenviar o candidato
+        logger.error(f"Falha ao gravar sessão de candidato em {SESSION_DIR}: {e}")
+        raise HTTPException(status_code=503, detail="Sessões de candidato indisponíveis; envie o candidato na requisição")
+    return CandidateSessionResponse(
+        handle=handle,
+        expires_at=datetime.fromtimestamp(session.expires_at).isoformat(),
+        ttl_s=candidate_sessions.ttl,
+        candidate_processed_text=truncate_text(candidate_text)
+    )
+
+@app.delete("/candidates/session/{handle}", status_code=204)
+async def delete_candidate_session(handle: str):
+    """Encerra a sessão antes do TTL"""
+    if not candidate_sessions.delete(handle):
+        raise HTTPException(status_code=404, detail="Sessão do candidato expirada ou inexistente")
+
 @app.post("/predict", response_model=PredictionResponse)
-async def predict_job_matches(request: PredictionRequest):
+async def predict_job_matches(
+    request: PredictionRequest,
+    http_request: Request,
+    accept: Optional[str] = Header(None),
+    x_request_timeout_ms: Optional[str] = Header(None)
+):
     """
     Endpoint principal para predição de matches entre candidato e vagas
+    
+    O header Accept seleciona o formato da resposta: JSON (padrão),
+    application/x-msgpack ou application/octet-stream (ver app/serialization.py).
+    X-Request-Timeout-Ms reduz o prazo da requisição (ver app/admission.py).
     """
     PREDICTION_REQUESTS.inc()  # Incrementar contador
     
     start_time = datetime.now()
+    deadline = Deadline.from_header(x_request_timeout_ms, REQUEST_TIMEOUT_MS)
+    media_type = negotiate(accept)
+    capture_request = traffic_capture.should_capture()
+    status_code = 500
+    cost = request_cost(request)
+    admitted = False
     
     try:
+        # Recusa na entrada o que não cabe na capacidade livre do worker
+        if not admission.fits(cost):
+            PREDICTION_REJECTED.inc()
+            raise HTTPException(status_code=413, detail="Requisição excede a capacidade de processamento do worker")
+        if not admission.try_acquire(cost):
+            PREDICTION_REJECTED.inc()
+            raise HTTPException(status_code=503, detail="Capacidade de processamento esgotada",
+                                headers={"Retry-After": "1"})
+        admitted = True
+        
         with PREDICTION_DURATION.time():  # Medir duração
             logger.info(f"Processando request com {len(request.jobs)} vagas")
         
-        # Extrair e processar texto do candidato
-        candidate_text = model_manager.extract_candidate_text(request.candidate)
+        # Extrair e processar texto do candidato (ou reaproveitar a sessão do handle)
+        candidate = resolve_candidate(request)
+        candidate_text, candidate_embedding = candidate.text, candidate.embedding
         
-        if not candidate_text or len(candidate_text.strip()) == 0:
+        if candidate_embedding is None and (not candidate_text or len(candidate_text.strip()) == 0):
             raise HTTPException(
                 status_code=400, 
                 detail="Dados do candidato insuficientes para análise"
             )
         
-        # Gerar embedding do candidato
-        candidate_embedding = model_manager.generate_embedding(candidate_text)
-        
-        # Processar cada vaga e calcular scores
-        recommendations = []
+        # Vagas por texto passam pelo encoder; vagas por id do catálogo ou com
+        # embedding pronto vão direto para os scores (vagas sem texto são ignoradas)
+        job_indices = []
+        previews = []
+        job_texts, text_positions = [], []
+        job_vectors, vector_positions = [], []
+        unknown_job_ids = []
         
         for idx, job in enumerate(request.jobs):
-            # Extrair texto da vaga
-            job_text = model_manager.extract_job_text(job)
-            
-            if not job_text or len(job_text.strip()) == 0:
+            if job.embedding is not None:
+                vector, preview = job.embedding, ""
+            elif job.job_id is not None:
+                row = model_manager.job_row(job.job_id)
+                if row is None:
+                    unknown_job_ids.append(job.job_id)
+                    continue
+                vector, preview = model_manager.job_embeddings[row], catalog_preview(row)
+            else:
+                job_text = model_manager.extract_job_text(job)
+                
+                if not job_text or len(job_text.strip()) == 0:
+                    continue
+                
+                text_positions.append(len(job_indices))
+                job_texts.append(job_text)
+                job_indices.append(idx)
+                previews.append(job_preview(job_text))
                 continue
             
-            # Gerar embedding da vaga
-            job_embedding = model_manager.generate_embedding(job_text)
+            vector_positions.append(len(job_indices))
+            job_vectors.append(vector)
+            job_indices.append(idx)
+            previews.append(preview)
+        
+        if unknown_job_ids:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Vagas não encontradas no catálogo: {', '.join(unknown_job_ids[:20])}"
+            )
+        
+        similarity_scores = np.zeros(len(job_indices), dtype=np.float64)
+        ml_scores = np.zeros(len(job_indices), dtype=np.float64)
+        drift_job_embeddings = []
+        
+        if job_texts:
+            # Candidato por embedding do cliente não tem texto para a chave do cache de pares
+            use_cache = candidate.encoded
+            if use_cache:
+                # Pares já pontuados vêm do cache; só os pares novos passam pelos modelos
+                pair_scores = pair_score_cache.get_many(model_manager.model_version, candidate_text, job_texts)
+            else:
+                pair_scores = [None] * len(job_texts)
+            missing = [i for i, scores in enumerate(pair_scores) if scores is None]
+            
+            if use_cache:
+                PAIR_CACHE_HITS.inc(len(pair_scores) - len(missing))
+                PAIR_CACHE_MISSES.inc(len(missing))
+                PAIR_CACHE_HIT_RATIO.set(pair_score_cache.hit_ratio)
+            
+            if missing and candidate_embedding is None:
+                # Gerar embedding do candidato
+                await ensure_active(http_request, deadline, "candidate_embedding")
+                candidate_embedding = await asyncio.to_thread(model_manager.generate_embedding, candidate_text)
             
-            # Calcular similaridade coseno
-            similarity_score = model_manager.calculate_similarity(candidate_embedding, job_embedding)
+            # Vagas novas em lotes, com verificação de prazo/desconexão entre eles.
+            # Cada lote roda em uma thread: o event loop continua atendendo
+            # /health, /metrics e as outras requisições do worker enquanto isso
+            for start in range(0, len(missing), PREDICT_CHUNK_SIZE):
+                await ensure_active(http_request, deadline, "job_embeddings")
+                chunk = missing[start:start + PREDICT_CHUNK_SIZE]
+                chunk_texts = [job_texts[i] for i in chunk]
+                job_embeddings, chunk_similarities, chunk_ml_scores = await asyncio.to_thread(
+                    score_job_texts, candidate_embedding, chunk_texts
+                )
+                
+                if use_cache:
+                    pair_score_cache.put_many(model_manager.model_version, candidate_text, chunk_texts,
+                                              chunk_similarities, chunk_ml_scores)
+                for i, similarity_score, ml_score in zip(chunk, chunk_similarities, chunk_ml_scores):
+                    pair_scores[i] = (float(similarity_score), float(ml_score))
+                drift_job_embeddings.append(job_embeddings)
             
-            # Calcular score do modelo neural
-            ml_score = model_manager.predict_match(candidate_embedding, job_embedding)
+            positions = np.asarray(text_positions, dtype=np.int64)
+            similarity_scores[positions] = [similarity for similarity, _ in pair_scores]
+            ml_scores[positions] = [ml_score for _, ml_score in pair_scores]
+        
+        if job_vectors:
+            await ensure_active(http_request, deadline, "vector_scores")
+            if candidate_embedding is None:
+                candidate_embedding = await asyncio.to_thread(model_manager.generate_embedding, candidate_text)
             
-            # Aplicar threshold
-            if ml_score >= request.threshold:
-                recommendations.append(JobMatch(
-                    job_index=idx,
-                    similarity_score=similarity_score,
-                    ml_score=ml_score,
-                    job_preview=job_text[:200] + "..." if len(job_text) > 200 else job_text
-                ))
+            job_embeddings = np.asarray(job_vectors, dtype=np.float32)
+            positions = np.asarray(vector_positions, dtype=np.int64)
+            similarity_scores[positions], ml_scores[positions] = await asyncio.to_thread(
+                score_job_vectors, candidate_embedding, job_embeddings
+            )
+        
+        if drift_monitor is not None and drift_job_embeddings:
+            drift_monitor.update_embeddings("candidate", candidate_embedding)
+            drift_monitor.update_embeddings("job", np.concatenate(drift_job_embeddings))
         
-        # Ordenar por score do modelo neural (decrescente)
-        recommendations.sort(key=lambda x: x.ml_score, reverse=True)
+        if drift_monitor is not None and len(job_indices):
+            drift_monitor.update_scores(similarity_scores, ml_scores)
         
-        # Limitar ao top_k
-        recommendations = recommendations[:request.top_k]
+        # Aplicar threshold, ordenar pelo score do modelo neural e limitar ao top_k
+        selected = rank_matches(ml_scores, request.threshold, request.top_k)
+        selected_ml_scores = ml_scores[selected]
+        avg_ml_score = float(selected_ml_scores.mean()) if len(selected) else 0
         
         # Calcular tempo de processamento
         processing_time = (datetime.now() - start_time).total_seconds() * 1000
         
         # Log da operação
-        logger.info(f"Processamento concluído: {len(recommendations)} matches encontrados em {processing_time:.2f}ms")
+        logger.info(f"Processamento concluído: {len(selected)} matches encontrados em {processing_time:.2f}ms")
         
         # Atualizar métricas Prometheus
-        ML_SCORE_GAUGE.set(np.mean([r.ml_score for r in recommendations]) if recommendations else 0)
-        MATCH_RATE_GAUGE.set(len(recommendations) / len(request.jobs) if request.jobs else 0)
+        ML_SCORE_GAUGE.set(avg_ml_score)
+        MATCH_RATE_GAUGE.set(len(selected) / len(request.jobs) if request.jobs else 0)
         PROCESSING_TIME_GAUGE.set(processing_time)
         
         # Registrar para monitoramento
         log_prediction_metrics(
             n_jobs=len(request.jobs),
-            n_matches=len(recommendations),
+            n_matches=len(selected),
             processing_time_ms=processing_time,
-            avg_ml_score=np.mean([r.ml_score for r in recommendations]) if recommendations else 0,
+            avg_ml_score=avg_ml_score,
             threshold=request.threshold
         )
         
-        return PredictionResponse(
-            candidate_processed_text=candidate_text[:500] + "..." if len(candidate_text) > 500 else candidate_text,
-            recommendations=recommendations,
+        # Serializa direto dos arrays, sem um JobMatch por vaga
+        status_code = 200
+        return prediction_response(
+            media_type,
+            candidate_processed_text=truncate_text(candidate_text),
+            job_indices=np.asarray(job_indices, dtype=np.int64)[selected],
+            similarity_scores=similarity_scores[selected],
+            ml_scores=selected_ml_scores,
+            previews=[previews[i] for i in selected],
             processing_time_ms=processing_time,
             timestamp=datetime.now().isoformat()
         )
         
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    
+    except RequestCancelled as e:
+        # 499: convenção do nginx para cliente que desistiu da resposta
+        PREDICTION_CANCELLED.labels(reason=e.reason).inc()
+        status_code = 499 if isinstance(e, ClientDisconnected) else 504
+        logger.warning(f"Predição interrompida ({e}) após {(datetime.now() - start_time).total_seconds() * 1000:.2f}ms")
+        detail = "Cliente desconectado" if status_code == 499 else "Prazo da requisição esgotado"
+        raise HTTPException(status_code=status_code, detail=detail)
+    
     except Exception as e:
         PREDICTION_ERRORS.inc()  # Incrementar contador de erros
         logger.error(f"Erro durante predição: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    
+    finally:
+        if admitted:
+            admission.release(cost)
+        if capture_request:
+            # Headers que mudam a resposta, para o replay reproduzir a mesma requisição
+            headers = {"accept": accept, "x-request-timeout-ms": x_request_timeout_ms}
+            traffic_capture.record(
+                request.model_dump(),
+                received_at=start_time.timestamp(),
+                duration_ms=(datetime.now() - start_time).total_seconds() * 1000,
+                status_code=status_code,
+                headers={name: value for name, value in headers.items() if value is not None}
+            )
+
+@app.post("/catalog/match", response_model=CatalogMatchResponse)
+async def match_catalog(request: CatalogMatchRequest, accept: Optional[str] = Header(None)):
+    """
+    Top-k do catálogo de vagas inteiro para um candidato
+    
+    Com shards configurados a consulta é distribuída e mesclada até
+    CATALOG_DEADLINE_MS; shards atrasados ficam de fora e o header
+    X-Partial-Result indica resultado parcial.
+    
+    Com retrieval=hybrid o índice BM25 escolhe LEXICAL_CANDIDATES vagas e só
+    elas recebem o score denso; sem nenhum termo do candidato no índice a
+    busca volta a ser densa (header X-Retrieval).
+    """
+    hybrid = request.retrieval == "hybrid"
+    if hybrid and getattr(model_manager, "job_lexical", None) is None:
+        raise HTTPException(status_code=503, detail="Índice léxico indisponível (gere com python -m app.lexical)")
+    
+    start_time = datetime.now()
+    candidate = resolve_candidate(request)
+    candidate_text, candidate_embedding = candidate.text, candidate.embedding
+    if candidate_embedding is None and (not candidate_text or len(candidate_text.strip()) == 0):
+        raise HTTPException(status_code=400, detail="Dados do candidato insuficientes para análise")
+    if hybrid and (not candidate_text or len(candidate_text.strip()) == 0):
+        raise HTTPException(status_code=400, detail="Busca híbrida requer os textos do candidato")
+    
+    try:
+        with CATALOG_MATCH_DURATION.time():
+            if candidate_embedding is None:
+                candidate_embedding = model_manager.generate_embedding(candidate_text)
+            result = None
+            if hybrid:
+                result = await asyncio.to_thread(lexical_catalog_top_k, candidate_text, candidate_embedding, request)
+            if result is None:
+                if job_catalog is None:
+                    raise HTTPException(status_code=503, detail="Catálogo de vagas indisponível")
+                # Scatter-gather bloqueante fora do event loop
+                result = await asyncio.to_thread(
+                    job_catalog.top_k, candidate_embedding, request.top_k, request.threshold, request.score
+                )
+                hybrid = False
+    except RuntimeError as e:
+        logger.error(f"Erro no catálogo: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    if result.partial:
+        CATALOG_PARTIAL_RESULTS.inc()
+    
+    processing_time = (datetime.now() - start_time).total_seconds() * 1000
+    logger.info(f"Catálogo: {len(result.indices)} matches em {processing_time:.2f}ms"
+                f" ({result.shards - len(result.missing_shards)}/{result.shards} shards)")
+    
+    rows = result.indices.tolist()
+    return prediction_response(
+        negotiate(accept),
+        candidate_processed_text=truncate_text(candidate_text),
+        job_indices=result.indices,
+        similarity_scores=result.similarity_scores,
+        ml_scores=result.ml_scores,
+        previews=[catalog_preview(row) for row in rows],
+        processing_time_ms=processing_time,
+        timestamp=datetime.now().isoformat(),
+        job_ids=[catalog_job_id(row) for row in rows],
+        headers={
+            "X-Catalog-Shards": str(result.shards),
+            "X-Partial-Result": "true" if result.partial else "false",
+            "X-Missing-Shards": ",".join(str(shard) for shard in result.missing_shards),
+            "X-Retrieval": "hybrid" if hybrid else "dense",
+        }
+    )
+
+@app.get("/recommendations/candidates/{candidate_id}", response_model=StoredRecommendationsResponse)
+async def candidate_recommendations(candidate_id: str, top_k: int = Query(default=10, ge=1, le=1000)):
+    """
+    Melhores vagas pré-calculadas para um candidato de candidate_embeddings.npy
+    
+    Leitura de uma linha da tabela materializada, sem encoder nem rede
+    neural. table_age_s informa há quanto tempo a tabela foi atualizada e
+    top_k é limitado ao k com que a tabela foi gerada.
+    """
+    return stored_recommendations("candidate_jobs", candidate_id, top_k)
+
+@app.get("/recommendations/jobs/{job_id}", response_model=StoredRecommendationsResponse)
+async def job_recommendations(job_id: str, top_k: int = Query(default=10, ge=1, le=1000)):
+    """Melhores candidatos pré-calculados para uma vaga do catálogo"""
+    return stored_recommendations("job_candidates", job_id, top_k)
 
 def log_prediction_metrics(n_jobs: int, n_matches: int, processing_time_ms: float, 
                           avg_ml_score: float, threshold: float):
     """Log métricas para monitoramento"""
     metrics = {
-        "timestamp": datetime.now().isoformat(),
         "n_jobs": n_jobs,
         "n_matches": n_matches,
         "processing_time_ms": processing_time_ms,
@@ -336,7 +1040,8 @@ def log_prediction_metrics(n_jobs: int, n_matches: int, processing_time_ms: floa
     }
     
     # Log estruturado para coleta por ferramentas de monitoramento
-    logger.info(f"PREDICTION_METRICS: {json.dumps(metrics)}")
+    # (a serialização em JSON acontece na thread de escrita, fora da requisição)
+    logger.info("PREDICTION_METRICS", extra={"fields": metrics})
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,46 @@
+"""
+Rede neural de matching candidato-vaga (mesma arquitetura do notebook)
+
+Separada de app/main.py para ser usada pelo treino (app/train.py) sem
+carregar os modelos da API.
+"""
+import hashlib
+from typing import Optional
+
+import torch
+import torch.nn as nn
+
+
+class JobCandidateMatchingNet(nn.Module):
+    def __init__(self, embedding_dim=384, hidden_dim=256):
+        super(JobCandidateMatchingNet, self).__init__()
+        input_dim = embedding_dim * 2
+        self.layers = nn.Sequential(
+            nn.Linear(input_dim, hidden_dim),
+            nn.ReLU(),
+            nn.Dropout(0.3),
+            nn.Linear(hidden_dim, hidden_dim // 2),
+            nn.ReLU(),
+            nn.Dropout(0.2),
+            nn.Linear(hidden_dim // 2, 64),
+            nn.ReLU(),
+            nn.Linear(64, 1),
+            nn.Sigmoid()
+        )
+
+    def forward(self, candidate_embedding, job_embedding):
+        combined = torch.cat([candidate_embedding, job_embedding], dim=1)
+        output = self.layers(combined)
+        return output
+
+
+def model_version(model: nn.Module, encoder_digest: Optional[str] = None) -> str:
+    """
+    Versão do modelo: hash dos pesos da rede neural e do encoder
+    (encoder_fingerprint de model/encoder; sem ele, só o nome do encoder)
+    """
+    digest = hashlib.sha256((encoder_digest or "all-MiniLM-L6-v2").encode("utf-8"))
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode("utf-8"))
+        digest.update(tensor.cpu().numpy().tobytes())
+    return digest.hexdigest()[:12]
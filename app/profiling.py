@@ -0,0 +1,168 @@
+"""
+Profiling sob demanda para workers em produção
+
+Captura pilhas Python por amostragem (sys._current_frames) em uma thread
+separada e, opcionalmente, o profiler do PyTorch em volta das chamadas do
+ModelManager. O resultado é gerado no formato "folded" (uma pilha por linha
+seguida da contagem), compatível com flamegraph.pl, speedscope e inferno.
+
+Quando nenhum profiling está ativo não há thread rodando e as seções do
+torch se resumem a um nullcontext.
+"""
+import os
+import sys
+import time
+import threading
+import contextlib
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _frame_label(frame) -> str:
+    """Rótulo curto de um frame: função (arquivo:linha)"""
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def fold_stack(frame) -> str:
+    """Converte um frame em pilha folded (da raiz para a folha)"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def render_folded(stacks: Counter) -> str:
+    """Serializa contagens de pilhas no formato folded"""
+    lines = [f"{stack} {count}" for stack, count in sorted(stacks.items()) if count > 0]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+class SamplingProfiler:
+    """Profiler por amostragem das threads Python do processo atual"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.torch_enabled = False
+        self._lock = threading.Lock()
+        self._torch_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Counter = Counter()
+        self._torch_stacks: Counter = Counter()
+        self._samples = 0
+        self._started_at = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None
+
+    def start(self, torch_profile: bool = False):
+        """Inicia a coleta; falha se já houver um profiling em andamento"""
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("Profiling já em andamento neste worker")
+
+            self._stacks = Counter()
+            self._torch_stacks = Counter()
+            self._samples = 0
+            self._started_at = time.monotonic()
+            self._stop.clear()
+            self.torch_enabled = torch_profile
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+        logger.info(f"Profiling iniciado (intervalo={self.interval}s, torch={torch_profile})")
+
+    def stop(self) -> Dict:
+        """Encerra a coleta e retorna as pilhas no formato folded"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                raise RuntimeError("Nenhum profiling em andamento")
+            self._stop.set()
+
+        thread.join()
+
+        with self._lock:
+            self._thread = None
+            self.torch_enabled = False
+            result = {
+                "python": render_folded(self._stacks),
+                "torch": render_folded(self._torch_stacks),
+                "samples": self._samples,
+                "duration_s": time.monotonic() - self._started_at,
+            }
+
+        logger.info(f"Profiling encerrado: {result['samples']} amostras em {result['duration_s']:.1f}s")
+        return result
+
+    def _run(self):
+        own_ident = threading.get_ident()
+
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                thread_name = names.get(ident, str(ident)).replace(";", ",")
+                self._stacks[f"{thread_name};{fold_stack(frame)}"] += 1
+
+            self._samples += 1
+
+    def torch_section(self, name: str):
+        """Contexto para envolver chamadas de modelo com o profiler do torch"""
+        if not self.torch_enabled:
+            return _NULL_CONTEXT
+        return self._torch_record(name)
+
+    @contextlib.contextmanager
+    def _torch_record(self, name: str):
+        # O profiler do torch não pode ser aninhado: seções concorrentes passam direto
+        if not self._torch_lock.acquire(blocking=False):
+            yield
+            return
+
+        try:
+            from torch.profiler import profile, ProfilerActivity
+
+            with profile(activities=[ProfilerActivity.CPU], with_stack=True) as prof:
+                yield
+
+            for event in prof.events():
+                # Tempo próprio em microssegundos, com a cadeia de eventos pais como pilha
+                weight = int(event.self_cpu_time_total)
+                if weight <= 0:
+                    continue
+                labels = []
+                node = event
+                while node is not None:
+                    labels.append(node.name.replace(";", ","))
+                    node = node.cpu_parent
+                labels.append(name)
+                self._torch_stacks[";".join(reversed(labels))] += weight
+        finally:
+            self._torch_lock.release()
+
+
+def save_profile(content: str, directory: str, suffix: str = "folded") -> str:
+    """Persiste um profile folded em disco e retorna o caminho"""
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"profile-{timestamp}-{os.getpid()}.{suffix}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,281 @@
+"""
+Projeção PCA dos embeddings para o primeiro passo da busca no catálogo
+
+Varrer os vetores de 384 dimensões a cada consulta gasta banda de memória,
+quase toda com vagas que nunca chegam ao top-k. A projeção é ajustada
+offline sobre job_embeddings.npy e candidate_embeddings.npy (vetores
+normalizados) e guarda uma cópia do catálogo com `dim` dimensões. Na
+consulta o catálogo reduzido escolhe uma shortlist e só ela recebe a
+similaridade coseno completa e a rede neural (ver ShardScorer.top_k).
+
+Para vetores normalizados u e média m, com z = C (u - m) na base dos
+componentes principais C:
+
+    u_q · u_j  ≈  z_q · z_j + m · u_j + (termos que não dependem de j)
+
+então a ordem aproximada de uma consulta usa z_j e o offset m · u_j de
+cada linha; a componente média dos embeddings entra sem erro.
+
+Layout do diretório (ex.: model/projection):
+
+    manifest.json                   dim, variância explicada, relatório de recall@k e fingerprints
+                                    dos embeddings projetados (blocos de FINGERPRINT_ROWS linhas)
+    mean.npy / components.npy       média [384] e componentes [dim, 384]
+    <kind>.npy / <kind>_offsets.npy catálogo projetado [n, dim] e offsets [n] (kind = job, candidate)
+
+A projeção só vale para os embeddings de que foi gerada: quem abre o
+catálogo reduzido compara os fingerprints do manifest com os embeddings
+carregados (projection_matches) e, se diferem, faz o score completo.
+
+Geração e relatório de recall@k:
+    python -m app.projection --model-dir model --dim 64
+    python -m app.projection --model-dir model --sweep 32,64,128 --shortlist 1000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+KINDS = ("job", "candidate")
+MANIFEST = "manifest.json"
+# Linhas por fingerprint dos embeddings no manifest
+FINGERPRINT_ROWS = 1024
+
+
+def unit_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class PcaProjection:
+    """Média e componentes principais dos embeddings normalizados"""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance_ratio: np.ndarray):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained_variance_ratio = np.asarray(explained_variance_ratio, dtype=np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, arrays: Sequence[np.ndarray], dim: int, block_rows: int = 8192) -> "PcaProjection":
+        """Covariância acumulada em blocos (funciona com arquivos em mmap de qualquer tamanho)"""
+        width = arrays[0].shape[1]
+        if not 0 < dim <= width:
+            raise ValueError(f"dim deve estar entre 1 e {width}")
+        total = np.zeros(width, dtype=np.float64)
+        second_moment = np.zeros((width, width), dtype=np.float64)
+        rows = 0
+        for array in arrays:
+            for start in range(0, len(array), block_rows):
+                block = unit_rows(array[start:start + block_rows]).astype(np.float64)
+                total += block.sum(axis=0)
+                second_moment += block.T @ block
+                rows += len(block)
+        if not rows:
+            raise ValueError("nenhum embedding para ajustar a projeção")
+
+        mean = total / rows
+        covariance = second_moment / rows - np.outer(mean, mean)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1]
+        eigenvalues = np.maximum(eigenvalues[order], 0.0)
+        ratio = eigenvalues / max(float(eigenvalues.sum()), 1e-12)
+        return cls(mean, eigenvectors[:, order[:dim]].T, ratio[:dim])
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return (unit_rows(vectors) - self.mean) @ self.components.T
+
+    def offsets(self, vectors: np.ndarray) -> np.ndarray:
+        return unit_rows(vectors) @ self.mean
+
+
+class ProjectedCatalog:
+    """Catálogo reduzido: escolhe a shortlist de uma consulta pelo score aproximado"""
+
+    def __init__(self, projection: PcaProjection, vectors: np.ndarray, offsets: np.ndarray):
+        self.projection = projection
+        self.vectors = vectors
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, projection: PcaProjection, embeddings: np.ndarray, block_rows: int = 8192) -> "ProjectedCatalog":
+        vectors = np.empty((len(embeddings), projection.dim), dtype=np.float32)
+        offsets = np.empty(len(embeddings), dtype=np.float32)
+        for start in range(0, len(embeddings), block_rows):
+            block = embeddings[start:start + block_rows]
+            vectors[start:start + len(block)] = projection.transform(block)
+            offsets[start:start + len(block)] = projection.offsets(block)
+        return cls(projection, vectors, offsets)
+
+    @classmethod
+    def open(cls, path: str, kind: str = "job", mmap_mode: Optional[str] = "r") -> "ProjectedCatalog":
+        return cls(load_projection(path),
+                   np.load(os.path.join(path, f"{kind}.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, f"{kind}_offsets.npy"), mmap_mode=mmap_mode))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def rows(self, start: int, end: int) -> "ProjectedCatalog":
+        """Faixa de linhas copiada para a memória (shard)"""
+        return ProjectedCatalog(self.projection, np.array(self.vectors[start:end], dtype=np.float32),
+                                np.array(self.offsets[start:end], dtype=np.float32))
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Score aproximado (mesma ordem da similaridade coseno, a menos do erro da projeção)"""
+        return self.vectors @ self.projection.transform(query.reshape(1, -1))[0] + self.offsets
+
+    def shortlist(self, query: np.ndarray, size: int) -> np.ndarray:
+        """Linhas (em ordem crescente) dos `size` maiores scores aproximados"""
+        scores = self.scores(np.asarray(query, dtype=np.float32))
+        if size >= len(scores):
+            return np.arange(len(scores))
+        return np.sort(np.argpartition(-scores, size - 1)[:size])
+
+
+def block_fingerprints(embeddings: np.ndarray, block_rows: int = FINGERPRINT_ROWS) -> List[str]:
+    return [hashlib.sha1(np.ascontiguousarray(embeddings[start:start + block_rows], dtype=np.float32)).hexdigest()
+            for start in range(0, len(embeddings), block_rows)]
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def projection_matches(path: str, kind: str, embeddings: np.ndarray) -> bool:
+    """Projeção em `path` gerada a partir destes embeddings (mesmas linhas e mesmos valores)"""
+    manifest = read_manifest(path)
+    if manifest is None or kind not in manifest.get("fingerprints", {}):
+        return False
+    return manifest["fingerprints"][kind] == block_fingerprints(embeddings, manifest["block_rows"])
+
+
+def load_projection(path: str) -> PcaProjection:
+    return PcaProjection(np.load(os.path.join(path, "mean.npy")),
+                         np.load(os.path.join(path, "components.npy")),
+                         np.load(os.path.join(path, "explained_variance_ratio.npy")))
+
+
+def write_projection(path: str, projection: PcaProjection, embeddings: Dict[str, np.ndarray],
+                     report: Optional[Dict] = None):
+    """Grava a projeção e os catálogos reduzidos; o diretório final só é trocado no fim"""
+    tmp_path = path.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "mean.npy"), projection.mean)
+    np.save(os.path.join(tmp_path, "components.npy"), projection.components)
+    np.save(os.path.join(tmp_path, "explained_variance_ratio.npy"), projection.explained_variance_ratio)
+    for kind, array in embeddings.items():
+        catalog = ProjectedCatalog.build(projection, array)
+        np.save(os.path.join(tmp_path, f"{kind}.npy"), catalog.vectors)
+        np.save(os.path.join(tmp_path, f"{kind}_offsets.npy"), catalog.offsets)
+    with open(os.path.join(tmp_path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({
+            "dim": projection.dim,
+            "explained_variance": float(projection.explained_variance_ratio.sum()),
+            "rows": {kind: len(array) for kind, array in embeddings.items()},
+            "block_rows": FINGERPRINT_ROWS,
+            "fingerprints": {kind: block_fingerprints(array) for kind, array in embeddings.items()},
+            "built_at": time.time(),
+            "recall": report,
+        }, f, indent=2)
+
+    if os.path.isdir(path):
+        old_path = path.rstrip(os.sep) + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def recall_report(catalog: ProjectedCatalog, embeddings: np.ndarray, queries: np.ndarray, k: int = 10,
+                  shortlist: int = 1000, ml_scorer: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None) -> Dict:
+    """
+    recall@k do primeiro passo: fração do top-k exato (todas as linhas em 384
+    dimensões) que sobrevive à shortlist e, portanto, aparece no top-k final.
+    Com ml_scorer(consulta, linhas) o top-k exato também é medido pelo score neural.
+    """
+    unit = unit_rows(embeddings)
+    recalls: Dict[str, List[float]] = {"similarity": []}
+    if ml_scorer is not None:
+        recalls["ml"] = []
+    for query in np.asarray(queries, dtype=np.float32):
+        survivors = set(catalog.shortlist(query, shortlist).tolist())
+        exact = {"similarity": unit @ unit_rows(query)}
+        if ml_scorer is not None:
+            exact["ml"] = ml_scorer(query, embeddings)
+        for score, values in exact.items():
+            top = np.argsort(-values, kind="stable")[:k]
+            recalls[score].append(len(survivors.intersection(top.tolist())) / len(top))
+    return {
+        "dim": catalog.projection.dim,
+        "explained_variance": float(catalog.projection.explained_variance_ratio.sum()),
+        "k": k,
+        "shortlist": min(shortlist, len(catalog)),
+        "catalog_size": len(catalog),
+        "queries": len(queries),
+        "scan_ratio": catalog.projection.dim / embeddings.shape[1],
+        **{f"recall_{score}": float(np.mean(values)) if values else 0.0 for score, values in recalls.items()},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ajusta a projeção PCA do catálogo e mede o recall@k do primeiro passo")
+    parser.add_argument("--model-dir", default="model", help="Diretório com os embeddings")
+    parser.add_argument("--output", default=None, help="Diretório da projeção (padrão: <model-dir>/projection)")
+    parser.add_argument("--dim", type=int, default=64, help="Dimensões mantidas")
+    parser.add_argument("--sweep", default="", help="Dimensões separadas por vírgula: só imprime o recall, sem gravar")
+    parser.add_argument("--k", type=int, default=10, help="k do recall@k")
+    parser.add_argument("--shortlist", type=int, default=1000, help="Vagas que passam para o score completo")
+    parser.add_argument("--queries", type=int, default=200, help="Candidatos usados como consulta no relatório")
+    parser.add_argument("--model", action="store_true", help="Mede também o recall do top-k pelo score neural")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    embeddings = {kind: np.load(os.path.join(args.model_dir, f"{kind}_embeddings.npy"), mmap_mode="r") for kind in KINDS}
+    rng = np.random.default_rng(args.seed)
+    candidates = embeddings["candidate"]
+    queries = np.asarray(candidates[np.sort(rng.choice(len(candidates), min(args.queries, len(candidates)), replace=False))])
+    ml_scorer = None
+    if args.model:
+        import torch
+        from app.sharding import load_matching_model
+
+        model = load_matching_model(os.path.join(args.model_dir, "job_matching_neural_model.pth"), candidates.shape[1])
+
+        def ml_scorer(query, rows):
+            with torch.no_grad():
+                jobs = torch.from_numpy(np.asarray(rows, dtype=np.float32))
+                return model(torch.from_numpy(query).unsqueeze(0).expand(len(jobs), -1), jobs).numpy()[:, 0]
+
+    jobs = np.asarray(embeddings["job"], dtype=np.float32)
+    dims = [int(dim) for dim in args.sweep.split(",") if dim.strip()] or [args.dim]
+    for dim in dims:
+        projection = PcaProjection.fit([embeddings["job"], embeddings["candidate"]], dim)
+        report = recall_report(ProjectedCatalog.build(projection, jobs), jobs, queries,
+                               k=args.k, shortlist=args.shortlist, ml_scorer=ml_scorer)
+        print(json.dumps(report))
+        if not args.sweep:
+            output = args.output or os.path.join(args.model_dir, "projection")
+            write_projection(output, projection, embeddings, report)
+            print(f"Projeção com {dim} dimensões gravada em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,544 @@
+"""
+Tabela materializada de recomendações (top-k pré-calculado)
+
+A maior parte do /predict pede as melhores vagas do catálogo para
+candidatos que já estão em candidate_embeddings.npy. A tabela guarda, para
+cada candidato conhecido, as k vagas de maior score neural e, para cada
+vaga, os k melhores candidatos; a consulta vira a leitura de uma linha.
+
+Para cada linha de consulta a similaridade coseno escolhe `shortlist`
+alvos e só eles passam pela rede neural (shortlist=0 pontua todos os
+pares). A atualização é incremental: os embeddings são comparados em
+blocos de linhas com os fingerprints do manifest; linhas de blocos
+alterados ou novos, e linhas cujo top-k tinha um alvo alterado, são
+recalculadas por completo. As demais tomam a shortlist sobre todos os
+alvos, como na reconstrução, e mesclam ao top-k antigo os scores dos alvos
+alterados que estão nela; se um alvo do top-k antigo saiu da shortlist a
+linha também é recalculada. Com alvos só acrescentados o resultado é o
+mesmo da reconstrução. Com alvos modificados, um alvo inalterado que entra
+na shortlist porque um modificado saiu dela só aparece na próxima
+reconstrução (--force ou troca do modelo). Troca de versão do modelo, de k
+ou do shortlist, ou um catálogo que encolheu, reconstrói a tabela inteira.
+
+As linhas da tabela são linhas dos embeddings; a API as traduz para ids
+com os text stores que carregou. O manifest guarda o hash dos ids de cada
+text store lido junto com os embeddings, e um worker com outros ids
+carregados marca a resposta como desatualizada.
+
+Layout do diretório (ex.: model/recommendations):
+
+    manifest.json                       versão do modelo, k, instante da geração, fingerprints e hash dos ids
+    candidate_jobs.<array>.npy          [candidatos, k] vagas de cada candidato
+    job_candidates.<array>.npy          [vagas, k] candidatos de cada vaga
+
+com <array> = indices (int32, -1 sem vizinho), similarity e ml (float32).
+
+Geração/atualização manual, ou periódica fora da API (sidecar do docker-compose):
+    python -m app.recommendations --model-dir model
+    python -m app.recommendations --model-dir model --interval 600
+
+Os workers da API só reabrem a tabela gravada; recalcular dentro deles
+(RECOMMENDATION_REFRESH_INTERVAL > 0) disputa CPU e threads do torch com o
+/predict e fica desligado por padrão.
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import logging
+import argparse
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+
+from app.encoder import encoder_fingerprint
+from app.network import model_version
+from app.projection import block_fingerprints
+from app.sharding import load_matching_model
+from app.text_store import load_text_store
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+# Direção -> (tipo da consulta, tipo dos alvos)
+DIRECTIONS = {"candidate_jobs": ("candidate", "job"), "job_candidates": ("job", "candidate")}
+# Linhas por fingerprint: granularidade da detecção de mudanças no catálogo
+BLOCK_ROWS = 1024
+# Pares por forward da rede (limita a memória dos tensores de cada bloco)
+MAX_PAIRS = 32768
+
+
+class TopKTable(NamedTuple):
+    """Top-k por linha de consulta, em ordem decrescente de score neural"""
+    indices: np.ndarray
+    similarity_scores: np.ndarray
+    ml_scores: np.ndarray
+
+    @classmethod
+    def empty(cls, rows: int, k: int) -> "TopKTable":
+        return cls(np.full((rows, k), -1, dtype=np.int32),
+                   np.full((rows, k), np.nan, dtype=np.float32),
+                   np.full((rows, k), np.nan, dtype=np.float32))
+
+    def select(self, rows) -> "TopKTable":
+        return TopKTable(*(np.asarray(array[rows]) for array in self))
+
+    def assign(self, rows, other: "TopKTable"):
+        for target, source in zip(self, other):
+            target[rows] = source
+
+
+class PairScorer:
+    """Score neural de pares alinhados (candidatos[i], vagas[i]) em lotes"""
+
+    def __init__(self, model: torch.nn.Module, batch_size: int = 8192):
+        self.model = model
+        self.batch_size = batch_size
+
+    def __call__(self, candidates: np.ndarray, jobs: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(candidates), dtype=np.float32)
+        with torch.no_grad():
+            for i in range(0, len(candidates), self.batch_size):
+                candidate_batch = torch.from_numpy(np.ascontiguousarray(candidates[i:i + self.batch_size], dtype=np.float32))
+                job_batch = torch.from_numpy(np.ascontiguousarray(jobs[i:i + self.batch_size], dtype=np.float32))
+                scores[i:i + len(candidate_batch)] = self.model(candidate_batch, job_batch).numpy()[:, 0]
+        return scores
+
+
+def unit_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def compute_top_k(queries: np.ndarray, targets: np.ndarray, scorer: Callable, query_kind: str, k: int,
+                  shortlist: int = 0, rows: Optional[np.ndarray] = None,
+                  target_rows: Optional[np.ndarray] = None) -> TopKTable:
+    """Top-k das linhas `rows` de queries contra os alvos `target_rows` (padrão: todas)"""
+    rows = np.arange(len(queries)) if rows is None else np.asarray(rows, dtype=np.int64)
+    target_rows = np.arange(len(targets)) if target_rows is None else np.asarray(target_rows, dtype=np.int64)
+    table = TopKTable.empty(len(rows), k)
+    if not len(rows) or not len(target_rows):
+        return table
+
+    target_vectors = np.asarray(targets[target_rows], dtype=np.float32)
+    target_unit = unit_rows(target_vectors)
+    width = len(target_rows) if shortlist <= 0 else min(shortlist, len(target_rows))
+    keep = min(k, width)
+    block_rows = max(1, MAX_PAIRS // width)
+
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        query_vectors = np.asarray(queries[block], dtype=np.float32)
+        similarities = unit_rows(query_vectors) @ target_unit.T
+        if width < len(target_rows):
+            selected = np.argpartition(-similarities, width - 1, axis=1)[:, :width]
+        else:
+            selected = np.broadcast_to(np.arange(width), similarities.shape)
+
+        pair_queries = np.repeat(query_vectors, width, axis=0)
+        pair_targets = target_vectors[selected.reshape(-1)]
+        # A rede recebe sempre (candidato, vaga)
+        pair = (pair_queries, pair_targets) if query_kind == "candidate" else (pair_targets, pair_queries)
+        ml_scores = scorer(*pair).reshape(len(block), width)
+
+        order = np.argsort(-ml_scores, axis=1, kind="stable")[:, :keep]
+        end = start + len(block)
+        table.indices[start:end, :keep] = target_rows[np.take_along_axis(selected, order, axis=1)]
+        table.similarity_scores[start:end, :keep] = np.take_along_axis(
+            np.take_along_axis(similarities, selected, axis=1), order, axis=1)
+        table.ml_scores[start:end, :keep] = np.take_along_axis(ml_scores, order, axis=1)
+    return table
+
+
+def merge_top_k(current: TopKTable, other: TopKTable, k: int) -> TopKTable:
+    """Mescla dois top-k das mesmas linhas (alvos disjuntos) mantendo os k maiores"""
+    indices = np.concatenate([current.indices, other.indices], axis=1)
+    similarity_scores = np.concatenate([current.similarity_scores, other.similarity_scores], axis=1)
+    ml_scores = np.concatenate([current.ml_scores, other.ml_scores], axis=1)
+    key = np.where(indices >= 0, ml_scores, -np.inf)
+    order = np.argsort(-key, axis=1, kind="stable")[:, :k]
+    return TopKTable(np.take_along_axis(indices, order, axis=1),
+                     np.take_along_axis(similarity_scores, order, axis=1),
+                     np.take_along_axis(ml_scores, order, axis=1))
+
+
+def merge_changed_targets(current: TopKTable, queries: np.ndarray, targets: np.ndarray, scorer: Callable,
+                          query_kind: str, k: int, shortlist: int, rows: np.ndarray,
+                          changed_targets: np.ndarray) -> Tuple[TopKTable, np.ndarray]:
+    """
+    Mescla no top-k gravado (`current`, das linhas `rows`) os alvos alterados
+    que estão na shortlist de cada linha, tomada sobre todos os alvos.
+    Retorna a tabela mesclada e a máscara das linhas em que um alvo do top-k
+    gravado saiu da shortlist (precisam ser recalculadas).
+    """
+    merged = TopKTable.empty(len(rows), k)
+    evicted = np.zeros(len(rows), dtype=bool)
+    target_vectors = np.asarray(targets, dtype=np.float32)
+    target_unit = unit_rows(target_vectors)
+    width = len(targets) if shortlist <= 0 else min(shortlist, len(targets))
+    is_changed = np.zeros(len(targets), dtype=bool)
+    is_changed[changed_targets] = True
+    block_rows = max(1, MAX_PAIRS // width)
+
+    for start in range(0, len(rows), block_rows):
+        end = min(start + block_rows, len(rows))
+        query_vectors = np.asarray(queries[rows[start:end]], dtype=np.float32)
+        similarities = unit_rows(query_vectors) @ target_unit.T
+        in_shortlist = np.ones(similarities.shape, dtype=bool)
+        if width < len(targets):
+            in_shortlist[:] = False
+            np.put_along_axis(in_shortlist, np.argpartition(-similarities, width - 1, axis=1)[:, :width], True, axis=1)
+
+        old = current.indices[start:end]
+        evicted[start:end] = ((old >= 0) & ~np.take_along_axis(in_shortlist, np.maximum(old, 0), axis=1)).any(axis=1)
+
+        ml_scores = np.full(similarities.shape, -np.inf, dtype=np.float32)
+        pair_rows, pair_targets = np.nonzero(in_shortlist & is_changed)
+        if len(pair_rows):
+            pair_queries, pair_target_vectors = query_vectors[pair_rows], target_vectors[pair_targets]
+            # A rede recebe sempre (candidato, vaga)
+            pair = (pair_queries, pair_target_vectors) if query_kind == "candidate" \
+                else (pair_target_vectors, pair_queries)
+            ml_scores[pair_rows, pair_targets] = scorer(*pair)
+
+        order = np.argsort(-ml_scores, axis=1, kind="stable")[:, :k]
+        top_scores = np.take_along_axis(ml_scores, order, axis=1)
+        found = np.isfinite(top_scores)
+        partial = TopKTable(np.where(found, order, -1).astype(np.int32),
+                            np.where(found, np.take_along_axis(similarities, order, axis=1), np.nan).astype(np.float32),
+                            np.where(found, top_scores, np.nan).astype(np.float32))
+        merged.assign(slice(start, end), merge_top_k(current.select(slice(start, end)), partial, k))
+    return merged, evicted
+
+
+def update_top_k(table: TopKTable, queries: np.ndarray, targets: np.ndarray, scorer: Callable,
+                 query_kind: str, k: int, shortlist: int, changed_queries: np.ndarray,
+                 changed_targets: np.ndarray) -> Tuple[TopKTable, int]:
+    """Atualiza um top-k existente; retorna a tabela e quantas linhas foram recalculadas"""
+    updated = TopKTable.empty(len(queries), k)
+    kept = min(len(table.indices), len(queries))
+    updated.assign(slice(0, kept), table.select(slice(0, kept)))
+
+    stale = np.zeros(len(queries), dtype=bool)
+    stale[changed_queries] = True
+    stale[kept:] = True
+    if len(changed_targets):
+        stale |= np.isin(updated.indices, changed_targets).any(axis=1)
+
+    stale_rows = np.flatnonzero(stale)
+    if len(stale_rows):
+        updated.assign(stale_rows, compute_top_k(queries, targets, scorer, query_kind, k, shortlist, rows=stale_rows))
+
+    rest = np.flatnonzero(~stale)
+    evicted_rows = np.zeros(0, dtype=np.int64)
+    if len(rest) and len(changed_targets):
+        merged, evicted = merge_changed_targets(updated.select(rest), queries, targets, scorer, query_kind,
+                                                k, shortlist, rest, changed_targets)
+        updated.assign(rest, merged)
+        evicted_rows = rest[evicted]
+        if len(evicted_rows):
+            updated.assign(evicted_rows, compute_top_k(queries, targets, scorer, query_kind, k, shortlist,
+                                                       rows=evicted_rows))
+    return updated, len(stale_rows) + len(evicted_rows)
+
+
+def changed_rows(old_fingerprints: List[str], fingerprints: List[str], rows: int,
+                 block_rows: int = BLOCK_ROWS) -> np.ndarray:
+    """Linhas dos blocos novos ou com fingerprint diferente"""
+    blocks = [i for i, fingerprint in enumerate(fingerprints)
+              if i >= len(old_fingerprints) or old_fingerprints[i] != fingerprint]
+    if not blocks:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([np.arange(i * block_rows, min((i + 1) * block_rows, rows)) for i in blocks])
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def rebuild_reason(manifest: Optional[Dict], version: str, k: int, shortlist: int,
+                   block_rows: int, rows: Dict[str, int]) -> Optional[str]:
+    """Por que a tabela precisa ser reconstruída inteira (None: atualização incremental)"""
+    if manifest is None:
+        return "missing"
+    if manifest["model_version"] != version:
+        return "model_version"
+    if (manifest["k"], manifest["shortlist"], manifest["block_rows"]) != (k, shortlist, block_rows):
+        return "parameters"
+    if any(rows[kind] < manifest["rows"][kind] for kind in rows):
+        return "shrunk"
+    return None
+
+
+def load_top_k(path: str, direction: str, mmap_mode: Optional[str] = None) -> TopKTable:
+    return TopKTable(*(np.load(os.path.join(path, f"{direction}.{name}.npy"), mmap_mode=mmap_mode)
+                       for name in ("indices", "similarity", "ml")))
+
+
+def write_table(path: str, manifest: Dict, tables: Dict[str, TopKTable]):
+    """Grava em um diretório temporário e troca o diretório final no fim"""
+    tmp_path = path.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for direction, table in tables.items():
+        for name, array in zip(("indices", "similarity", "ml"), table):
+            np.save(os.path.join(tmp_path, f"{direction}.{name}.npy"), array)
+    with open(os.path.join(tmp_path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    if os.path.isdir(path):
+        old_path = path.rstrip(os.sep) + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def refresh_table(path: str, candidate_embeddings: np.ndarray, job_embeddings: np.ndarray,
+                  model: torch.nn.Module, k: int = 20, shortlist: int = 200,
+                  block_rows: int = BLOCK_ROWS, force: bool = False, encoder_digest: Optional[str] = None,
+                  ids: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Reconstrói ou atualiza a tabela em `path`; retorna o resumo da atualização.
+    `ids` é o hash dos ids de cada text store (ver TextStore.ids_fingerprint).
+    """
+    start_time = time.time()
+    version = model_version(model, encoder_digest)
+    embeddings = {"candidate": candidate_embeddings, "job": job_embeddings}
+    rows = {kind: len(array) for kind, array in embeddings.items()}
+    fingerprints = {kind: block_fingerprints(array, block_rows) for kind, array in embeddings.items()}
+
+    manifest = read_manifest(path)
+    reason = "forced" if force else rebuild_reason(manifest, version, k, shortlist, block_rows, rows)
+    changed = {}
+    if reason is None:
+        changed = {kind: changed_rows(manifest["fingerprints"][kind], fingerprints[kind], rows[kind], block_rows)
+                   for kind in embeddings}
+        if not any(len(array) for array in changed.values()) and manifest.get("ids") == ids:
+            return {"status": "fresh", "model_version": version, "built_at": manifest["built_at"]}
+
+    scorer = PairScorer(model)
+    tables: Dict[str, TopKTable] = {}
+    recomputed: Dict[str, int] = {}
+    for direction, (query_kind, target_kind) in DIRECTIONS.items():
+        queries, targets = embeddings[query_kind], embeddings[target_kind]
+        if reason is not None:
+            tables[direction] = compute_top_k(queries, targets, scorer, query_kind, k, shortlist)
+            recomputed[direction] = rows[query_kind]
+        else:
+            tables[direction], recomputed[direction] = update_top_k(
+                load_top_k(path, direction), queries, targets, scorer, query_kind, k, shortlist,
+                changed[query_kind], changed[target_kind]
+            )
+
+    built_at = time.time()
+    write_table(path, {
+        "model_version": version,
+        "k": k,
+        "shortlist": shortlist,
+        "block_rows": block_rows,
+        "built_at": built_at,
+        "rows": rows,
+        "fingerprints": fingerprints,
+        "ids": ids,
+    }, tables)
+    return {
+        "status": "rebuilt" if reason is not None else "updated",
+        "reason": reason,
+        "model_version": version,
+        "built_at": built_at,
+        "recomputed_rows": recomputed,
+        "duration_s": built_at - start_time,
+    }
+
+
+class RecommendationTable:
+    """Tabela gravada, aberta com mmap: a consulta lê uma linha de cada array"""
+
+    def __init__(self, manifest: Dict, tables: Dict[str, TopKTable]):
+        self.manifest = manifest
+        self.tables = tables
+
+    @classmethod
+    def open(cls, path: str) -> "RecommendationTable":
+        manifest = read_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"Tabela de recomendações não encontrada: {path}")
+        return cls(manifest, {direction: load_top_k(path, direction, mmap_mode="r") for direction in DIRECTIONS})
+
+    @property
+    def model_version(self) -> str:
+        return self.manifest["model_version"]
+
+    @property
+    def built_at(self) -> float:
+        return self.manifest["built_at"]
+
+    def matches_ids(self, ids: Dict[str, str]) -> bool:
+        """Tabela gerada com os mesmos ids por linha (hash de cada text store) que `ids`"""
+        return self.manifest.get("ids") == ids
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Segundos desde a última atualização da tabela"""
+        return max(0.0, (time.time() if now is None else now) - self.built_at)
+
+    def lookup(self, direction: str, row: int, top_k: Optional[int] = None) -> Optional[TopKTable]:
+        """Top-k gravado da linha (None se a linha não existe na tabela)"""
+        table = self.tables[direction]
+        if not 0 <= row < len(table.indices):
+            return None
+        indices = np.asarray(table.indices[row][:top_k])
+        valid = indices >= 0
+        return TopKTable(indices[valid], np.asarray(table.similarity_scores[row][:top_k])[valid],
+                         np.asarray(table.ml_scores[row][:top_k])[valid])
+
+
+def load_inputs(model_dir: str, embedding_dim: int = 384) -> Tuple[np.ndarray, np.ndarray, torch.nn.Module]:
+    """Embeddings e rede lidos do disco agora (podem ser mais novos que os carregados pela API)"""
+    return (np.load(os.path.join(model_dir, "candidate_embeddings.npy"), mmap_mode="r"),
+            np.load(os.path.join(model_dir, "job_embeddings.npy"), mmap_mode="r"),
+            load_matching_model(os.path.join(model_dir, "job_matching_neural_model.pth"), embedding_dim))
+
+
+def load_ids(model_dir: str) -> Dict[str, str]:
+    """Hash dos ids dos text stores em disco, que acompanham os embeddings de load_inputs"""
+    return {kind: load_text_store(model_dir, kind).ids_fingerprint() for kind in ("candidate", "job")}
+
+
+class RecommendationRefresher:
+    """
+    Thread que atualiza a tabela a cada `interval` segundos e recarrega a
+    versão gravada. Com vários workers um lock de arquivo garante que só um
+    processo recalcula; os demais apenas reabrem a tabela nova. Com
+    interval <= 0 a thread só reabre a tabela gravada por outro processo.
+    """
+
+    def __init__(self, path: str, load_inputs: Callable[[], Tuple[np.ndarray, np.ndarray, torch.nn.Module]],
+                 k: int = 20, shortlist: int = 200, interval: float = 600.0, reload_interval: float = 30.0,
+                 encoder_path: Optional[str] = None, load_ids: Optional[Callable[[], Dict[str, str]]] = None):
+        self.path = path
+        self.load_inputs = load_inputs
+        # Hash dos ids lidos junto com os embeddings, gravado no manifest (None: não verificado)
+        self.load_ids = load_ids
+        # Diretório do encoder: entra na versão do modelo, como na API
+        self.encoder_path = encoder_path
+        self.k = k
+        self.shortlist = shortlist
+        self.interval = interval
+        self.reload_interval = reload_interval
+        self.table: Optional[RecommendationTable] = None
+        self.last_result: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """Reabre a tabela se uma versão mais nova foi gravada"""
+        manifest = read_manifest(self.path)
+        if manifest is None or (self.table is not None and self.table.built_at == manifest["built_at"]):
+            return False
+        try:
+            self.table = RecommendationTable.open(self.path)
+        except (FileNotFoundError, ValueError) as e:
+            # Diretório trocado no meio da leitura: fica para a próxima verificação
+            logger.warning(f"Tabela de recomendações não recarregada: {e}")
+            return False
+        return True
+
+    def refresh(self, force: bool = False) -> Optional[Dict]:
+        """Atualiza a tabela (None se outro processo já está atualizando)"""
+        parent = os.path.dirname(self.path.rstrip(os.sep))
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(self.path.rstrip(os.sep) + ".lock", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                candidate_embeddings, job_embeddings, model = self.load_inputs()
+                ids = self.load_ids() if self.load_ids else None
+                encoder_digest = encoder_fingerprint(self.encoder_path) if self.encoder_path else None
+                result = refresh_table(self.path, candidate_embeddings, job_embeddings, model,
+                                       k=self.k, shortlist=self.shortlist, force=force,
+                                       encoder_digest=encoder_digest, ids=ids)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.last_result = result
+        if result["status"] != "fresh":
+            logger.info(f"Tabela de recomendações {result['status']} ({result['reason'] or 'linhas alteradas'}): "
+                        f"{result['recomputed_rows']} linhas em {result['duration_s']:.1f}s")
+        self.reload()
+        return result
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="recommendation-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        next_refresh = time.monotonic()
+        while not self._stop.is_set():
+            if self.interval <= 0:
+                self.reload()
+                self._stop.wait(self.reload_interval)
+            elif time.monotonic() >= next_refresh:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Falha ao atualizar a tabela de recomendações: {e}")
+                next_refresh = time.monotonic() + self.interval
+            else:
+                self.reload()
+            self._stop.wait(min(self.reload_interval, max(0.0, next_refresh - time.monotonic())))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Gera ou atualiza a tabela materializada de recomendações")
+    parser.add_argument("--model-dir", default="model", help="Diretório com embeddings e rede neural")
+    parser.add_argument("--output", default=None, help="Diretório da tabela (padrão: <model-dir>/recommendations)")
+    parser.add_argument("--top-k", type=int, default=20, help="Recomendações guardadas por linha")
+    parser.add_argument("--shortlist", type=int, default=200,
+                        help="Alvos por linha escolhidos pela similaridade antes da rede (0 = todos)")
+    parser.add_argument("--encoder", default=os.getenv("ENCODER_DIR"),
+                        help="Diretório do encoder, que entra na versão do modelo (padrão: <model-dir>/encoder)")
+    parser.add_argument("--force", action="store_true", help="Reconstrói a tabela inteira")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="Segundos entre atualizações, rodando até ser interrompido (0 = uma vez)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(args.model_dir, "recommendations")
+    encoder_path = args.encoder or os.path.join(args.model_dir, "encoder")
+    refresher = RecommendationRefresher(output, lambda: load_inputs(args.model_dir),
+                                        k=args.top_k, shortlist=args.shortlist,
+                                        load_ids=lambda: load_ids(args.model_dir),
+                                        encoder_path=encoder_path if os.path.isdir(encoder_path) else None)
+    while True:
+        result = refresher.refresh(force=args.force)
+        if result is None:
+            print(f"Outro processo está atualizando {output}")
+        else:
+            print(json.dumps(result, indent=2), flush=True)
+        if args.interval <= 0:
+            return 0 if result is not None else 1
+        args.force = False
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
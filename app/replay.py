@@ -0,0 +1,172 @@
+"""
+Replay determinístico de capturas de tráfego
+
+Reenvia as requisições capturadas (app/capture.py) na ordem original, no
+ritmo gravado, acelerado (--speed 10) ou o mais rápido possível (--speed 0),
+contra a aplicação em processo (ASGI, mesmo ModelManager do servidor) ou
+um servidor local, com os headers gravados (Accept, X-Request-Timeout-Ms).
+Ao final compara latências gravadas e reproduzidas.
+
+Requisições com candidate_handle ficam de fora: a sessão do candidato
+expirou junto com o TTL e não existe no alvo do replay.
+
+Uso:
+    python -m app.replay logs/capture/*.jsonl.gz --target inprocess --speed 0
+    python -m app.replay logs/capture/*.jsonl.gz --target http://localhost:8000 --speed 2
+"""
+import sys
+import gzip
+import json
+import time
+import heapq
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+from app.autotune import percentile
+
+
+def read_capture(path: str) -> Iterator[Dict]:
+    """Lê um arquivo de captura, tolerando a última linha truncada"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+
+def merge_captures(paths: List[str]) -> Iterator[Dict]:
+    """Junta capturas de vários workers em ordem de chegada"""
+    return heapq.merge(*(read_capture(path) for path in sorted(paths)), key=lambda r: r["ts"])
+
+
+def load_capture(paths: List[str], limit: Optional[int] = None) -> List[Dict]:
+    """Primeiras limit requisições das capturas, em ordem de chegada"""
+    records = []
+    for record in merge_captures(paths):
+        records.append(record)
+        if limit is not None and len(records) >= limit:
+            break
+    return records
+
+
+def uses_session(record: Dict) -> bool:
+    """Requisição feita com o handle de uma sessão de candidato (POST /candidates/session)"""
+    payload = record.get("payload")
+    return isinstance(payload, dict) and payload.get("candidate_handle") is not None
+
+
+def summarize(results: List[Dict], records: List[Dict], elapsed: float) -> Dict:
+    """Resumo do replay comparado às latências gravadas"""
+    replayed = [r["duration_ms"] for r in results if r["status"] is not None]
+    recorded = [r["duration_ms"] for r in records]
+    lags = [r["lag_ms"] for r in results]
+
+    return {
+        "requests": len(results),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed > 0 else 0.0,
+        "status": dict(Counter(str(r["status"]) for r in results)),
+        "status_mismatches": sum(1 for r, rec in zip(results, records) if r["status"] != rec.get("status")),
+        "replayed_ms": {f"p{q}": percentile(replayed, q) for q in (50, 95, 99)},
+        "recorded_ms": {f"p{q}": percentile(recorded, q) for q in (50, 95, 99)},
+        "schedule_lag_p95_ms": percentile(lags, 95),
+    }
+
+
+async def replay(records: List[Dict], client: httpx.AsyncClient,
+                 speed: float = 1.0, concurrency: int = 16) -> Dict:
+    """Reproduz as requisições no ritmo gravado dividido por speed (0 = sem espera)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Optional[Dict]] = [None] * len(records)
+    first_ts = records[0]["ts"] if records else 0.0
+    started = time.perf_counter()
+
+    async def send(index: int, record: Dict):
+        scheduled = (record["ts"] - first_ts) / speed if speed > 0 else 0.0
+        delay = scheduled - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        async with semaphore:
+            sent_at = time.perf_counter()
+            try:
+                response = await client.post(record.get("endpoint", "/predict"), json=record["payload"],
+                                             headers=record.get("headers"))
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            results[index] = {
+                "status": status,
+                "duration_ms": (time.perf_counter() - sent_at) * 1000,
+                "lag_ms": max(0.0, (sent_at - started - scheduled) * 1000),
+            }
+
+    await asyncio.gather(*(send(i, record) for i, record in enumerate(records)))
+    return summarize(results, records, time.perf_counter() - started)
+
+
+def create_client(target: str, timeout: float) -> httpx.AsyncClient:
+    """Cliente para o app em processo (ASGI) ou para um servidor HTTP"""
+    if target == "inprocess":
+        from app.main import app
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=timeout)
+    return httpx.AsyncClient(base_url=target, timeout=timeout)
+
+
+async def run(args) -> Dict:
+    # Filtra antes do limite: --limit conta requisições reproduzíveis
+    records, skipped = [], 0
+    for record in merge_captures(args.captures):
+        if uses_session(record):
+            skipped += 1
+            continue
+        records.append(record)
+        if args.limit is not None and len(records) >= args.limit:
+            break
+    if not records:
+        raise SystemExit("Nenhuma requisição reproduzível encontrada nas capturas")
+
+    print(f"Reproduzindo {len(records)} requisições contra {args.target} (speed={args.speed}; "
+          f"{skipped} com candidate_handle ignoradas)", flush=True)
+    async with create_client(args.target, args.timeout) as client:
+        summary = await replay(records, client, speed=args.speed, concurrency=args.concurrency)
+    summary["skipped_session_requests"] = skipped
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay de capturas de tráfego do /predict")
+    parser.add_argument("captures", nargs="+", help="Arquivos .jsonl.gz gerados pela captura")
+    parser.add_argument("--target", default="inprocess", help="'inprocess' ou URL base do servidor")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplicador do ritmo gravado (0 = sem espera)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--report", default=None, help="Arquivo JSON para o resumo")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Utilitários de runtime: CPUs disponíveis e threads do PyTorch por worker
+"""
+import os
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """Quota de CPU do container (cgroup v2 ou v1), se houver"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs utilizáveis pelo processo, respeitando afinidade e quota do container"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, int(quota))
+
+    return max(1, cpus)
+
+
+def torch_threads_per_worker(workers: int = 1) -> int:
+    """Threads intra-op do torch por worker (TORCH_NUM_THREADS ou CPUs / workers)"""
+    configured = os.getenv("TORCH_NUM_THREADS")
+    if configured:
+        return max(1, int(configured))
+    return max(1, available_cpus() // max(1, workers))
+
+
+def configure_torch_threads(workers: int = 1) -> int:
+    """Aplica o número de threads do torch para o processo atual"""
+    import torch
+
+    threads = torch_threads_per_worker(workers)
+    torch.set_num_threads(threads)
+    logger.info(f"PyTorch configurado com {threads} threads (pid={os.getpid()}, workers={workers})")
+    return threads
@@ -0,0 +1,97 @@
+"""
+Cache de scores por par (candidato, vaga)
+
+Guarda (similaridade, ml_score) indexado pelo hash do texto processado do
+candidato e da vaga. O cache é limitado (LRU) e é descartado por completo
+quando a versão do modelo muda.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+PairScores = Tuple[float, float]
+
+
+def text_hash(text: str) -> bytes:
+    """Hash compacto (16 bytes) de um texto processado"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class PairScoreCache:
+    """Cache LRU limitado de (similaridade, ml_score) por par de textos"""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self.model_version: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[bytes, bytes], PairScores]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, model_version: Hashable):
+        # Scores calculados por outra versão do modelo não são mais válidos
+        if model_version != self.model_version:
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get_many(self, model_version: Hashable, candidate_text: str,
+                 job_texts: Sequence[str]) -> List[Optional[PairScores]]:
+        """Scores em cache para cada vaga (None para pares ainda não calculados)"""
+        if not self.enabled:
+            return [None] * len(job_texts)
+
+        candidate_key = text_hash(candidate_text)
+        job_keys = [text_hash(text) for text in job_texts]
+
+        results = []
+        with self._lock:
+            self._check_version(model_version)
+            for job_key in job_keys:
+                key = (candidate_key, job_key)
+                scores = self._entries.get(key)
+                if scores is not None:
+                    self._entries.move_to_end(key)
+                results.append(scores)
+
+            hits = sum(1 for scores in results if scores is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+
+        return results
+
+    def put_many(self, model_version: Hashable, candidate_text: str, job_texts: Sequence[str],
+                 similarity_scores: Sequence[float], ml_scores: Sequence[float]):
+        """Armazena os scores recém-calculados, descartando os pares menos usados"""
+        if not self.enabled:
+            return
+
+        candidate_key = text_hash(candidate_text)
+        entries = [
+            ((candidate_key, text_hash(text)), (float(similarity), float(ml_score)))
+            for text, similarity, ml_score in zip(job_texts, similarity_scores, ml_scores)
+        ]
+
+        with self._lock:
+            self._check_version(model_version)
+            for key, scores in entries:
+                self._entries[key] = scores
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
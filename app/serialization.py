@@ -0,0 +1,164 @@
+"""
+Serialização rápida dos resultados de predição
+
+Os scores saem direto dos arrays NumPy, sem criar um JobMatch (Pydantic) por
+vaga. O formato da resposta é negociado pelo header Accept:
+
+- application/json (padrão): mesmo schema de PredictionResponse
+- application/x-msgpack: colunas job_index / similarity_score / ml_score
+  (float32), disponível quando o pacote msgpack está instalado
+- application/octet-stream: buffers crus little-endian, int32 job_index[n],
+  float32 similarity_score[n] e float32 ml_score[n] em sequência; metadados
+  nos headers X-Result-Count e X-Processing-Time-Ms (ver decode_scores)
+"""
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependência opcional
+    msgpack = None
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/x-msgpack"
+MEDIA_SCORES = "application/octet-stream"
+
+SCORES_LAYOUT = "job_index:int32le,similarity_score:float32le,ml_score:float32le"
+
+
+def supported_media_types() -> List[str]:
+    media_types = [MEDIA_JSON, MEDIA_SCORES]
+    if msgpack is not None:
+        media_types.insert(1, MEDIA_MSGPACK)
+    return media_types
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Escolhe o formato de resposta pelo header Accept (JSON se nada combinar)"""
+    if not accept:
+        return MEDIA_JSON
+
+    supported = supported_media_types()
+    options = []
+    for position, part in enumerate(accept.split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        options.append((-quality, position, fields[0].lower()))
+
+    for negative_quality, _, media_type in sorted(options):
+        if negative_quality >= 0:
+            break
+        if media_type in supported:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return MEDIA_JSON
+
+    return MEDIA_JSON
+
+
+def rank_matches(ml_scores: np.ndarray, threshold: float, top_k: int) -> np.ndarray:
+    """Posições dos top_k scores >= threshold, em ordem decrescente
+
+    Empates mantêm a ordem original das vagas, como um sort estável.
+    """
+    ml_scores = np.asarray(ml_scores)
+    positions = np.flatnonzero(ml_scores >= threshold)
+
+    if len(positions) > top_k:
+        # Descarta em O(n) tudo abaixo do k-ésimo maior score antes de ordenar
+        scores = ml_scores[positions]
+        kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        positions = positions[scores >= kth]
+
+    order = np.argsort(-ml_scores[positions], kind="stable")
+    return positions[order[:top_k]]
+
+
+def job_preview(job_text: str) -> str:
+    return job_text[:200] + "..." if len(job_text) > 200 else job_text
+
+
+def encode_scores(job_indices: np.ndarray, similarity_scores: np.ndarray, ml_scores: np.ndarray) -> bytes:
+    """Buffers crus: int32 job_index[n] + float32 similarity[n] + float32 ml_score[n]"""
+    return b"".join((
+        np.asarray(job_indices, dtype="<i4").tobytes(),
+        np.asarray(similarity_scores, dtype="<f4").tobytes(),
+        np.asarray(ml_scores, dtype="<f4").tobytes(),
+    ))
+
+
+def decode_scores(body: bytes) -> Dict[str, np.ndarray]:
+    """Inverso de encode_scores, para clientes Python"""
+    n = len(body) // 12
+    return {
+        "job_index": np.frombuffer(body, dtype="<i4", count=n, offset=0),
+        "similarity_score": np.frombuffer(body, dtype="<f4", count=n, offset=4 * n),
+        "ml_score": np.frombuffer(body, dtype="<f4", count=n, offset=8 * n),
+    }
+
+
+def prediction_response(media_type: str, candidate_processed_text: str, job_indices: np.ndarray,
+                        similarity_scores: np.ndarray, ml_scores: np.ndarray, previews: Sequence[str],
+                        processing_time_ms: float, timestamp: str, job_ids: Optional[Sequence[str]] = None,
+                        headers: Optional[Dict[str, str]] = None) -> Response:
+    """Resposta do /predict no formato negociado, a partir dos arrays já ordenados
+
+    job_ids (endpoints de catálogo) entra como campo job_id no JSON e como
+    coluna no msgpack; no formato binário só job_index é enviado.
+    """
+    job_indices = np.asarray(job_indices)
+    headers = {
+        **(headers or {}),
+        "X-Result-Count": str(len(job_indices)),
+        "X-Processing-Time-Ms": f"{processing_time_ms:.3f}",
+    }
+
+    if media_type == MEDIA_SCORES:
+        headers["X-Score-Layout"] = SCORES_LAYOUT
+        return Response(encode_scores(job_indices, similarity_scores, ml_scores),
+                        media_type=MEDIA_SCORES, headers=headers)
+
+    if media_type == MEDIA_MSGPACK and msgpack is not None:
+        content = {
+            "candidate_processed_text": candidate_processed_text,
+            "job_index": np.asarray(job_indices, dtype=np.int64).tolist(),
+            "similarity_score": np.asarray(similarity_scores, dtype=np.float32).tolist(),
+            "ml_score": np.asarray(ml_scores, dtype=np.float32).tolist(),
+            "job_preview": list(previews),
+            "processing_time_ms": processing_time_ms,
+            "timestamp": timestamp,
+        }
+        if job_ids is not None:
+            content["job_id"] = list(job_ids)
+        body = msgpack.packb(content, use_single_float=True)
+        return Response(body, media_type=MEDIA_MSGPACK, headers=headers)
+
+    # Mesmo schema e separadores do JSONResponse do FastAPI
+    recommendations = [
+        {"job_index": index, "similarity_score": similarity, "ml_score": ml_score, "job_preview": preview}
+        for index, similarity, ml_score, preview in zip(
+            job_indices.tolist(),
+            np.asarray(similarity_scores, dtype=np.float64).tolist(),
+            np.asarray(ml_scores, dtype=np.float64).tolist(),
+            previews,
+        )
+    ]
+    if job_ids is not None:
+        for recommendation, job_id in zip(recommendations, job_ids):
+            recommendation["job_id"] = job_id
+    body = json.dumps({
+        "candidate_processed_text": candidate_processed_text,
+        "recommendations": recommendations,
+        "processing_time_ms": processing_time_ms,
+        "timestamp": timestamp,
+    }, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return Response(body, media_type=MEDIA_JSON, headers=headers)
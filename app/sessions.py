@@ -0,0 +1,149 @@
+"""
+Sessões de candidato: texto processado e embedding reaproveitados entre chamadas
+
+Uma tela de recrutamento chama o /predict várias vezes para o mesmo
+candidato, mudando só o filtro de vagas, e cada chamada reenviava e
+recodificava o CV inteiro (o encode mais caro da requisição).
+POST /candidates/session processa o candidato uma vez e devolve um handle
+de vida curta; /predict e /catalog/match aceitam o handle no lugar dos dados.
+
+As sessões ficam em arquivos em um diretório compartilhado (em /dev/shm
+quando existe) para que qualquer worker do Gunicorn encontre o handle
+registrado por outro. Cada sessão expira `ttl` segundos após o registro;
+sessões vencidas e o excesso acima de `max_sessions` (as mais antigas)
+são removidos periodicamente.
+
+O texto é gravado em UTF-8 (um np.array(str) ocuparia 4 bytes por
+caractere): cada sessão ocupa o texto processado mais ~2 KB de embedding e
+cabeçalhos do .npz. O /dev/shm de um container Docker tem 64 MB por
+padrão; dimensione shm_size (ver docker-compose.yml) para max_sessions.
+Uma gravação que falha (ex.: ENOSPC) remove o arquivo temporário e
+propaga o OSError.
+"""
+import os
+import re
+import time
+import secrets
+import tempfile
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+HANDLE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def default_session_dir() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "job-matching-sessions")
+
+
+class CandidateSession(NamedTuple):
+    text: str
+    embedding: np.ndarray
+    # Embedding gerado pelo encoder a partir de `text` (pode ser chave do cache de pares)
+    encoded: bool
+    expires_at: float
+
+
+class CandidateSessionStore:
+    """Sessões com TTL, uma por arquivo .npz no diretório compartilhado"""
+
+    def __init__(self, session_dir: str, ttl: float = 900.0, max_sessions: int = 10000,
+                 sweep_interval: float = 60.0, clock=time.time):
+        self.session_dir = session_dir
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, handle: str) -> Optional[str]:
+        # O handle vem do cliente: só nomes gerados por register viram caminho
+        if not HANDLE_PATTERN.match(handle):
+            return None
+        return os.path.join(self.session_dir, f"{handle}.npz")
+
+    def register(self, text: str, embedding: np.ndarray, encoded: bool = True) -> Tuple[str, CandidateSession]:
+        """Grava a sessão e retorna o handle junto com ela"""
+        os.makedirs(self.session_dir, exist_ok=True)
+        self.maybe_sweep()
+        handle = secrets.token_urlsafe(18)
+        registered_at = self.clock()
+        expires_at = registered_at + self.ttl
+        path = self._path(handle)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, text=np.frombuffer(text.encode("utf-8"), dtype=np.uint8),
+                         embedding=np.asarray(embedding, dtype=np.float32),
+                         encoded=np.array(encoded), expires_at=np.array(expires_at))
+            # mtime = instante do registro, usado pela limpeza sem abrir os arquivos
+            os.utime(tmp_path, (registered_at, registered_at))
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        return handle, CandidateSession(text, np.asarray(embedding, dtype=np.float32), encoded, expires_at)
+
+    def get(self, handle: str) -> Optional[CandidateSession]:
+        """Sessão do handle (None se não existe ou já expirou)"""
+        path = self._path(handle)
+        if path is None:
+            return None
+        try:
+            with np.load(path) as data:
+                session = CandidateSession(data["text"].tobytes().decode("utf-8"), data["embedding"],
+                                           bool(data["encoded"]), float(data["expires_at"]))
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None
+        if session.expires_at <= self.clock():
+            self._remove(path)
+            return None
+        return session
+
+    def delete(self, handle: str) -> bool:
+        path = self._path(handle)
+        return path is not None and self._remove(path)
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def maybe_sweep(self):
+        with self._lock:
+            if self.clock() - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = self.clock()
+        self.sweep()
+
+    def sweep(self) -> int:
+        """Remove sessões vencidas, as mais antigas acima de max_sessions e temporários abandonados"""
+        now = self.clock()
+        try:
+            names = [name for name in os.listdir(self.session_dir) if name.endswith((".npz", ".tmp"))]
+        except FileNotFoundError:
+            return 0
+
+        alive = []
+        removed = 0
+        for name in names:
+            path = os.path.join(self.session_dir, name)
+            try:
+                registered_at = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if registered_at + self.ttl <= now:
+                removed += self._remove(path)
+            elif name.endswith(".npz"):
+                alive.append((registered_at, path))
+
+        if self.max_sessions > 0 and len(alive) > self.max_sessions:
+            alive.sort()
+            for _, path in alive[:len(alive) - self.max_sessions]:
+                removed += self._remove(path)
+        return removed
@@ -0,0 +1,463 @@
+"""
+Scoring do catálogo particionado em shards (scatter-gather de top-k)
+
+O arquivo de embeddings do catálogo (ex.: job_embeddings.npy) é dividido em
+faixas contíguas de linhas. Cada shard é um processo (local ou em outro nó)
+que mantém só a sua faixa em memória e responde ao top-k parcial de um
+vetor de consulta via multiprocessing.connection (autenticado por authkey).
+O coordenador envia a consulta a todos os shards em paralelo, espera até o
+deadline e mescla os resultados; shards que não responderam a tempo ficam
+de fora e o resultado é marcado como parcial.
+
+Com a projeção PCA (python -m app.projection) cada shard escolhe primeiro
+uma shortlist no catálogo reduzido e só ela recebe a similaridade completa
+e a rede neural.
+
+Shard em outro nó:
+    CATALOG_SHARD_AUTHKEY=... python -m app.sharding --embeddings model/job_embeddings.npy \\
+        --shard 0 --num-shards 4 --address 0.0.0.0:7100 --model model/job_matching_neural_model.pth \
+        --projection model/projection --shortlist 1000
+"""
+import os
+import sys
+import time
+import atexit
+import shutil
+import logging
+import secrets
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+
+from app.network import JobCandidateMatchingNet
+from app.projection import ProjectedCatalog, projection_matches
+from app.serialization import rank_matches
+
+logger = logging.getLogger(__name__)
+
+Address = Union[str, Tuple[str, int]]
+SCORES = ("ml", "similarity")
+
+
+class CatalogResult(NamedTuple):
+    """Top-k mesclado: linhas do catálogo e scores, em ordem decrescente"""
+    indices: np.ndarray
+    similarity_scores: np.ndarray
+    ml_scores: np.ndarray
+    shards: int
+    missing_shards: List[int]
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.missing_shards)
+
+
+def shard_bounds(n_rows: int, num_shards: int) -> List[Tuple[int, int]]:
+    """Faixas [início, fim) de tamanho quase igual para cada shard"""
+    edges = np.linspace(0, n_rows, num_shards + 1).astype(int)
+    return [(int(edges[i]), int(edges[i + 1])) for i in range(num_shards)]
+
+
+def parse_address(address: str) -> Address:
+    """'host:porta' vira tupla TCP; qualquer outro valor é um socket Unix"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def load_matching_model(model_path: str, embedding_dim: int) -> JobCandidateMatchingNet:
+    model = JobCandidateMatchingNet(embedding_dim=embedding_dim)
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    return model.eval()
+
+
+class ShardScorer:
+    """Top-k de uma faixa do catálogo para um vetor de consulta"""
+
+    def __init__(self, embeddings: np.ndarray, start: int = 0, model: Optional[torch.nn.Module] = None,
+                 catalog_kind: str = "job", batch_size: int = 8192,
+                 projection: Optional[ProjectedCatalog] = None, shortlist: int = 0):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.norms = np.maximum(np.linalg.norm(self.embeddings, axis=1), 1e-12)
+        self.start = start
+        self.model = model
+        self.catalog_kind = catalog_kind
+        self.batch_size = batch_size
+        # Catálogo reduzido (mesmas linhas) para o primeiro passo; shortlist=0 desabilita
+        if projection is not None and len(projection) != self.rows:
+            raise ValueError(f"projeção com {len(projection)} linhas para um shard de {self.rows}")
+        self.projection = projection
+        self.shortlist = shortlist
+
+    @classmethod
+    def from_file(cls, path: str, shard: int = 0, num_shards: int = 1,
+                  model_path: Optional[str] = None, projection_path: Optional[str] = None,
+                  **kwargs) -> "ShardScorer":
+        """Carrega só as linhas deste shard (leitura via mmap)"""
+        data = np.load(path, mmap_mode='r')
+        start, end = shard_bounds(data.shape[0], num_shards)[shard]
+        model = load_matching_model(model_path, data.shape[1]) if model_path else None
+        kind = kwargs.get("catalog_kind", "job")
+        projection = None
+        if projection_path and not projection_matches(projection_path, kind, data):
+            logger.warning(f"Projeção em {projection_path} não foi gerada a partir de {path}; "
+                           f"shard {shard} usa o score completo")
+        elif projection_path:
+            projection = ProjectedCatalog.open(projection_path, kind).rows(start, end)
+        return cls(np.array(data[start:end], dtype=np.float32), start=start, model=model,
+                   projection=projection, **kwargs)
+
+    @property
+    def rows(self) -> int:
+        return self.embeddings.shape[0]
+
+    def similarities(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        embeddings, norms = (self.embeddings, self.norms) if rows is None else (self.embeddings[rows], self.norms[rows])
+        return (embeddings @ query) / (norms * max(float(np.linalg.norm(query)), 1e-12))
+
+    def ml_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.model is None:
+            raise ValueError("Shard sem modelo neural: use score='similarity'")
+
+        embeddings = self.embeddings if rows is None else self.embeddings[rows]
+        scores = np.empty(embeddings.shape[0], dtype=np.float32)
+        query_tensor = torch.from_numpy(np.asarray(query, dtype=np.float32)).unsqueeze(0)
+
+        with torch.no_grad():
+            for i in range(0, embeddings.shape[0], self.batch_size):
+                batch = torch.from_numpy(embeddings[i:i + self.batch_size])
+                expanded = query_tensor.expand(batch.shape[0], -1)
+                # A rede recebe sempre (candidato, vaga)
+                pair = (expanded, batch) if self.catalog_kind == "job" else (batch, expanded)
+                scores[i:i + batch.shape[0]] = self.model(*pair).numpy()[:, 0]
+        return scores
+
+    def shortlist_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Linhas que passam do primeiro passo no catálogo reduzido (None: todas)"""
+        if self.projection is None or self.shortlist <= 0 or self.shortlist >= self.rows:
+            return None
+        return self.projection.shortlist(query, self.shortlist)
+
+    def top_k(self, query: np.ndarray, k: int, threshold: float = 0.0, score: str = "ml") -> Dict[str, np.ndarray]:
+        """Top-k parcial: índices globais do catálogo e os dois scores"""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        rows = self.shortlist_rows(query)
+        if score == "ml":
+            ml_scores = self.ml_scores(query, rows)
+            ranked = rank_matches(ml_scores, threshold, k)
+            ml_scores = ml_scores[ranked]
+            selected = ranked if rows is None else rows[ranked]
+            similarity_scores = self.similarities(query, selected)
+        elif score == "similarity":
+            similarity_scores = self.similarities(query, rows)
+            ranked = rank_matches(similarity_scores, threshold, k)
+            similarity_scores = similarity_scores[ranked]
+            selected = ranked if rows is None else rows[ranked]
+            # Score neural só para os selecionados
+            ml_scores = self.ml_scores(query, selected) if self.model is not None \
+                else np.full(len(selected), np.nan, dtype=np.float32)
+        else:
+            raise ValueError(f"score deve ser um de {SCORES}")
+
+        return {
+            "indices": selected.astype(np.int64) + self.start,
+            "similarity_scores": similarity_scores.astype(np.float32),
+            "ml_scores": ml_scores.astype(np.float32),
+        }
+
+
+def _handle_connection(scorer: ShardScorer, conn):
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                if message["op"] == "top_k":
+                    reply = scorer.top_k(message["query"], message["k"], message["threshold"], message["score"])
+                elif message["op"] == "info":
+                    reply = {"start": scorer.start, "rows": scorer.rows, "pid": os.getpid()}
+                else:
+                    raise ValueError(f"operação desconhecida: {message['op']}")
+            except Exception as e:
+                reply = {"error": str(e)}
+
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+
+def serve(scorer: ShardScorer, address: Address, authkey: bytes):
+    """Atende o coordenador: uma thread por conexão"""
+    with Listener(address, authkey=authkey) as listener:
+        logger.info(f"Shard {scorer.start}..{scorer.start + scorer.rows} atendendo em {listener.address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Falha de autenticação ou conexão abortada não derruba o shard
+                logger.warning(f"Conexão recusada: {e}")
+                continue
+            threading.Thread(target=_handle_connection, args=(scorer, conn), daemon=True).start()
+
+
+def _local_shard_main(path: str, shard: int, num_shards: int, model_path: Optional[str],
+                      address: Address, authkey: bytes, threads: int, catalog_kind: str,
+                      projection_path: Optional[str] = None, shortlist: int = 0):
+    torch.set_num_threads(threads)
+    scorer = ShardScorer.from_file(path, shard, num_shards, model_path=model_path, catalog_kind=catalog_kind,
+                                   projection_path=projection_path, shortlist=shortlist)
+    serve(scorer, address, authkey)
+
+
+class ShardClient:
+    """Conexões reaproveitáveis para um shard (uma requisição em voo por conexão)"""
+
+    def __init__(self, address: Address, authkey: bytes, max_idle: int = 8):
+        self.address = address
+        self.authkey = authkey
+        self.max_idle = max_idle
+        self._idle = []
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            # Conexões herdadas por fork pertencem ao processo pai
+            if self._pid != os.getpid():
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return Client(self.address, authkey=self.authkey)
+
+    def _release(self, conn):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, message: Dict, timeout: float) -> Dict:
+        conn = self._acquire()
+        try:
+            conn.send(message)
+            if not conn.poll(max(timeout, 0.0)):
+                raise TimeoutError(f"shard {self.address} não respondeu em {timeout * 1000:.0f}ms")
+            reply = conn.recv()
+        except BaseException:
+            # Resposta atrasada chegaria na próxima requisição: a conexão é descartada
+            conn.close()
+            raise
+        self._release(conn)
+
+        if "error" in reply:
+            raise RuntimeError(f"shard {self.address}: {reply['error']}")
+        return reply
+
+
+def merge_top_k(partials: Sequence[Dict[str, np.ndarray]], k: int, score: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Top-k global a partir dos top-k parciais (empates pela menor linha)"""
+    if not partials:
+        empty = np.empty(0, dtype=np.float32)
+        return np.empty(0, dtype=np.int64), empty, empty
+
+    indices = np.concatenate([p["indices"] for p in partials])
+    similarity_scores = np.concatenate([p["similarity_scores"] for p in partials])
+    ml_scores = np.concatenate([p["ml_scores"] for p in partials])
+
+    order = np.argsort(indices, kind="stable")
+    indices, similarity_scores, ml_scores = indices[order], similarity_scores[order], ml_scores[order]
+    ranking = ml_scores if score == "ml" else similarity_scores
+    selected = rank_matches(ranking, -np.inf, k)
+    return indices[selected], similarity_scores[selected], ml_scores[selected]
+
+
+class ShardedCatalog:
+    """Coordenador: scatter da consulta, gather até o deadline e merge do top-k"""
+
+    def __init__(self, clients: Sequence[ShardClient], deadline: float = 1.0):
+        self.clients = list(clients)
+        self.deadline = deadline
+        self.on_shard_failure = None
+        self._executor = None
+        self._executor_pid = None
+
+    @classmethod
+    def connect(cls, addresses: Sequence[str], authkey: bytes, **kwargs) -> "ShardedCatalog":
+        return cls([ShardClient(parse_address(address), authkey) for address in addresses], **kwargs)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Threads não sobrevivem ao fork dos workers: um executor por processo
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=4 * len(self.clients), thread_name_prefix="catalog")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def top_k(self, query: np.ndarray, k: int, threshold: float = 0.0, score: str = "ml",
+              deadline: Optional[float] = None) -> CatalogResult:
+        deadline = self.deadline if deadline is None else deadline
+        expires = time.monotonic() + deadline
+        message = {"op": "top_k", "query": np.asarray(query, dtype=np.float32), "k": k,
+                   "threshold": threshold, "score": score}
+
+        futures = {
+            self.executor.submit(lambda c=client: c.request(message, expires - time.monotonic())): shard
+            for shard, client in enumerate(self.clients)
+        }
+        done, _ = wait(futures, timeout=max(0.0, expires - time.monotonic()))
+
+        partials, missing = [], []
+        for future, shard in futures.items():
+            if future in done and future.exception() is None:
+                partials.append(future.result())
+                continue
+            missing.append(shard)
+            error = future.exception() if future in done else TimeoutError("deadline")
+            logger.warning(f"Shard {shard} fora do resultado: {error}")
+            if self.on_shard_failure is not None:
+                self.on_shard_failure(shard)
+
+        if not partials:
+            raise RuntimeError("Nenhum shard do catálogo respondeu dentro do deadline")
+
+        indices, similarity_scores, ml_scores = merge_top_k(partials, k, score)
+        return CatalogResult(indices, similarity_scores, ml_scores, len(self.clients), sorted(missing))
+
+
+class InProcessCatalog:
+    """Catálogo inteiro no processo da API (sem shards configurados)"""
+
+    def __init__(self, scorer: ShardScorer):
+        self.scorer = scorer
+        self.clients = [scorer]
+
+    def top_k(self, query: np.ndarray, k: int, threshold: float = 0.0, score: str = "ml",
+              deadline: Optional[float] = None) -> CatalogResult:
+        partial = self.scorer.top_k(query, k, threshold, score)
+        return CatalogResult(partial["indices"], partial["similarity_scores"], partial["ml_scores"], 1, [])
+
+
+class LocalShardCluster:
+    """
+    Shards como processos locais em sockets Unix (um nó Linux)
+
+    Cada shard é um `python -m app.sharding` (subprocess, não
+    multiprocessing): os workers do Gunicorn, criados por fork do master que
+    iniciou o cluster, não herdam os shards como filhos e não os encerram ao
+    sair. Só o processo que chamou start encerra os shards.
+    """
+
+    def __init__(self, embeddings_path: str, num_shards: int, model_path: Optional[str] = None,
+                 threads_per_shard: int = 1, catalog_kind: str = "job", authkey: Optional[bytes] = None,
+                 projection_path: Optional[str] = None, shortlist: int = 0):
+        self.embeddings_path = embeddings_path
+        self.num_shards = num_shards
+        self.model_path = model_path
+        self.threads_per_shard = threads_per_shard
+        self.catalog_kind = catalog_kind
+        self.projection_path = projection_path
+        self.shortlist = shortlist
+        # Repassada aos shards pelo ambiente (CATALOG_SHARD_AUTHKEY), por isso em texto
+        self.authkey = authkey or secrets.token_hex(32).encode("utf-8")
+        self.processes: List[subprocess.Popen] = []
+        self.addresses: List[str] = []
+        self._socket_dir = None
+        self._owner_pid: Optional[int] = None
+
+    def shard_command(self, shard: int, address: str) -> List[str]:
+        command = [sys.executable, "-m", "app.sharding", "--embeddings", self.embeddings_path,
+                   "--shard", str(shard), "--num-shards", str(self.num_shards), "--address", address,
+                   "--catalog-kind", self.catalog_kind, "--threads", str(self.threads_per_shard),
+                   "--shortlist", str(self.shortlist)]
+        if self.model_path:
+            command += ["--model", self.model_path]
+        if self.projection_path:
+            command += ["--projection", self.projection_path]
+        return command
+
+    def start(self, timeout: float = 60.0) -> "LocalShardCluster":
+        # Processo novo: o shard não herda threads nem estado do torch do processo da API
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, CATALOG_SHARD_AUTHKEY=self.authkey.decode("utf-8"),
+                   PYTHONPATH=os.pathsep.join(filter(None, [root, os.getenv("PYTHONPATH")])))
+        self._owner_pid = os.getpid()
+        self._socket_dir = tempfile.mkdtemp(prefix="catalog-shards-")
+        for shard in range(self.num_shards):
+            address = os.path.join(self._socket_dir, f"shard-{shard}.sock")
+            self.processes.append(subprocess.Popen(self.shard_command(shard, address), env=env))
+            self.addresses.append(address)
+        atexit.register(self.stop)
+
+        expires = time.monotonic() + timeout
+        for shard, address in enumerate(self.addresses):
+            while True:
+                try:
+                    Client(address, authkey=self.authkey).close()
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if self.processes[shard].poll() is not None or time.monotonic() > expires:
+                        self.stop()
+                        raise RuntimeError(f"Shard {shard} do catálogo não iniciou")
+                    time.sleep(0.05)
+        return self
+
+    def catalog(self, **kwargs) -> ShardedCatalog:
+        return ShardedCatalog([ShardClient(address, self.authkey) for address in self.addresses], **kwargs)
+
+    def stop(self):
+        # Herdado por fork (workers do Gunicorn com preload): os shards são do master
+        if self._owner_pid != os.getpid():
+            return
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self.processes = []
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve um shard do catálogo de embeddings")
+    parser.add_argument("--embeddings", required=True, help="Arquivo .npy do catálogo")
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--address", required=True, help="host:porta ou caminho de socket Unix")
+    parser.add_argument("--model", default=None, help=".pth da rede neural (habilita score='ml')")
+    parser.add_argument("--catalog-kind", choices=("job", "candidate"), default="job")
+    parser.add_argument("--threads", type=int, default=1, help="Threads do torch")
+    parser.add_argument("--projection", default=None, help="Diretório da projeção PCA (python -m app.projection)")
+    parser.add_argument("--shortlist", type=int, default=0,
+                        help="Linhas escolhidas no catálogo reduzido antes do score completo (0 = todas)")
+    args = parser.parse_args(argv)
+
+    authkey = os.getenv("CATALOG_SHARD_AUTHKEY", "")
+    if not authkey:
+        parser.error("defina CATALOG_SHARD_AUTHKEY (o mesmo valor usado pela API)")
+
+    logging.basicConfig(level=logging.INFO)
+    _local_shard_main(args.embeddings, args.shard, args.num_shards, args.model, parse_address(args.address),
+                      authkey.encode("utf-8"), args.threads, args.catalog_kind, args.projection, args.shortlist)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Extração e pré-processamento de textos de candidatos e vagas
+
+Compartilhado entre a API (ModelManager) e a ingestão offline (app/ingest.py),
+para que os artefatos sejam gerados com o mesmo texto usado nas predições.
+"""
+import re
+import string
+from typing import Dict, Iterable, Optional
+
+# Campos combinados, na ordem do notebook
+CANDIDATE_FIELDS = ("cv_pt", "cv_en", "objetivo_profissional", "conhecimentos_tecnicos")
+JOB_FIELDS = ("titulo_vaga", "objetivo_vaga", "principais_atividades", "competencia_tecnicas_e_comportamentais")
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+_DIGITS = re.compile(r'\d+')
+_SPACES = re.compile(r'\s+')
+
+
+def preprocess_text(text: str) -> str:
+    """Pré-processamento de texto igual ao notebook"""
+    if not text or not isinstance(text, str):
+        return ""
+
+    # Minúsculas, sem pontuação, sem números e sem espaços extras
+    text = text.lower().translate(_PUNCTUATION_TABLE)
+    text = _DIGITS.sub('', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def combine_texts(texts: Iterable[Optional[str]]) -> str:
+    """Junta os campos não vazios com espaço"""
+    return ' '.join([str(text) for text in texts if text and str(text).strip()])
+
+
+def candidate_fields(record: Dict) -> Dict[str, str]:
+    """Campos de texto de um candidato do applicants.json (estrutura aninhada)"""
+    infos_basicas = record.get('infos_basicas') or {}
+    informacoes_profissionais = record.get('informacoes_profissionais') or {}
+    return {
+        'cv_pt': record.get('cv_pt'),
+        'cv_en': record.get('cv_en'),
+        'objetivo_profissional': infos_basicas.get('objetivo_profissional'),
+        'conhecimentos_tecnicos': informacoes_profissionais.get('conhecimentos_tecnicos'),
+    }
+
+
+def job_fields(record: Dict) -> Dict[str, str]:
+    """Campos de texto de uma vaga do vagas.json (estrutura aninhada)"""
+    infos_basicas = record.get('infos_basicas') or {}
+    perfil_vaga = record.get('perfil_vaga') or {}
+    return {
+        'titulo_vaga': infos_basicas.get('titulo_vaga'),
+        'objetivo_vaga': infos_basicas.get('objetivo_vaga'),
+        'principais_atividades': perfil_vaga.get('principais_atividades'),
+        'competencia_tecnicas_e_comportamentais': perfil_vaga.get('competencia_tecnicas_e_comportamentais'),
+    }
@@ -0,0 +1,202 @@
+"""
+Armazenamento compacto dos textos processados de vagas e candidatos
+
+Substitui a lista de dicts do *_texts_processed.joblib, que era carregada
+inteira no heap de cada worker. Os textos ficam concatenados em um único
+blob UTF-8 mapeado em memória; só as páginas dos textos lidos (previews,
+em geral) são trazidas do disco, e as páginas são compartilhadas entre os
+workers pelo page cache.
+
+Layout do diretório (ex.: model/job_texts):
+
+    texts.bin       textos UTF-8 concatenados
+    offsets.npy     int64[n + 1]; texto da linha i = texts.bin[offsets[i]:offsets[i + 1]]
+    ids.npy         ids (bytes de largura fixa) na ordem das linhas
+    sorted_ids.npy  ids ordenados, para busca binária
+    id_order.npy    linha de cada posição de sorted_ids
+
+Conversão dos artefatos existentes:
+    python -m app.text_store --input model/job_texts_processed.joblib --output model/job_texts
+"""
+import os
+import sys
+import shutil
+import hashlib
+import logging
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.serialization import job_preview
+
+logger = logging.getLogger(__name__)
+
+# Tipo de texto -> campo de id nos registros do notebook
+ID_FIELDS = {"job": "job_id", "candidate": "candidate_id"}
+
+
+def record_text(record: Dict) -> str:
+    return record.get("processed_text") or record.get("text") or ""
+
+
+class TextStore:
+    """Textos por linha do catálogo (mesma ordem dos embeddings) com busca por id"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, ids: np.ndarray,
+                 sorted_ids: np.ndarray, id_order: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.ids = ids
+        self.sorted_ids = sorted_ids
+        self.id_order = id_order
+        self._ids_fingerprint: Optional[str] = None
+
+    @classmethod
+    def open(cls, path: str) -> "TextStore":
+        """Abre o diretório com mmap somente leitura (nada é lido até o primeiro acesso)"""
+        blob_path = os.path.join(path, "texts.bin")
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) \
+            else np.zeros(0, dtype=np.uint8)
+        arrays = [np.load(os.path.join(path, name), mmap_mode="r")
+                  for name in ("offsets.npy", "ids.npy", "sorted_ids.npy", "id_order.npy")]
+        return cls(blob, *arrays)
+
+    @classmethod
+    def from_texts(cls, ids: Sequence[str], texts: Sequence[str]) -> "TextStore":
+        """Store em memória (testes e artefatos ainda em joblib)"""
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets, *index_ids(ids))
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict], id_field: str) -> "TextStore":
+        return cls.from_texts([str(record.get(id_field, "")) for record in records],
+                              [record_text(record) for record in records])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _bytes(self, row: int, limit: Optional[int] = None) -> bytes:
+        if not 0 <= row < len(self):
+            raise IndexError(f"linha {row} fora do store ({len(self)} textos)")
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.blob[start:end].tobytes()
+
+    def text(self, row: int) -> str:
+        return self._bytes(row).decode("utf-8")
+
+    def preview(self, row: int, length: int = 200) -> str:
+        """Mesmo resultado de job_preview(text), lendo só o começo do texto"""
+        # length + 1 caracteres de até 4 bytes bastam para saber se o texto é maior que length
+        data = self._bytes(row, limit=4 * (length + 2))
+        return job_preview(data.decode("utf-8", errors="ignore"))
+
+    def id(self, row: int) -> str:
+        if not 0 <= row < len(self):
+            raise IndexError(f"linha {row} fora do store ({len(self)} textos)")
+        return self.ids[row].decode("utf-8")
+
+    def row(self, record_id: str) -> Optional[int]:
+        """Linha do id (None se não existir), por busca binária em sorted_ids"""
+        key = str(record_id).encode("utf-8")
+        if not len(self) or len(key) > self.sorted_ids.dtype.itemsize:
+            return None
+        position = int(np.searchsorted(self.sorted_ids, np.array(key, dtype=self.sorted_ids.dtype)))
+        if position < len(self) and self.sorted_ids[position] == key:
+            return int(self.id_order[position])
+        return None
+
+    def ids_fingerprint(self) -> str:
+        """Hash dos ids na ordem das linhas: identifica o mapeamento id -> linha do store"""
+        if self._ids_fingerprint is None:
+            self._ids_fingerprint = hashlib.sha1(np.ascontiguousarray(self.ids)).hexdigest()
+        return self._ids_fingerprint
+
+    def texts(self, limit: Optional[int] = None) -> Iterator[str]:
+        for row in range(len(self) if limit is None else min(limit, len(self))):
+            yield self.text(row)
+
+
+def index_ids(ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ids em bytes de largura fixa, ids ordenados e a linha de cada um"""
+    encoded = [str(record_id).encode("utf-8") for record_id in ids]
+    width = max([len(record_id) for record_id in encoded] + [1])
+    ids_array = np.array(encoded, dtype=f"S{width}") if encoded else np.zeros(0, dtype="S1")
+    id_order = np.argsort(ids_array, kind="stable").astype(np.int64)
+    return ids_array, ids_array[id_order], id_order
+
+
+def write_text_store(path: str, items: Iterable[Tuple[str, str]]) -> int:
+    """Grava (id, texto) em streaming; o diretório final só é trocado no fim"""
+    tmp_path = path.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    ids: List[str] = []
+    offsets = [0]
+    with open(os.path.join(tmp_path, "texts.bin"), "wb") as f:
+        for record_id, text in items:
+            data = text.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+            ids.append(str(record_id))
+
+    ids_array, sorted_ids, id_order = index_ids(ids)
+    np.save(os.path.join(tmp_path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_path, "ids.npy"), ids_array)
+    np.save(os.path.join(tmp_path, "sorted_ids.npy"), sorted_ids)
+    np.save(os.path.join(tmp_path, "id_order.npy"), id_order)
+
+    if os.path.isdir(path):
+        old_path = path.rstrip(os.sep) + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+    return len(ids)
+
+
+def load_text_store(model_dir: str, kind: str) -> TextStore:
+    """Store de model/<kind>_texts; artefatos antigos em joblib são compactados em memória"""
+    path = os.path.join(model_dir, f"{kind}_texts")
+    if os.path.isdir(path):
+        return TextStore.open(path)
+
+    legacy_path = os.path.join(model_dir, f"{kind}_texts_processed.joblib")
+    if os.path.exists(legacy_path):
+        import joblib
+
+        logger.warning(f"{path} não encontrado; compactando {legacy_path} em memória "
+                       f"(converta com python -m app.text_store)")
+        return TextStore.from_records(joblib.load(legacy_path), ID_FIELDS[kind])
+
+    raise FileNotFoundError(f"Textos processados não encontrados: {path}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Converte *_texts_processed.joblib para o store compacto")
+    parser.add_argument("--input", required=True, help="Arquivo .joblib (lista de dicts do notebook)")
+    parser.add_argument("--output", required=True, help="Diretório do store (ex.: model/job_texts)")
+    parser.add_argument("--kind", choices=sorted(ID_FIELDS), default=None,
+                        help="job ou candidate (padrão: deduzido do nome do arquivo)")
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    kind = args.kind or ("candidate" if "candidate" in os.path.basename(args.input) else "job")
+    records = joblib.load(args.input)
+    id_field = ID_FIELDS[kind]
+    rows = write_text_store(args.output, ((record.get(id_field, ""), record_text(record)) for record in records))
+    print(f"{rows} textos gravados em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
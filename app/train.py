@@ -0,0 +1,278 @@
+"""
+Treino da rede de matching sem materializar a matriz de similaridade
+
+O notebook calcula a matriz candidato×vaga inteira antes de amostrar pares
+(MatchingDatasetMinimal). Aqui cada bloco de candidatos é comparado com as
+vagas por blocos (matmul de block_size × job_block_size), e os pares
+positivos (similaridade > threshold) e negativos são amostrados
+uniformemente com chaves aleatórias enquanto os blocos passam. A memória
+depende só dos tamanhos de bloco; os embeddings são lidos via mmap.
+
+Os blocos de candidatos são divididos entre os workers do DataLoader e
+reamostrados a cada época. O resultado é o .pth carregado pelo ModelManager.
+
+Uso:
+    python -m app.train --epochs 15 --workers 4
+    python -m app.train --candidate-embeddings model/candidate_embeddings.npy \\
+        --job-embeddings model/job_embeddings.npy --output model/job_matching_neural_model.pth
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from app.network import JobCandidateMatchingNet
+
+ArrayOrPath = Union[str, np.ndarray]
+
+
+def _normalize(block: np.ndarray) -> np.ndarray:
+    block = np.asarray(block, dtype=np.float32)
+    return block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+
+
+def _keep_smallest(keys: np.ndarray, pairs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(keys) <= k:
+        return keys, pairs
+    selected = np.argpartition(keys, k - 1)[:k]
+    return keys[selected], pairs[selected]
+
+
+class BlockedPairSampler(IterableDataset):
+    """Pares (candidato, vaga, rótulo) amostrados por bloco, entregues em lotes
+
+    Para cada bloco de block_size candidatos são amostrados até
+    pairs_per_block pares positivos e pairs_per_block negativos, sem
+    reposição e uniformes entre todas as vagas (como o notebook faz por
+    chunk de 1000 candidatos). Blocos com índice múltiplo de
+    validation_every - 1 formam o conjunto de validação.
+    """
+
+    def __init__(self, candidate_embeddings: ArrayOrPath, job_embeddings: ArrayOrPath,
+                 threshold: float = 0.3, block_size: int = 1000, job_block_size: int = 4096,
+                 pairs_per_block: int = 100, batch_size: int = 64, shuffle_buffer: int = 4096,
+                 validation_every: int = 0, split: str = "train", seed: int = 42):
+        self.candidate_source = candidate_embeddings
+        self.job_source = job_embeddings
+        self.threshold = threshold
+        self.block_size = block_size
+        self.job_block_size = job_block_size
+        self.pairs_per_block = pairs_per_block
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.validation_every = validation_every
+        self.split = split
+        self.seed = seed
+        self.epoch = 0
+
+        n_candidates = self._open(candidate_embeddings).shape[0]
+        n_blocks = (n_candidates + block_size - 1) // block_size
+        self.blocks = [block for block in range(n_blocks) if self._in_split(block)]
+
+    def _in_split(self, block: int) -> bool:
+        is_validation = self.validation_every > 0 and block % self.validation_every == self.validation_every - 1
+        return is_validation == (self.split == "validation")
+
+    @staticmethod
+    def _open(source: ArrayOrPath) -> np.ndarray:
+        # Caminhos são abertos em cada worker: um memmap serializado viraria cópia em memória
+        if isinstance(source, str):
+            return np.load(source, mmap_mode="r")
+        return source
+
+    def set_epoch(self, epoch: int):
+        """Nova época reamostra os pares e reordena os blocos"""
+        self.epoch = epoch
+
+    def sample_block(self, candidates: np.ndarray, jobs: np.ndarray, block: int,
+                     rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Pares amostrados de um bloco de candidatos: (índices [n, 2], rótulos [n])"""
+        start = block * self.block_size
+        candidate_block = _normalize(candidates[start:start + self.block_size])
+        k = self.pairs_per_block
+        reservoirs = {
+            label: (np.empty(0), np.empty((0, 2), dtype=np.int64)) for label in (1.0, 0.0)
+        }
+
+        for job_start in range(0, jobs.shape[0], self.job_block_size):
+            job_block = _normalize(jobs[job_start:job_start + self.job_block_size])
+            similarities = candidate_block @ job_block.T
+
+            positive = similarities > self.threshold
+            for label, mask in ((1.0, positive), (0.0, ~positive)):
+                flat = np.flatnonzero(mask)
+                if flat.size == 0:
+                    continue
+                # Os k menores entre chaves uniformes = amostra sem reposição de todos os pares vistos
+                keys, flat = _keep_smallest(rng.random(flat.size), flat, k)
+                pairs = np.column_stack([flat // job_block.shape[0] + start, flat % job_block.shape[0] + job_start])
+                old_keys, old_pairs = reservoirs[label]
+                reservoirs[label] = _keep_smallest(np.concatenate([old_keys, keys]),
+                                                   np.concatenate([old_pairs, pairs]), k)
+
+        pairs = np.concatenate([reservoirs[1.0][1], reservoirs[0.0][1]])
+        labels = np.concatenate([np.ones(len(reservoirs[1.0][1]), dtype=np.float32),
+                                 np.zeros(len(reservoirs[0.0][1]), dtype=np.float32)])
+        return pairs, labels
+
+    def _worker_blocks(self) -> Tuple[List[int], np.random.Generator]:
+        # Mesma permutação em todos os workers; cada um fica com uma fatia disjunta
+        order = np.random.default_rng([self.seed, self.epoch]).permutation(len(self.blocks))
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker is not None else (0, 1)
+        blocks = [self.blocks[i] for i in order[worker_id::num_workers]]
+        return blocks, np.random.default_rng([self.seed, self.epoch, worker_id])
+
+    def __iter__(self) -> Iterator[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]:
+        candidates = self._open(self.candidate_source)
+        jobs = self._open(self.job_source)
+        blocks, rng = self._worker_blocks()
+
+        pending_pairs = np.empty((0, 2), dtype=np.int64)
+        pending_labels = np.empty(0, dtype=np.float32)
+
+        def batches(pairs, labels, final):
+            order = rng.permutation(len(labels))
+            pairs, labels = pairs[order], labels[order]
+            end = len(labels) if final else len(labels) - len(labels) % self.batch_size
+            for i in range(0, end, self.batch_size):
+                batch_pairs = pairs[i:i + self.batch_size]
+                yield (
+                    torch.from_numpy(np.asarray(candidates[batch_pairs[:, 0]], dtype=np.float32)),
+                    torch.from_numpy(np.asarray(jobs[batch_pairs[:, 1]], dtype=np.float32)),
+                    torch.from_numpy(labels[i:i + self.batch_size, None].copy()),
+                )
+            return pairs[end:], labels[end:]
+
+        for block in blocks:
+            pairs, labels = self.sample_block(candidates, jobs, block, rng)
+            pending_pairs = np.concatenate([pending_pairs, pairs])
+            pending_labels = np.concatenate([pending_labels, labels])
+
+            # Embaralha entre blocos antes de formar os lotes
+            if len(pending_labels) >= self.shuffle_buffer:
+                pending_pairs, pending_labels = yield from batches(pending_pairs, pending_labels, final=False)
+
+        if len(pending_labels):
+            yield from batches(pending_pairs, pending_labels, final=True)
+
+
+def evaluate(model: nn.Module, loader: DataLoader, criterion: nn.Module) -> Dict[str, float]:
+    """Loss e acurácia (threshold 0.5) em um conjunto de pares"""
+    model.eval()
+    total_loss, correct, count = 0.0, 0, 0
+    with torch.no_grad():
+        for candidate_emb, job_emb, labels in loader:
+            outputs = model(candidate_emb, job_emb)
+            total_loss += criterion(outputs, labels).item() * len(labels)
+            correct += ((outputs >= 0.5).float() == labels).sum().item()
+            count += len(labels)
+    return {"loss": total_loss / max(count, 1), "accuracy": correct / max(count, 1), "pairs": count}
+
+
+def train(candidate_embeddings: ArrayOrPath, job_embeddings: ArrayOrPath, output_path: str,
+          epochs: int = 15, lr: float = 0.001, batch_size: int = 64, workers: int = 0,
+          threshold: float = 0.3, block_size: int = 1000, job_block_size: int = 4096,
+          pairs_per_block: int = 100, validation_every: int = 5, seed: int = 42,
+          stream=sys.stderr) -> Dict:
+    """Treina a JobCandidateMatchingNet e grava o state_dict em output_path"""
+    torch.manual_seed(seed)
+    sampler_args = dict(threshold=threshold, block_size=block_size, job_block_size=job_block_size,
+                        pairs_per_block=pairs_per_block, batch_size=batch_size,
+                        validation_every=validation_every, seed=seed)
+    train_set = BlockedPairSampler(candidate_embeddings, job_embeddings, split="train", **sampler_args)
+    validation_set = BlockedPairSampler(candidate_embeddings, job_embeddings, split="validation", **sampler_args)
+    if not train_set.blocks:
+        raise ValueError("Nenhum bloco de candidatos para treino; reduza block_size ou validation_every")
+
+    # Lotes já vêm prontos do sampler (batch_size=None); workers leem os embeddings via mmap
+    loader_args = dict(batch_size=None, num_workers=workers)
+    train_loader = DataLoader(train_set, **loader_args)
+    validation_loader = DataLoader(validation_set, **loader_args) if validation_set.blocks else None
+
+    dim = BlockedPairSampler._open(job_embeddings).shape[1]
+    model = JobCandidateMatchingNet(embedding_dim=dim)
+    criterion = nn.BCELoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    history = []
+
+    for epoch in range(epochs):
+        started = time.perf_counter()
+        train_set.set_epoch(epoch)
+        model.train()
+        total_loss, count = 0.0, 0
+
+        for candidate_emb, job_emb, labels in train_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(candidate_emb, job_emb), labels)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(labels)
+            count += len(labels)
+
+        elapsed = time.perf_counter() - started
+        entry = {"epoch": epoch + 1, "loss": total_loss / max(count, 1), "pairs": count,
+                 "pairs_per_s": count / elapsed if elapsed > 0 else 0.0}
+        if validation_loader is not None:
+            # Sempre a mesma amostra de validação, para comparar entre épocas
+            entry["validation"] = evaluate(model, validation_loader, criterion)
+        history.append(entry)
+
+        message = f"Época {epoch + 1}/{epochs}, Loss: {entry['loss']:.4f} ({count} pares, {entry['pairs_per_s']:.0f} pares/s)"
+        if "validation" in entry:
+            message += f", Val loss: {entry['validation']['loss']:.4f}, Val acc: {entry['validation']['accuracy']:.3f}"
+        print(message, file=stream)
+
+    # Grava via arquivo temporário: a API nunca lê um .pth pela metade
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, output_path)
+
+    return {"output": output_path, "epochs": history}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    model_dir = os.getenv("MODEL_DIR", "model")
+    parser = argparse.ArgumentParser(description="Treina a rede de matching a partir dos embeddings do catálogo")
+    parser.add_argument("--candidate-embeddings", default=os.path.join(model_dir, "candidate_embeddings.npy"))
+    parser.add_argument("--job-embeddings", default=os.path.join(model_dir, "job_embeddings.npy"))
+    parser.add_argument("--output", default=os.path.join(model_dir, "job_matching_neural_model.pth"))
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Processos do DataLoader amostrando blocos")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Similaridade acima da qual o par é positivo")
+    parser.add_argument("--block-size", type=int, default=1000, help="Candidatos por bloco")
+    parser.add_argument("--job-block-size", type=int, default=4096, help="Vagas por bloco do matmul")
+    parser.add_argument("--pairs-per-block", type=int, default=100, help="Positivos e negativos por bloco")
+    parser.add_argument("--validation-every", type=int, default=5, help="1 a cada N blocos vai para validação (0 desativa)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", default=None, help="Arquivo JSON com o histórico")
+    args = parser.parse_args(argv)
+
+    result = train(args.candidate_embeddings, args.job_embeddings, args.output, epochs=args.epochs,
+                   lr=args.lr, batch_size=args.batch_size, workers=args.workers, threshold=args.threshold,
+                   block_size=args.block_size, job_block_size=args.job_block_size,
+                   pairs_per_block=args.pairs_per_block, validation_every=args.validation_every,
+                   seed=args.seed)
+    print(f"Modelo salvo em {result['output']}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
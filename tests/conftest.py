@@ -0,0 +1,95 @@
+"""
+Configuração compartilhada dos testes
+
+tests/test_main.py e tests/test_performance.py importam app.main, que carrega
+na importação os artefatos de MODEL_DIR e o encoder local de ENCODER_DIR.
+Sem os artefatos reais (model/ vem do Git LFS e o encoder é gerado com
+python -m app.encoder, com acesso ao hub), os testes usam um diretório
+sintético: embeddings e textos aleatórios, a rede com pesos aleatórios e um
+encoder BERT de uma camada com a dimensão do all-MiniLM-L6-v2, gravado
+localmente no mesmo formato de python -m app.encoder.
+"""
+import os
+import shutil
+import atexit
+import tempfile
+
+import numpy as np
+
+EMBEDDING_DIM = 384
+WORDS = "python java sap sql desenvolvedor analista dados cloud vaga senior junior fastapi".split()
+
+
+def artifacts_available(model_dir: str, encoder_dir: str) -> bool:
+    """Artefatos reais utilizáveis (os ponteiros do Git LFS não são arquivos .npy)"""
+    from app.encoder import missing_encoder_files
+
+    if missing_encoder_files(encoder_dir):
+        return False
+    try:
+        np.load(os.path.join(model_dir, "job_embeddings.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def write_tiny_encoder(path: str):
+    """Encoder com pesos aleatórios, gravado sem acesso ao hub"""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from app.encoder import check_encoder, convert_to_safetensors
+
+    torch.manual_seed(0)
+    transformer_dir = tempfile.mkdtemp(prefix="encoder-")
+    try:
+        vocab_path = os.path.join(transformer_dir, "vocab.txt")
+        with open(vocab_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+        BertTokenizerFast(vocab_file=vocab_path).save_pretrained(transformer_dir)
+        BertModel(BertConfig(vocab_size=5 + len(WORDS), hidden_size=EMBEDDING_DIM, num_hidden_layers=1,
+                             num_attention_heads=4, intermediate_size=64,
+                             max_position_embeddings=256)).save_pretrained(transformer_dir)
+        transformer = models.Transformer(transformer_dir, max_seq_length=256)
+        SentenceTransformer(modules=[transformer, models.Pooling(EMBEDDING_DIM)], device="cpu").save(path)
+    finally:
+        shutil.rmtree(transformer_dir, ignore_errors=True)
+    convert_to_safetensors(path)
+    check_encoder(path)
+
+
+def write_synthetic_model(model_dir: str, jobs: int = 200, candidates: int = 300):
+    import torch
+    from app.network import JobCandidateMatchingNet
+    from app.text_store import write_text_store
+
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    torch.save(JobCandidateMatchingNet(embedding_dim=EMBEDDING_DIM).state_dict(),
+               os.path.join(model_dir, "job_matching_neural_model.pth"))
+    for kind, rows, first_id in (("job", jobs, 1000), ("candidate", candidates, 5000)):
+        np.save(os.path.join(model_dir, f"{kind}_embeddings.npy"),
+                rng.normal(size=(rows, EMBEDDING_DIM)).astype(np.float32))
+        write_text_store(os.path.join(model_dir, f"{kind}_texts"),
+                         ((str(first_id + i), " ".join(rng.choice(WORDS, 30))) for i in range(rows)))
+    write_tiny_encoder(os.path.join(model_dir, "encoder"))
+
+
+def configure_test_artifacts():
+    """Aponta MODEL_DIR/ENCODER_DIR para o diretório sintético quando faltam os artefatos reais"""
+    model_dir = os.getenv("MODEL_DIR", "model")
+    if artifacts_available(model_dir, os.getenv("ENCODER_DIR", os.path.join(model_dir, "encoder"))):
+        return
+    root = tempfile.mkdtemp(prefix="job-matching-tests-")
+    atexit.register(shutil.rmtree, root, True)
+    model_dir = os.path.join(root, "model")
+    os.makedirs(model_dir)
+    write_synthetic_model(model_dir)
+    os.environ["MODEL_DIR"] = model_dir
+    os.environ["ENCODER_DIR"] = os.path.join(model_dir, "encoder")
+    os.environ.setdefault("LOG_DIR", os.path.join(root, "logs"))
+    os.environ.setdefault("SESSION_DIR", os.path.join(root, "sessions"))
+
+
+# Antes da coleta: os módulos de teste importam app.main no topo
+configure_test_artifacts()
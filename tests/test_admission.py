@@ -0,0 +1,67 @@
+"""
+Testes para prazos e controle de admissão
+"""
+import pytest
+
+from app.admission import AdmissionController, Deadline, DeadlineExceeded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestDeadline:
+    """Testes para o prazo por requisição"""
+
+    def test_expires(self):
+        clock = FakeClock()
+        deadline = Deadline(500, clock=clock)
+
+        assert deadline.remaining() == pytest.approx(0.5)
+        deadline.check("encode")
+
+        clock.now += 0.5
+        assert deadline.expired()
+        with pytest.raises(DeadlineExceeded, match="encode"):
+            deadline.check("encode")
+
+    def test_without_timeout(self):
+        deadline = Deadline(0)
+
+        assert deadline.remaining() is None
+        assert not deadline.expired()
+
+    def test_header_capped_by_server_default(self):
+        assert Deadline.from_header("200", 1000).remaining() <= 0.2
+        assert 0.9 < Deadline.from_header("5000", 1000).remaining() <= 1.0
+        assert 0.9 < Deadline.from_header(None, 1000).remaining() <= 1.0
+        assert 0.9 < Deadline.from_header("abc", 1000).remaining() <= 1.0
+        assert Deadline.from_header("200", 0).remaining() <= 0.2
+        assert Deadline.from_header(None, 0).remaining() is None
+
+class TestAdmissionController:
+    """Testes para a capacidade compartilhada entre requisições"""
+
+    def test_acquire_and_release(self):
+        admission = AdmissionController(100)
+
+        assert admission.try_acquire(60)
+        assert not admission.try_acquire(50)
+        assert admission.available == 40
+
+        admission.release(60)
+        assert admission.try_acquire(100)
+
+    def test_request_larger_than_capacity(self):
+        admission = AdmissionController(100)
+
+        assert admission.fits(100)
+        assert not admission.fits(101)
+
+    def test_disabled(self):
+        admission = AdmissionController(0)
+
+        assert admission.fits(10 ** 9)
+        assert admission.try_acquire(10 ** 9)
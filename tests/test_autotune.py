@@ -0,0 +1,108 @@
+"""
+Testes para o autotune de workers, threads e batch do encoder
+"""
+import numpy as np
+import pytest
+
+from app.autotune import (build_grid, percentile, select_best, format_env,
+                          synthetic_payloads, benchmark_config)
+from app.text_store import TextStore
+
+class FakeManager:
+    """ModelManager mínimo com o mesmo contrato de encode + score"""
+    job_texts = TextStore.from_texts(["1"], ["vaga python sql"])
+
+    def __init__(self):
+        self.encode_batch_size = 32
+
+    def generate_embedding(self, text):
+        return np.ones(384, dtype=np.float32)
+
+    def generate_embeddings(self, texts):
+        return np.ones((len(texts), 384), dtype=np.float32)
+
+    def calculate_similarities(self, candidate, jobs):
+        return jobs @ candidate
+
+    def predict_matches(self, candidate, jobs):
+        return np.full(len(jobs), 0.5)
+
+class TestAutotune:
+    """Testes para a grade e a seleção de configuração"""
+
+    def test_build_grid_respects_cores(self):
+        """Testa que workers × threads nunca excede os núcleos"""
+        grid = build_grid(4, [16, 32])
+
+        assert (1, 4, 16) in grid
+        assert (2, 2, 32) in grid
+        assert (4, 1, 16) in grid
+        assert all(workers * threads <= 4 for workers, threads, _ in grid)
+
+    def test_build_grid_includes_core_count(self):
+        """Testa inclusão do total de núcleos quando não é potência de 2"""
+        grid = build_grid(6, [32])
+
+        assert (6, 1, 32) in grid
+        assert (1, 6, 32) in grid
+
+    def test_percentile(self):
+        """Testa percentis por interpolação linear"""
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == pytest.approx(50.5)
+        assert percentile(values, 100) == 100
+        assert percentile([], 95) == float("inf")
+
+    def test_select_best_within_slo(self):
+        """Testa escolha do maior throughput dentro do SLO"""
+        results = [
+            {"workers": 1, "threads": 4, "batch_size": 32, "throughput_rps": 10, "p95_ms": 100},
+            {"workers": 4, "threads": 1, "batch_size": 32, "throughput_rps": 30, "p95_ms": 400},
+            {"workers": 2, "threads": 2, "batch_size": 16, "throughput_rps": 20, "p95_ms": 200},
+        ]
+
+        best, within_slo = select_best(results, slo_ms=250)
+
+        assert within_slo
+        assert best["workers"] == 2
+
+    def test_select_best_without_feasible(self):
+        """Testa fallback para o menor p95 quando nada atende o SLO"""
+        results = [
+            {"workers": 1, "threads": 4, "batch_size": 32, "throughput_rps": 10, "p95_ms": 300},
+            {"workers": 4, "threads": 1, "batch_size": 32, "throughput_rps": 30, "p95_ms": 400},
+        ]
+
+        best, within_slo = select_best(results, slo_ms=100)
+
+        assert not within_slo
+        assert best["p95_ms"] == 300
+
+    def test_format_env(self):
+        """Testa formato das variáveis de ambiente emitidas"""
+        env = format_env({"workers": 2, "threads": 3, "batch_size": 16})
+
+        assert env == "WEB_CONCURRENCY=2\nTORCH_NUM_THREADS=3\nENCODE_BATCH_SIZE=16\n"
+
+    def test_synthetic_payloads_use_catalog(self):
+        """Testa geração de payloads a partir do catálogo"""
+        payloads = synthetic_payloads(FakeManager(), n_requests=3, jobs_per_request=5,
+                                      cv_words=20, job_words=10)
+
+        assert len(payloads) == 3
+        candidate_text, job_texts = payloads[0]
+        assert len(candidate_text.split()) == 20
+        assert job_texts == ["vaga python sql"] * 5
+
+    def test_benchmark_config(self):
+        """Testa medição com workers em processos separados"""
+        manager = FakeManager()
+        payloads = synthetic_payloads(manager, 4, 3, 10, 10)
+
+        result = benchmark_config(manager, payloads, n_workers=2, n_threads=1,
+                                  batch_size=8, duration=0.2)
+
+        assert result["requests"] > 0
+        assert result["throughput_rps"] > 0
+        assert result["p95_ms"] >= result["p50_ms"]
@@ -0,0 +1,221 @@
+"""
+Testes para captura de tráfego e replay
+"""
+import os
+import gzip
+import json
+import asyncio
+import argparse
+import tempfile
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI, HTTPException, Request
+
+from app.capture import TrafficCapture
+from app.replay import load_capture, read_capture, replay, run, uses_session
+
+@pytest.fixture
+def capture_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+def capture_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory))
+
+class TestTrafficCapture:
+    """Testes para amostragem e gravação das capturas"""
+
+    def test_disabled_by_default(self, capture_dir):
+        """Testa que sample_rate 0 nunca captura"""
+        capture = TrafficCapture(capture_dir)
+
+        assert not capture.enabled
+        assert not any(capture.should_capture() for _ in range(100))
+
+    def test_sampling_rate(self, capture_dir):
+        """Testa que a fração capturada acompanha sample_rate"""
+        capture = TrafficCapture(capture_dir, sample_rate=0.25, seed=0)
+
+        captured = sum(capture.should_capture() for _ in range(4000))
+
+        assert 800 < captured < 1200
+
+    def test_forked_workers_draw_different_samples(self, capture_dir):
+        """Testa que processos com o gerador herdado do master sorteiam sequências próprias"""
+        def draws(pid):
+            capture = TrafficCapture(capture_dir, sample_rate=0.5, seed=0)
+            with patch("app.capture.os.getpid", return_value=pid):
+                return [capture.should_capture() for _ in range(64)]
+
+        assert draws(1001) != draws(1002)
+        assert draws(1001) == draws(1001)
+
+    def test_writes_gzip_jsonl(self, capture_dir):
+        """Testa registros gravados em .jsonl.gz e legíveis pelo replay"""
+        capture = TrafficCapture(capture_dir, sample_rate=1.0, flush_interval=0.05)
+        for i in range(5):
+            capture.record({"candidate": {"cv_pt": f"cv {i}"}, "jobs": []}, received_at=100.0 + i,
+                           duration_ms=12.5, status_code=200)
+        capture.stop()
+
+        files = capture_files(capture_dir)
+        assert len(files) == 1
+        assert files[0].endswith(".jsonl.gz")
+
+        with gzip.open(files[0], "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+
+        assert [r["ts"] for r in records] == [100.0, 101.0, 102.0, 103.0, 104.0]
+        assert records[0]["endpoint"] == "/predict"
+        assert records[0]["status"] == 200
+        assert records[0]["payload"]["candidate"]["cv_pt"] == "cv 0"
+        assert "headers" not in records[0]
+
+    def test_records_headers(self, capture_dir):
+        capture = TrafficCapture(capture_dir, sample_rate=1.0, flush_interval=0.05)
+        capture.record({}, received_at=1.0, duration_ms=1.0, status_code=503,
+                       headers={"x-request-timeout-ms": "100"})
+        capture.stop()
+
+        assert load_capture(capture_files(capture_dir))[0]["headers"] == {"x-request-timeout-ms": "100"}
+
+    def test_rotates_files(self, capture_dir):
+        """Testa a troca de arquivo a cada records_per_file registros"""
+        capture = TrafficCapture(capture_dir, sample_rate=1.0, records_per_file=2, flush_interval=0.05)
+        for i in range(5):
+            capture.record({"i": i}, received_at=float(i), duration_ms=1.0, status_code=200)
+        capture.stop()
+
+        assert len(capture_files(capture_dir)) == 3
+        assert len(load_capture(capture_files(capture_dir))) == 5
+
+    def test_drops_when_queue_full(self, capture_dir):
+        """Testa que a requisição não bloqueia com a fila cheia"""
+        capture = TrafficCapture(capture_dir, sample_rate=1.0, max_queue=1)
+        drops = []
+        capture.on_drop = lambda: drops.append(1)
+
+        # Ocupa a fila antes da thread drenar
+        capture._pid = os.getpid()
+        capture.record({}, received_at=0.0, duration_ms=1.0, status_code=200)
+        capture.record({}, received_at=1.0, duration_ms=1.0, status_code=200)
+
+        assert capture.dropped == 1
+        assert len(drops) == 1
+
+class TestReplay:
+    """Testes para leitura das capturas e replay contra um app ASGI"""
+
+    def write_capture(self, path, records):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def test_merges_files_by_timestamp(self, capture_dir):
+        """Testa a ordem de chegada entre capturas de vários workers"""
+        first = os.path.join(capture_dir, "a.jsonl.gz")
+        second = os.path.join(capture_dir, "b.jsonl.gz")
+        self.write_capture(first, [{"ts": 1.0}, {"ts": 3.0}])
+        self.write_capture(second, [{"ts": 2.0}, {"ts": 4.0}])
+
+        records = load_capture([first, second])
+
+        assert [r["ts"] for r in records] == [1.0, 2.0, 3.0, 4.0]
+        assert len(load_capture([first, second], limit=3)) == 3
+
+    def test_tolerates_truncated_file(self, capture_dir):
+        """Testa que uma última linha incompleta é ignorada"""
+        path = os.path.join(capture_dir, "truncated.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"ts": 1.0}) + "\n")
+            f.write('{"ts": 2.0, "payl')
+
+        assert [r["ts"] for r in read_capture(path)] == [1.0]
+
+    def test_replay_against_app(self):
+        """Testa o replay em ordem e o resumo de status e latências"""
+        app = FastAPI()
+        received = []
+
+        @app.post("/predict")
+        async def predict(payload: dict):
+            received.append(payload["i"])
+            if payload["i"] == 2:
+                raise HTTPException(status_code=400, detail="inválido")
+            return {"ok": True}
+
+        records = [
+            {"ts": 10.0 + i * 0.01, "endpoint": "/predict", "duration_ms": 5.0, "status": 200, "payload": {"i": i}}
+            for i in range(5)
+        ]
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+                return await replay(records, client, speed=1.0, concurrency=1)
+
+        summary = asyncio.run(run())
+
+        assert received == [0, 1, 2, 3, 4]
+        assert summary["requests"] == 5
+        assert summary["status"] == {"200": 4, "400": 1}
+        assert summary["status_mismatches"] == 1
+        assert summary["recorded_ms"]["p50"] == 5.0
+        # Ritmo gravado preservado: 40ms entre a primeira e a última
+        assert summary["elapsed_s"] >= 0.04
+
+    def test_replays_headers_and_skips_sessions(self, capture_dir):
+        """Testa que os headers gravados são reenviados e requisições com handle ficam de fora"""
+        app = FastAPI()
+        received = []
+
+        @app.post("/predict")
+        async def predict(payload: dict, request: Request):
+            received.append((payload["i"], request.headers.get("x-request-timeout-ms")))
+            return {"ok": True}
+
+        path = os.path.join(capture_dir, "capture.jsonl.gz")
+        self.write_capture(path, [
+            {"ts": 1.0, "duration_ms": 1.0, "status": 200, "payload": {"i": 0, "candidate_handle": None},
+             "headers": {"x-request-timeout-ms": "250"}},
+            {"ts": 2.0, "duration_ms": 1.0, "status": 200, "payload": {"i": 1, "candidate_handle": "h" * 24}},
+        ])
+        args = argparse.Namespace(captures=[path], limit=None, target="inprocess", timeout=5.0,
+                                  speed=0.0, concurrency=1)
+
+        with patch("app.replay.create_client",
+                   lambda target, timeout: httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                                             base_url="http://replay")):
+            summary = asyncio.run(run(args))
+
+        assert received == [(0, "250")]
+        assert summary["requests"] == 1 and summary["skipped_session_requests"] == 1
+        assert uses_session({"payload": {"candidate_handle": "abc"}})
+
+    def test_limit_counts_replayable_requests(self, capture_dir):
+        """Testa que --limit é aplicado depois de descartar as requisições com handle"""
+        app = FastAPI()
+        received = []
+
+        @app.post("/predict")
+        async def predict(payload: dict):
+            received.append(payload["i"])
+            return {"ok": True}
+
+        path = os.path.join(capture_dir, "capture.jsonl.gz")
+        self.write_capture(path, [
+            {"ts": float(i), "duration_ms": 1.0, "status": 200,
+             "payload": {"i": i, "candidate_handle": "h" * 24 if i < 3 else None}}
+            for i in range(6)
+        ])
+        args = argparse.Namespace(captures=[path], limit=2, target="inprocess", timeout=5.0,
+                                  speed=0.0, concurrency=1)
+
+        with patch("app.replay.create_client",
+                   lambda target, timeout: httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                                             base_url="http://replay")):
+            summary = asyncio.run(run(args))
+
+        assert received == [3, 4]
+        assert summary["requests"] == 2 and summary["skipped_session_requests"] == 3
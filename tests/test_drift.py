@@ -0,0 +1,172 @@
+"""
+Testes para o monitor de drift em streaming
+"""
+import time
+import threading
+import numpy as np
+import pytest
+
+from app.drift import (StreamingMoments, ReservoirSample, ScoreHistogram, ReferenceStats,
+                       DriftMonitor, population_stability_index)
+
+class TestStreamingStats:
+    """Testes para os sketches em streaming"""
+
+    def test_moments_match_numpy(self):
+        """Testa média e variância em lotes contra o cálculo direto"""
+        rng = np.random.default_rng(0)
+        data = rng.normal(size=(500, 8))
+        moments = StreamingMoments(8)
+
+        for start in range(0, 500, 37):
+            moments.update(data[start:start + 37])
+
+        assert moments.count == 500
+        np.testing.assert_allclose(moments.mean, data.mean(axis=0), atol=1e-10)
+        np.testing.assert_allclose(moments.variance, data.var(axis=0, ddof=1), atol=1e-10)
+
+    def test_reservoir_fixed_size(self):
+        """Testa que o reservatório não cresce além do tamanho"""
+        reservoir = ReservoirSample(size=10, dim=4, seed=0)
+
+        reservoir.update(np.ones((3, 4)))
+        assert reservoir.sample.shape == (3, 4)
+
+        reservoir.update(np.arange(400).reshape(100, 4))
+        assert reservoir.sample.shape == (10, 4)
+        assert reservoir.seen == 103
+
+    def test_reservoir_uniform(self):
+        """Testa que a amostra cobre o fluxo inteiro, não só o início"""
+        reservoir = ReservoirSample(size=200, dim=1, seed=1)
+        for start in range(0, 10000, 100):
+            reservoir.update(np.arange(start, start + 100).reshape(-1, 1))
+
+        assert reservoir.sample.mean() == pytest.approx(5000, rel=0.15)
+
+    def test_histogram_and_psi(self):
+        """Testa PSI nulo para distribuições iguais e alto para deslocadas"""
+        same = ScoreHistogram(bins=10)
+        same.update(np.linspace(0, 1, 1000))
+        shifted = ScoreHistogram(bins=10)
+        shifted.update(np.full(1000, 0.95))
+
+        assert same.total == 1000
+        assert population_stability_index(same.counts, same.counts) == pytest.approx(0.0)
+        assert population_stability_index(same.counts, shifted.counts) > 1.0
+
+class TestDriftMonitor:
+    """Testes para a comparação com a referência"""
+
+    @pytest.fixture
+    def reference(self):
+        rng = np.random.default_rng(42)
+        return rng.normal(size=(2000, 16)).astype(np.float32), rng.normal(size=(300, 16)).astype(np.float32)
+
+    def test_reference_stats(self, reference):
+        """Testa estatísticas de referência com subamostragem"""
+        candidates, _ = reference
+        stats = ReferenceStats(candidates, max_rows=500)
+
+        assert stats.dim == 16
+        assert stats.centroid_histogram.total == 500
+        np.testing.assert_allclose(stats.mean, candidates[::4].mean(axis=0), atol=1e-5)
+
+    def test_no_drift_on_reference_traffic(self, reference):
+        """Testa scores baixos para tráfego com a mesma distribuição"""
+        candidates, jobs = reference
+        monitor = DriftMonitor.from_embeddings(candidates, jobs, eval_interval=3600, seed=0)
+        rng = np.random.default_rng(7)
+
+        monitor.update_embeddings("job", rng.normal(size=(1000, 16)))
+        result = monitor.evaluate()
+
+        assert result["embeddings"]["job"]["mean_shift"] < 0.2
+        assert result["embeddings"]["job"]["psi"] < 0.25
+
+    def test_drift_on_shifted_traffic(self, reference):
+        """Testa detecção de deslocamento nos embeddings e nos scores"""
+        candidates, jobs = reference
+        monitor = DriftMonitor.from_embeddings(candidates, jobs, eval_interval=3600, seed=0)
+        rng = np.random.default_rng(7)
+
+        monitor.update_embeddings("candidate", rng.normal(loc=2.0, size=(1000, 16)))
+        monitor.update_scores(np.full(100, 0.99), np.full(100, 0.99))
+        result = monitor.evaluate()
+
+        assert result["embeddings"]["candidate"]["mean_shift"] > 1.0
+        assert result["scores"]["similarity"]["psi"] > 1.0
+        assert "ml_score" not in result["scores"]  # sem scorer de referência
+
+    def test_periodic_evaluation_and_callback(self, reference):
+        """Testa avaliação automática ao fim do intervalo, com reinício da janela"""
+        candidates, jobs = reference
+        results = []
+        monitor = DriftMonitor.from_embeddings(candidates, jobs, eval_interval=0, min_samples=10,
+                                               on_evaluate=results.append, seed=0)
+
+        monitor.update_embeddings("job", np.zeros((5, 16)))
+        assert results == []  # amostras insuficientes
+
+        monitor.update_embeddings("job", np.zeros((5, 16)))
+        assert len(results) == 1
+        assert monitor.last_result["samples"]["job"] == 10
+
+    def test_ml_scorer_reference(self, reference):
+        """Testa referência de ml_score a partir do scorer do modelo"""
+        candidates, jobs = reference
+        monitor = DriftMonitor.from_embeddings(
+            candidates, jobs, ml_scorer=lambda c, j: np.full(len(j), 0.5), eval_interval=3600
+        )
+
+        monitor.update_scores(np.full(10, 0.5), np.full(10, 0.5))
+        result = monitor.evaluate(force=True)
+
+        assert result["scores"]["ml_score"]["psi"] == pytest.approx(0.0, abs=1e-6)
+
+    def test_ignores_wrong_dimension(self, reference):
+        """Testa que vetores com dimensão diferente são ignorados"""
+        candidates, jobs = reference
+        monitor = DriftMonitor.from_embeddings(candidates, jobs, eval_interval=3600)
+
+        monitor.update_embeddings("job", np.zeros((3, 8)))
+        monitor.update_embeddings("desconhecido", np.zeros((3, 16)))
+
+        assert monitor.evaluate() is None
+
+    def test_lazy_score_reference(self, reference):
+        """Testa que a referência de ml_score só passa pela rede na primeira avaliação"""
+        candidates, jobs = reference
+        calls = []
+
+        def ml_scorer(candidate, rows):
+            calls.append(len(rows))
+            return np.full(len(rows), 0.5)
+
+        monitor = DriftMonitor.from_embeddings(candidates, jobs, ml_scorer=ml_scorer, lazy_scores=True,
+                                               eval_interval=3600)
+        assert calls == [] and monitor.score_references == {}
+
+        monitor.update_scores(np.full(10, 0.5), np.full(10, 0.5))
+        result = monitor.evaluate(force=True)
+
+        assert calls and result["scores"]["ml_score"]["psi"] == pytest.approx(0.0, abs=1e-6)
+
+    def test_background_evaluation(self, reference):
+        """Testa que com start() as atualizações não avaliam na thread da requisição"""
+        candidates, jobs = reference
+        threads = []
+        monitor = DriftMonitor.from_embeddings(
+            candidates, jobs, eval_interval=0.05, min_samples=10, seed=0,
+            on_evaluate=lambda result: threads.append((threading.current_thread().name, result["samples"]["job"]))
+        )
+        monitor.start()
+        try:
+            monitor.update_embeddings("job", np.zeros((10, 16)))
+            deadline = time.monotonic() + 5
+            while not threads and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            monitor.stop()
+
+        assert threads[0] == ("drift-evaluator", 10)
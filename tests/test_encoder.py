@@ -0,0 +1,93 @@
+"""
+Testes para o encoder local (model/encoder)
+"""
+import os
+import tempfile
+import numpy as np
+import pytest
+import torch
+from safetensors.torch import load_file
+
+from app.encoder import check_encoder, convert_to_safetensors, encoder_fingerprint, load_encoder, missing_encoder_files
+from app.network import JobCandidateMatchingNet, model_version
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "desenvolvedor", "python", "vaga", "sap"]
+
+@pytest.fixture
+def encoder_dir():
+    """Encoder BERT minúsculo salvo como o export_encoder grava"""
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vocab_path = os.path.join(tmp_dir, "vocab.txt")
+        with open(vocab_path, "w") as f:
+            f.write("\n".join(VOCAB))
+        source = os.path.join(tmp_dir, "hf")
+        config = BertConfig(vocab_size=len(VOCAB), hidden_size=16, num_hidden_layers=1,
+                            num_attention_heads=2, intermediate_size=32)
+        BertModel(config).save_pretrained(source)
+        BertTokenizerFast(vocab_path).save_pretrained(source)
+
+        output = os.path.join(tmp_dir, "encoder")
+        SentenceTransformer(modules=[models.Transformer(source), models.Pooling(16)]).save(output)
+        convert_to_safetensors(output)
+        yield output
+
+class TestEncoder:
+    """Testes para a carga offline do encoder"""
+
+    def test_missing_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            missing = missing_encoder_files(tmp_dir)
+
+            assert "model.safetensors" in missing
+            with pytest.raises(FileNotFoundError, match="python -m app.encoder"):
+                check_encoder(tmp_dir)
+
+    def test_bin_weights_are_not_accepted(self, encoder_dir):
+        """Testa que só pesos em safetensors contam como encoder completo"""
+        os.rename(os.path.join(encoder_dir, "model.safetensors"), os.path.join(encoder_dir, "pytorch_model.bin"))
+
+        assert missing_encoder_files(encoder_dir) == ["model.safetensors"]
+
+    def test_convert_to_safetensors(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_dict = {"weight": torch.randn(4, 3), "bias": torch.randn(4)}
+            torch.save(state_dict, os.path.join(tmp_dir, "pytorch_model.bin"))
+
+            converted = convert_to_safetensors(tmp_dir)
+
+            assert converted == [os.path.join(tmp_dir, "model.safetensors")]
+            assert not os.path.exists(os.path.join(tmp_dir, "pytorch_model.bin"))
+            loaded = load_file(converted[0])
+            assert all(torch.equal(loaded[name], tensor) for name, tensor in state_dict.items())
+
+    def test_load_local_encoder(self, encoder_dir):
+        """Testa a carga do diretório local e o encode"""
+        model = load_encoder(encoder_dir)
+
+        embeddings = model.encode(["desenvolvedor python", "vaga sap"])
+
+        assert embeddings.shape == (2, 16)
+        assert np.isfinite(embeddings).all()
+
+    def test_fingerprint_changes_model_version(self):
+        """Testa que trocar os pesos do encoder muda a versão do modelo (chave do cache de pares)"""
+        net = JobCandidateMatchingNet(embedding_dim=16, hidden_dim=32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "1_Pooling"))
+            with open(os.path.join(tmp_dir, "1_Pooling", "config.json"), "w") as f:
+                f.write("{}")
+            with open(os.path.join(tmp_dir, "model.safetensors"), "wb") as f:
+                f.write(b"pesos v1")
+            before = encoder_fingerprint(tmp_dir)
+            assert encoder_fingerprint(tmp_dir) == before
+
+            with open(os.path.join(tmp_dir, "model.safetensors"), "wb") as f:
+                f.write(b"pesos v2")
+            after = encoder_fingerprint(tmp_dir)
+
+        assert after != before
+        assert model_version(net, before) != model_version(net, after)
+        assert model_version(net, before) != model_version(net)
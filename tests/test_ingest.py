@@ -0,0 +1,211 @@
+"""
+Testes para a ingestão em streaming do dataset
+"""
+import os
+import io
+import json
+import tempfile
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.ingest import StreamingObjectParser, ingest_file, main, text_record
+from app.text import preprocess_text
+from app.text_store import TextStore
+
+DIM = 8
+
+def fake_encode(texts):
+    # Embedding determinístico derivado do texto
+    return np.array([[len(text) + i for i in range(DIM)] for text in texts], dtype=np.float32)
+
+def make_vagas(n):
+    return {
+        str(1000 + i): {
+            "infos_basicas": {"titulo_vaga": f"Desenvolvedor Python {i}", "objetivo_vaga": "Criar APIs, ágeis!"},
+            "perfil_vaga": {"principais_atividades": "FastAPI e SQL", "competencia_tecnicas_e_comportamentais": ""},
+        }
+        for i in range(n)
+    }
+
+@pytest.fixture
+def workdir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+def write_json(path, data, **kwargs):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+
+class TestStreamingObjectParser:
+    """Testes para o parser incremental"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+    def test_matches_json_load(self, workdir, chunk_size):
+        """Testa que qualquer tamanho de bloco reproduz o json.load"""
+        data = make_vagas(20)
+        data["x"] = {"numero": 12345, "lista": [1.5, None, True], "texto": "ação \"aspas\" \\ fim"}
+        data["y"] = 987654321
+        path = os.path.join(workdir, "vagas.json")
+        write_json(path, data, indent=4)
+
+        parsed = dict(StreamingObjectParser(path, chunk_size=chunk_size))
+
+        assert parsed == data
+
+    def test_empty_object(self, workdir):
+        path = os.path.join(workdir, "empty.json")
+        write_json(path, {})
+
+        assert list(StreamingObjectParser(path)) == []
+
+    def test_truncated_file(self, workdir):
+        path = os.path.join(workdir, "truncated.json")
+        with open(path, "w") as f:
+            f.write('{"1": {"a": 1}, "2": {"a"')
+
+        with pytest.raises(ValueError):
+            list(StreamingObjectParser(path, chunk_size=4))
+
+    def test_escapes_split_between_chunks(self, workdir):
+        path = os.path.join(workdir, "escapes.json")
+        data = {"1": {"texto": "ação", "ativo": False, "nulo": None}}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=True)
+
+        assert dict(StreamingObjectParser(path, chunk_size=3)) == data
+
+    def test_malformed_item_fails_without_reading_rest(self, workdir):
+        """Testa que JSON inválido no meio do arquivo falha sem acumular o resto no buffer"""
+        path = os.path.join(workdir, "malformed.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"1": {"a": 1 "b": 2}, ')
+            f.write(json.dumps(make_vagas(200))[1:])
+
+        parser = StreamingObjectParser(path, chunk_size=64)
+        with pytest.raises(ValueError):
+            list(parser)
+
+        assert parser.bytes_read <= 128 < parser.total_bytes
+
+    @pytest.mark.parametrize("content", ['{"a": 1 "b": 2}', '{"a": 1,}', '{"a":1,,"b":2}', '{,"a": 1}'])
+    @pytest.mark.parametrize("chunk_size", [1, 1 << 20])
+    def test_rejects_invalid_separators(self, workdir, content, chunk_size):
+        """Testa que só uma vírgula separa os membros, como no json.load"""
+        path = os.path.join(workdir, "separators.json")
+        with open(path, "w") as f:
+            f.write(content)
+        with pytest.raises(ValueError):
+            json.loads(content)
+
+        with pytest.raises(ValueError):
+            list(StreamingObjectParser(path, chunk_size=chunk_size))
+
+    def test_rejects_non_object(self, workdir):
+        path = os.path.join(workdir, "list.json")
+        write_json(path, [1, 2])
+
+        with pytest.raises(ValueError):
+            list(StreamingObjectParser(path))
+
+class TestIngestFile:
+    """Testes para geração dos artefatos e retomada"""
+
+    def test_text_record_matches_api(self):
+        """Testa o texto extraído igual ao da API para a estrutura aninhada"""
+        record = text_record("candidate", "42", {
+            "cv_pt": "CV em Português 2024",
+            "infos_basicas": {"objetivo_profissional": "Analista"},
+            "informacoes_profissionais": {"conhecimentos_tecnicos": "Python, SQL"},
+        })
+
+        assert record["candidate_id"] == "42"
+        assert record["text"] == "CV em Português 2024 Analista Python, SQL"
+        assert record["processed_text"] == preprocess_text(record["text"])
+
+    def test_writes_model_artifacts(self, workdir):
+        data = make_vagas(25)
+        source = os.path.join(workdir, "vagas.json")
+        write_json(source, data)
+
+        summary = ingest_file(source, "job", workdir, fake_encode, batch_size=4, chunk_size=128,
+                              dim=DIM, stream=io.StringIO())
+
+        embeddings = np.load(os.path.join(workdir, "job_embeddings.npy"), mmap_mode="r")
+        texts = TextStore.open(os.path.join(workdir, "job_texts"))
+
+        assert summary["items"] == 25
+        assert embeddings.shape == (25, DIM)
+        assert [texts.id(row) for row in range(len(texts))] == list(data.keys())
+        np.testing.assert_array_equal(embeddings, fake_encode(list(texts.texts())))
+        # Arquivos parciais e checkpoint removidos
+        assert sorted(os.listdir(workdir)) == ["job_embeddings.npy", "job_texts", "vagas.json"]
+
+    def test_resume_after_failure(self, workdir):
+        """Testa que a retomada não reprocessa nem duplica lotes já gravados"""
+        data = make_vagas(30)
+        source = os.path.join(workdir, "vagas.json")
+        write_json(source, data)
+        encoded = []
+
+        def failing_encode(texts):
+            if len(encoded) >= 12:
+                raise RuntimeError("falha simulada")
+            encoded.extend(texts)
+            return fake_encode(texts)
+
+        with pytest.raises(RuntimeError):
+            ingest_file(source, "job", workdir, failing_encode, batch_size=4, dim=DIM, stream=io.StringIO())
+        assert not os.path.exists(os.path.join(workdir, "job_embeddings.npy"))
+
+        resumed = []
+
+        def resumed_encode(texts):
+            resumed.extend(texts)
+            return fake_encode(texts)
+
+        summary = ingest_file(source, "job", workdir, resumed_encode, batch_size=4, resume=True,
+                              dim=DIM, stream=io.StringIO())
+
+        texts = TextStore.open(os.path.join(workdir, "job_texts"))
+        embeddings = np.load(os.path.join(workdir, "job_embeddings.npy"))
+
+        assert summary["resumed_from"] == 12
+        assert len(resumed) == 18
+        assert [texts.id(row) for row in range(len(texts))] == list(data.keys())
+        np.testing.assert_array_equal(embeddings, fake_encode(list(texts.texts())))
+
+    def test_resume_ignores_changed_source(self, workdir):
+        """Testa que um checkpoint de outro arquivo é descartado"""
+        source = os.path.join(workdir, "vagas.json")
+        write_json(source, make_vagas(10))
+        calls = []
+
+        def failing_encode(texts):
+            calls.append(texts)
+            if len(calls) > 1:
+                raise RuntimeError("falha simulada")
+            return fake_encode(texts)
+
+        with pytest.raises(RuntimeError):
+            ingest_file(source, "job", workdir, failing_encode, batch_size=4, dim=DIM, stream=io.StringIO())
+
+        write_json(source, make_vagas(6))
+        summary = ingest_file(source, "job", workdir, fake_encode, batch_size=4, resume=True,
+                              dim=DIM, stream=io.StringIO())
+
+        assert summary["resumed_from"] == 0
+        assert summary["items"] == 6
+
+    @pytest.mark.parametrize("encoder_dir, expected", [("/opt/encoder", "/opt/encoder"), (None, "saida/encoder")])
+    def test_cli_uses_encoder_dir(self, monkeypatch, encoder_dir, expected):
+        """Testa que a ingestão usa o mesmo encoder da API (ENCODER_DIR) antes de <output-dir>/encoder"""
+        if encoder_dir:
+            monkeypatch.setenv("ENCODER_DIR", encoder_dir)
+        else:
+            monkeypatch.delenv("ENCODER_DIR", raising=False)
+
+        with patch('app.ingest.sentence_encoder') as sentence_encoder, patch('app.ingest.ingest_file'):
+            main(["--vagas", "vagas.json", "--output-dir", "saida"])
+
+        assert sentence_encoder.call_args[0][1] == expected
@@ -0,0 +1,101 @@
+"""
+Testes para o índice BM25 e a busca híbrida
+"""
+import math
+import os
+import tempfile
+import numpy as np
+import pytest
+
+from app.lexical import LexicalIndex, blend_scores, hybrid_top_k, tokenize
+
+TEXTS = [
+    "analista sap sênior com experiência em sap fi",
+    "desenvolvedor java spring boot",
+    "desenvolvedor python django com experiência em apis",
+    "consultor sap mm",
+    "analista de dados python sql",
+    "gerente de projetos",
+]
+
+def brute_force_bm25(texts, query, k1=1.2, b=0.75):
+    docs = [tokenize(text) for text in texts]
+    average_length = sum(len(doc) for doc in docs) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in docs)
+            tf = doc.count(term)
+            if not tf:
+                continue
+            idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average_length))
+        scores.append(score)
+    return np.array(scores)
+
+@pytest.fixture
+def index():
+    return LexicalIndex.build(TEXTS)
+
+class TestLexicalIndex:
+    """Testes para o índice invertido"""
+
+    def test_scores_match_bm25(self, index):
+        for query in ("sap", "desenvolvedor python", "experiência sap java"):
+            np.testing.assert_allclose(index.scores(query), brute_force_bm25(TEXTS, query), rtol=1e-5)
+
+    def test_top_k(self, index):
+        rows, scores = index.top_k("sap", 5)
+        expected = brute_force_bm25(TEXTS, "sap")
+
+        assert rows.tolist() == np.argsort(-expected)[:2].tolist()
+        assert scores[0] > scores[1] > 0
+        assert index.top_k("sap", 1)[0].tolist() == rows[:1].tolist()
+
+    def test_unknown_terms(self, index):
+        rows, _ = index.top_k("cobol mainframe", 5)
+
+        assert len(rows) == 0
+
+    def test_frequent_terms_ignored(self):
+        index = LexicalIndex.build(["vaga python", "vaga java", "vaga sap"], max_df_ratio=0.5)
+
+        assert not index.scores("vaga").any()
+        assert index.top_k("vaga java", 5)[0].tolist() == [1]
+
+    def test_save_and_open(self, index):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "job_lexical")
+            index.save(path)
+            opened = LexicalIndex.open(path)
+
+            assert isinstance(opened.doc_ids, np.memmap)
+            np.testing.assert_array_equal(opened.scores("analista python"), index.scores("analista python"))
+
+class TestHybrid:
+    """Testes para o pré-filtro com rerank denso"""
+
+    def test_blend(self):
+        blended = blend_scores(np.array([2.0, 1.0]), np.array([0.2, 0.8]), 0.5)
+
+        np.testing.assert_allclose(blended, [0.6, 0.65])
+        np.testing.assert_allclose(blend_scores(np.array([2.0, 1.0]), np.array([0.2, 0.8]), 0.0), [0.2, 0.8])
+
+    def test_reranks_only_lexical_candidates(self, index):
+        scored = []
+        ml = np.array([0.9, 0.1, 0.8, 0.7, 0.95, 0.3])
+
+        def score_rows(candidate, rows):
+            scored.append(rows.tolist())
+            return ml[rows] - 0.1, ml[rows]
+
+        result = hybrid_top_k(index, "analista sap python", np.zeros(4), score_rows, top_k=3,
+                              threshold=0.75, lexical_weight=0.0)
+
+        assert scored == [[0, 2, 3, 4]]
+        assert result["indices"].tolist() == [4, 0, 2]
+        np.testing.assert_allclose(result["ml_scores"], [0.95, 0.9, 0.8])
+
+    def test_no_lexical_match(self, index):
+        assert hybrid_top_k(index, "cobol", np.zeros(4), lambda c, rows: (rows, rows), top_k=3) is None
@@ -0,0 +1,145 @@
+"""
+Testes para o pipeline de logging não bloqueante
+"""
+import os
+import io
+import json
+import time
+import logging
+import tempfile
+import numpy as np
+import pytest
+
+from app.log_pipeline import LogPipeline
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture
+def log_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+@pytest.fixture
+def test_logger():
+    logger = logging.getLogger("test_log_pipeline")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger
+    logger.handlers.clear()
+
+class TestLogPipeline:
+    """Testes para fila limitada e escrita em JSON-lines"""
+
+    def test_writes_promtail_format(self, log_dir, test_logger):
+        """Testa campos esperados pelo promtail (timestamp RFC3339, level, message)"""
+        pipeline = LogPipeline(log_dir, flush_interval=0.05)
+        test_logger.addHandler(pipeline.handler)
+        pipeline.start()
+
+        test_logger.info("PREDICTION_METRICS", extra={"fields": {
+            "n_jobs": 3, "avg_ml_score": np.float32(0.5), "timestamp": "ignorado"
+        }})
+        test_logger.warning("aviso %s", "formatado")
+        pipeline.stop()
+
+        records = read_lines(os.path.join(log_dir, "api.log"))
+        assert [r["message"] for r in records] == ["PREDICTION_METRICS", "aviso formatado"]
+        assert records[0]["level"] == "INFO"
+        assert records[0]["n_jobs"] == 3
+        assert records[0]["avg_ml_score"] == 0.5
+        assert records[0]["timestamp"].endswith("+00:00")
+        assert records[0]["timestamp"] != "ignorado"
+
+    def test_full_queue_drops_and_counts(self, log_dir, test_logger):
+        """Testa descarte sem bloquear quando a fila está cheia"""
+        pipeline = LogPipeline(log_dir, max_queue=2)
+        drops = []
+        pipeline.on_drop = lambda: drops.append(1)
+        test_logger.addHandler(pipeline.handler)
+
+        # Sem a thread de escrita a fila não é drenada
+        started = time.perf_counter()
+        for i in range(10):
+            test_logger.info(f"mensagem {i}")
+        elapsed = time.perf_counter() - started
+
+        assert pipeline.dropped == 8
+        assert len(drops) == 8
+        assert elapsed < 1.0
+
+        pipeline.start()
+        pipeline.stop()
+        assert len(read_lines(os.path.join(log_dir, "api.log"))) == 2
+
+    def test_rotation(self, log_dir, test_logger):
+        """Testa rotação por tamanho mantendo backup_count arquivos"""
+        pipeline = LogPipeline(log_dir, max_bytes=300, backup_count=2, batch_size=1, flush_interval=0.05)
+        test_logger.addHandler(pipeline.handler)
+        pipeline.start()
+
+        for i in range(20):
+            test_logger.info(f"mensagem {i} " + "x" * 50)
+        pipeline.stop()
+
+        files = sorted(os.listdir(log_dir))
+        assert files == ["api.log", "api.log.1", "api.log.2"]
+        assert os.path.getsize(os.path.join(log_dir, "api.log")) <= 300
+
+    def test_echo_stream(self, log_dir, test_logger):
+        """Testa cópia legível para stdout/stderr feita pela thread"""
+        stream = io.StringIO()
+        pipeline = LogPipeline(log_dir, echo_stream=stream, flush_interval=0.05)
+        test_logger.addHandler(pipeline.handler)
+        pipeline.start()
+
+        test_logger.error("falhou")
+        pipeline.stop()
+
+        assert "test_log_pipeline - ERROR - falhou" in stream.getvalue()
+
+    def test_after_fork_uses_own_file(self, log_dir, test_logger):
+        """Testa que cada worker grava no próprio arquivo após o fork"""
+        pipeline = LogPipeline(log_dir, flush_interval=0.05)
+        test_logger.addHandler(pipeline.handler)
+
+        pipeline.after_fork_in_child()
+        test_logger.info("worker")
+        pipeline.stop()
+
+        assert os.path.basename(pipeline.path) == f"api.{os.getpid()}.log"
+        assert read_lines(pipeline.path)[0]["message"] == "worker"
+
+    def test_other_forked_children_do_not_write(self, log_dir, test_logger, capsys):
+        """Testa que filhos que não são workers da API não gravam e avisam uma vez no stderr"""
+        pipeline = LogPipeline(log_dir, flush_interval=0.05)
+        test_logger.addHandler(pipeline.handler)
+        pipeline.start()
+        parent_queue = pipeline.queue
+
+        pipeline.reset_after_fork()
+        test_logger.info("filho 1")
+        test_logger.info("filho 2")
+
+        assert pipeline.queue is not parent_queue and pipeline.queue.qsize() == 0
+        assert pipeline._thread is None and pipeline.dropped == 2
+        assert os.listdir(log_dir) == []
+        warnings = capsys.readouterr().err.splitlines()
+        assert len(warnings) == 1 and "filho 1" in warnings[0]
+
+    def test_retire_worker_keeps_recent_exited_workers(self, log_dir):
+        """Testa que arquivos de workers encerrados saem do glob *.log e não se acumulam"""
+        pipeline = LogPipeline(log_dir, backup_count=2)
+        for age, pid in enumerate([101, 102, 103, 104]):
+            with open(pipeline.worker_path(pid), "w") as f:
+                f.write("{}\n")
+            os.utime(pipeline.worker_path(pid), (1000 + age, 1000 + age))
+        with open(pipeline.worker_path(101) + ".1", "w") as f:
+            f.write("{}\n")
+        os.utime(pipeline.worker_path(101) + ".1", (999, 999))
+
+        for pid in (101, 102, 103):
+            pipeline.retire_worker(pid)
+
+        assert sorted(os.listdir(log_dir)) == ["api.102.log.1", "api.103.log.1", "api.104.log"]
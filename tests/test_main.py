@@ -5,14 +5,24 @@ import pytest
 import numpy as np
 import torch
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 import json
 import os
+import asyncio
 import tempfile
+import time
 
 # Importar a aplicação
 from app.main import app, ModelManager, JobCandidateMatchingNet
-from app.main import CandidateData, JobData, PredictionRequest
+from app.main import CandidateData, JobData, PredictionRequest, create_drift_monitor, open_job_projection
+from app.sharding import CatalogResult, InProcessCatalog, ShardScorer
+from app.score_cache import PairScoreCache
+from app.admission import AdmissionController
+from app.text_store import TextStore
+from app.lexical import LexicalIndex
+from app.projection import PcaProjection, write_projection
+from app.recommendations import RecommendationTable, TopKTable
+from app.sessions import CandidateSessionStore
 
 class TestJobCandidateMatchingNet:
     """Testes para a rede neural"""
@@ -47,9 +57,10 @@ class TestModelManager:
     def mock_model_manager(self):
         """Fixture para mock do ModelManager"""
         with patch('app.main.SentenceTransformer'), \
-             patch('app.main.torch.load'), \
+             patch('app.main.check_encoder'), \
+             patch('app.main.torch.load', return_value=JobCandidateMatchingNet(embedding_dim=384).state_dict()), \
              patch('app.main.np.load'), \
-             patch('app.main.joblib.load'):
+             patch('app.main.load_text_store'):
             
             manager = ModelManager(model_dir="test_model")
             
@@ -58,11 +69,39 @@ class TestModelManager:
             manager.neural_model = Mock()
             manager.candidate_embeddings = np.random.rand(100, 384)
             manager.job_embeddings = np.random.rand(50, 384)
-            manager.candidate_texts = [{"candidate_id": "1", "text": "test"}]
-            manager.job_texts = [{"job_id": "1", "text": "test"}]
+            manager.candidate_texts = TextStore.from_texts(["1"], ["test"])
+            manager.job_texts = TextStore.from_texts(["1"], ["test"])
             
             return manager
-    
+
+    def test_threads_not_configured_on_load(self, monkeypatch):
+        """Testa que o carregamento (no master pré-carregado) não inicia o pool de threads do torch"""
+        monkeypatch.setenv("TORCH_NUM_THREADS", "2")
+        with patch('app.main.SentenceTransformer'), \
+             patch('app.main.check_encoder'), \
+             patch('app.main.torch.load', return_value=JobCandidateMatchingNet(embedding_dim=384).state_dict()), \
+             patch('app.main.np.load'), \
+             patch('app.main.load_text_store'), \
+             patch('app.main.configure_torch_threads') as configure:
+            ModelManager(model_dir="test_model")
+
+        configure.assert_not_called()
+
+    @pytest.mark.parametrize("lexical_docs, expected", [(5, True), (3, False)])
+    def test_lexical_index_must_match_catalog(self, lexical_docs, expected):
+        """Testa que um índice BM25 com outra quantidade de vagas é ignorado"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            np.save(os.path.join(tmp_dir, 'job_embeddings.npy'), np.random.rand(5, 384).astype(np.float32))
+            np.save(os.path.join(tmp_dir, 'candidate_embeddings.npy'), np.random.rand(2, 384).astype(np.float32))
+            LexicalIndex.build([f"vaga {i}" for i in range(lexical_docs)]).save(os.path.join(tmp_dir, 'job_lexical'))
+            with patch('app.main.SentenceTransformer'), \
+                 patch('app.main.check_encoder'), \
+                 patch('app.main.torch.load', return_value=JobCandidateMatchingNet(embedding_dim=384).state_dict()), \
+                 patch('app.main.load_text_store'):
+                manager = ModelManager(model_dir=tmp_dir)
+
+            assert (manager.job_lexical is not None) == expected
+
     def test_preprocess_text(self, mock_model_manager):
         """Testa pré-processamento de texto"""
         text = "Desenvolvedor Python com 5 anos de experiência!"
@@ -163,6 +202,41 @@ class TestModelManager:
         # Verificações
         assert isinstance(similarity, float)
         assert -1 <= similarity <= 1
+    
+    def test_generate_embeddings_batch(self, mock_model_manager):
+        """Testa geração de embeddings em lote"""
+        mock_model_manager.sentence_model.encode.return_value = np.random.rand(3, 384)
+        mock_model_manager.encode_batch_size = 16
+        
+        embeddings = mock_model_manager.generate_embeddings(["a", "", "c"])
+        
+        assert embeddings.shape == (3, 384)
+        mock_model_manager.sentence_model.encode.assert_called_once_with(
+            ["a", "texto vazio", "c"], batch_size=16, device=mock_model_manager.device
+        )
+    
+    def test_calculate_similarities_matches_single(self, mock_model_manager):
+        """Testa que a similaridade em lote equivale à unitária"""
+        candidate = np.random.rand(384)
+        jobs = np.random.rand(5, 384)
+        
+        similarities = mock_model_manager.calculate_similarities(candidate, jobs)
+        
+        assert similarities.shape == (5,)
+        for job, similarity in zip(jobs, similarities):
+            assert similarity == pytest.approx(mock_model_manager.calculate_similarity(candidate, job), abs=1e-5)
+    
+    def test_predict_matches_matches_single(self, mock_model_manager):
+        """Testa que o forward em lote equivale ao unitário"""
+        mock_model_manager.neural_model = JobCandidateMatchingNet(embedding_dim=384).eval()
+        candidate = np.random.rand(384)
+        jobs = np.random.rand(4, 384)
+        
+        scores = mock_model_manager.predict_matches(candidate, jobs)
+        
+        assert scores.shape == (4,)
+        for job, score in zip(jobs, scores):
+            assert score == pytest.approx(mock_model_manager.predict_match(candidate, job), abs=1e-5)
 
 class TestAPI:
     """Testes para os endpoints da API"""
@@ -184,6 +258,13 @@ class TestAPI:
             mock_manager.calculate_similarity.return_value = 0.8
             mock_manager.predict_match.return_value = 0.85
             
+            # Versões em lote seguem os valores configurados nos métodos unitários
+            mock_manager.generate_embeddings.side_effect = lambda texts: np.random.rand(len(texts), 384)
+            mock_manager.calculate_similarities.side_effect = \
+                lambda c, jobs: np.full(len(jobs), mock_manager.calculate_similarity.return_value)
+            mock_manager.predict_matches.side_effect = \
+                lambda c, jobs: np.full(len(jobs), mock_manager.predict_match.return_value)
+            
             yield mock_manager
     
     def test_root_endpoint(self, client):
@@ -239,6 +320,23 @@ class TestAPI:
         mock_model_manager_api.extract_candidate_text.assert_called_once()
         mock_model_manager_api.generate_embedding.assert_called()
     
+    def test_predict_endpoint_uses_pair_cache(self, client, mock_model_manager_api):
+        """Testa que pares repetidos não passam de novo pelos modelos"""
+        request_data = {
+            "candidate": {"cv_pt": "Desenvolvedor Python"},
+            "jobs": [{"titulo_vaga": "Desenvolvedor Python Senior"}],
+            "threshold": 0.5
+        }
+        
+        first = client.post("/predict", json=request_data)
+        second = client.post("/predict", json=request_data)
+        
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.json()["recommendations"] == second.json()["recommendations"]
+        assert mock_model_manager_api.generate_embedding.call_count == 1
+        assert mock_model_manager_api.generate_embeddings.call_count == 1
+    
     def test_predict_endpoint_empty_candidate(self, client, mock_model_manager_api):
         """Testa endpoint com candidato vazio"""
         # Mock para retornar texto vazio
@@ -296,9 +394,397 @@ class TestAPI:
         }
         
         response = client.post("/predict", json=request_data)
-        
+
         assert response.status_code == 422  # Validation error
 
+    def test_predict_endpoint_catalog_job_ids(self, client, mock_model_manager_api):
+        """Testa vagas referenciadas por id do catálogo, sem passar pelo encoder"""
+        mock_model_manager_api.job_embeddings = np.random.rand(10, 384).astype(np.float32)
+        mock_model_manager_api.job_texts = TextStore.from_texts([str(100 + i) for i in range(10)],
+                                                                [f"vaga {i}" for i in range(10)])
+        mock_model_manager_api.job_row.side_effect = lambda job_id: {"103": 3, "107": 7}.get(job_id)
+        
+        response = client.post("/predict", json={
+            "candidate": {"cv_pt": "Desenvolvedor Python"},
+            "jobs": [{"job_id": "103"}, {"titulo_vaga": "Desenvolvedor Python Senior"}, {"job_id": "107"}]
+        })
+        
+        assert response.status_code == 200
+        recommendations = response.json()["recommendations"]
+        assert sorted(r["job_index"] for r in recommendations) == [0, 1, 2]
+        assert {r["job_preview"] for r in recommendations} == {"vaga 3", "vaga python senior", "vaga 7"}
+        # Só a vaga por texto foi codificada
+        assert mock_model_manager_api.generate_embeddings.call_args[0][0] == ["vaga python senior"]
+        scored_jobs = mock_model_manager_api.predict_matches.call_args[0][1]
+        np.testing.assert_array_equal(scored_jobs, mock_model_manager_api.job_embeddings[[3, 7]])
+    
+    def test_predict_endpoint_unknown_job_id(self, client, mock_model_manager_api):
+        mock_model_manager_api.job_row.return_value = None
+        
+        response = client.post("/predict", json={
+            "candidate": {"cv_pt": "Desenvolvedor Python"}, "jobs": [{"job_id": "999"}]
+        })
+        
+        assert response.status_code == 400
+        assert "999" in response.json()["detail"]
+    
+    def test_predict_endpoint_client_embeddings(self, client, mock_model_manager_api):
+        """Testa candidato e vagas com embeddings prontos: nenhum encode"""
+        mock_model_manager_api.extract_candidate_text.return_value = ""
+        vectors = np.random.rand(3, 384).round(6).tolist()
+        
+        response = client.post("/predict", json={
+            "candidate": {"embedding": vectors[0]},
+            "jobs": [{"embedding": vectors[1]}, {"embedding": vectors[2]}]
+        })
+        
+        assert response.status_code == 200
+        assert len(response.json()["recommendations"]) == 2
+        mock_model_manager_api.generate_embedding.assert_not_called()
+        mock_model_manager_api.generate_embeddings.assert_not_called()
+        np.testing.assert_allclose(mock_model_manager_api.predict_matches.call_args[0][0], vectors[0], rtol=1e-6)
+    
+    def test_predict_endpoint_embedding_dimension(self, client):
+        response = client.post("/predict", json={
+            "candidate": {"cv_pt": "Desenvolvedor Python"}, "jobs": [{"embedding": [0.1] * 10}]
+        })
+        
+        assert response.status_code == 422
+
+    def test_candidate_session_reused_across_calls(self, client, mock_model_manager_api):
+        """Testa que o CV é codificado uma vez no registro e o handle dispensa o encode"""
+        embedding = np.random.rand(384)
+        mock_model_manager_api.generate_embedding.return_value = embedding
+        catalog = Mock()
+        catalog.top_k.return_value = CatalogResult(
+            np.array([0]), np.array([0.9], dtype=np.float32), np.array([0.8], dtype=np.float32), 1, []
+        )
+        mock_model_manager_api.job_texts = TextStore.from_texts(["1"], ["vaga"])
+        
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+             patch('app.main.candidate_sessions', CandidateSessionStore(tmp_dir)), \
+             patch('app.main.job_catalog', catalog), \
+             patch('app.main.pair_score_cache', PairScoreCache(maxsize=0)):
+            registered = client.post("/candidates/session", json={"cv_pt": "Desenvolvedor Python"})
+            handle = registered.json()["handle"]
+            predict = client.post("/predict", json={
+                "candidate_handle": handle, "jobs": [{"titulo_vaga": "Python"}, {"titulo_vaga": "Java"}]
+            })
+            match = client.post("/catalog/match", json={"candidate_handle": handle})
+            deleted = client.delete(f"/candidates/session/{handle}")
+            expired = client.post("/catalog/match", json={"candidate_handle": handle})
+        
+        assert registered.status_code == 200
+        assert registered.json()["candidate_processed_text"] == "desenvolvedor python"
+        assert predict.status_code == 200
+        assert predict.json()["candidate_processed_text"] == "desenvolvedor python"
+        assert match.status_code == 200
+        mock_model_manager_api.generate_embedding.assert_called_once()
+        mock_model_manager_api.extract_candidate_text.assert_called_once()
+        np.testing.assert_allclose(catalog.top_k.call_args[0][0], embedding, rtol=1e-6)
+        assert deleted.status_code == 204
+        assert expired.status_code == 404
+    
+    def test_candidate_session_store_full(self, client, mock_model_manager_api):
+        """Testa que SESSION_DIR sem espaço responde 503 em vez de erro interno"""
+        store = Mock()
+        store.register.side_effect = OSError(28, "No space left on device")
+        
+        with patch('app.main.candidate_sessions', store):
+            response = client.post("/candidates/session", json={"cv_pt": "Desenvolvedor Python"})
+        
+        assert response.status_code == 503
+    
+    def test_job_id_and_embedding_are_exclusive(self, client):
+        response = client.post("/predict", json={
+            "candidate": {"cv_pt": "Python"}, "jobs": [{"job_id": "1", "embedding": [0.1] * 384}]
+        })
+        
+        assert response.status_code == 422
+    
+    def test_candidate_and_handle_are_exclusive(self, client):
+        both = client.post("/predict", json={
+            "candidate": {"cv_pt": "Python"}, "candidate_handle": "a" * 24, "jobs": [{"titulo_vaga": "Python"}]
+        })
+        neither = client.post("/predict", json={"jobs": [{"titulo_vaga": "Python"}]})
+        
+        assert both.status_code == 422
+        assert neither.status_code == 422
+    
+    def test_predict_endpoint_deadline(self, client, mock_model_manager_api):
+        """Testa que o prazo esgotado interrompe o encode entre os lotes"""
+        def slow_embeddings(texts):
+            time.sleep(0.05)
+            return np.random.rand(len(texts), 384)
+        mock_model_manager_api.generate_embeddings.side_effect = slow_embeddings
+        jobs = [{"titulo_vaga": f"Vaga {i}"} for i in range(10)]
+        
+        with patch('app.main.PREDICT_CHUNK_SIZE', 2), patch('app.main.pair_score_cache', PairScoreCache(0)):
+            response = client.post("/predict", json={"candidate": {"cv_pt": "Desenvolvedor Python"}, "jobs": jobs},
+                                   headers={"X-Request-Timeout-Ms": "60"})
+        
+        assert response.status_code == 504
+        assert mock_model_manager_api.generate_embeddings.call_count < 5
+    
+    def test_predict_endpoint_scores_off_event_loop(self, client, mock_model_manager_api):
+        """Testa que encode e scores dos lotes rodam fora do event loop"""
+        def on_event_loop():
+            try:
+                asyncio.get_running_loop()
+                return True
+            except RuntimeError:
+                return False
+        calls = []
+        def embeddings(texts):
+            calls.append(on_event_loop())
+            return np.random.rand(len(texts), 384)
+        def predict_matches(candidate_embedding, job_embeddings):
+            calls.append(on_event_loop())
+            return np.full(len(job_embeddings), 0.5)
+        mock_model_manager_api.generate_embeddings.side_effect = embeddings
+        mock_model_manager_api.predict_matches.side_effect = predict_matches
+        jobs = [{"titulo_vaga": f"Vaga {i}"} for i in range(4)] + [{"embedding": [0.1] * 384}]
+        
+        with patch('app.main.PREDICT_CHUNK_SIZE', 2), patch('app.main.pair_score_cache', PairScoreCache(0)):
+            response = client.post("/predict", json={"candidate": {"cv_pt": "Desenvolvedor Python"}, "jobs": jobs})
+        
+        assert response.status_code == 200
+        assert calls == [False] * 5  # 2 lotes de texto + as vagas por embedding
+    
+    def test_predict_endpoint_client_disconnected(self, client, mock_model_manager_api):
+        """Testa que o trabalho é abandonado quando o cliente desconecta"""
+        with patch('app.main.Request.is_disconnected', AsyncMock(return_value=True)), \
+             patch('app.main.pair_score_cache', PairScoreCache(0)):
+            response = client.post("/predict", json={
+                "candidate": {"cv_pt": "Desenvolvedor Python"}, "jobs": [{"titulo_vaga": "Vaga Python"}]
+            })
+        
+        assert response.status_code == 499
+        mock_model_manager_api.generate_embeddings.assert_not_called()
+    
+    def test_predict_endpoint_admission_control(self, client, mock_model_manager_api):
+        """Testa recusa na entrada quando o custo não cabe na capacidade"""
+        request_data = {"candidate": {"cv_pt": "x" * 50}, "jobs": [{"titulo_vaga": "y" * 50}]}
+        
+        with patch('app.main.admission', AdmissionController(80)):
+            assert client.post("/predict", json=request_data).status_code == 413
+        
+        busy = AdmissionController(200)
+        busy.try_acquire(150)
+        with patch('app.main.admission', busy):
+            response = client.post("/predict", json=request_data)
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+            
+            busy.release(150)
+            assert client.post("/predict", json=request_data).status_code == 200
+            assert busy.in_flight == 0
+        
+        mock_model_manager_api.generate_embeddings.assert_called_once()
+    
+    def test_predict_rejection_is_captured(self, client, mock_model_manager_api):
+        """Testa que recusas da admissão entram na captura, com os headers da requisição"""
+        capture = Mock()
+        capture.should_capture.return_value = True
+        request_data = {"candidate": {"cv_pt": "x" * 50}, "jobs": [{"titulo_vaga": "y" * 50}]}
+        
+        with patch('app.main.admission', AdmissionController(80)), patch('app.main.traffic_capture', capture):
+            response = client.post("/predict", json=request_data,
+                                   headers={"Accept": "application/x-msgpack", "X-Request-Timeout-Ms": "250"})
+        
+        assert response.status_code == 413
+        kwargs = capture.record.call_args.kwargs
+        assert kwargs["status_code"] == 413
+        assert kwargs["headers"] == {"accept": "application/x-msgpack", "x-request-timeout-ms": "250"}
+
+    def test_catalog_match_endpoint(self, client, mock_model_manager_api):
+        """Testa top-k do catálogo com ids e previews das vagas"""
+        embeddings = np.random.rand(50, 384).astype(np.float32)
+        catalog = InProcessCatalog(ShardScorer(embeddings, model=JobCandidateMatchingNet(embedding_dim=384).eval()))
+        mock_model_manager_api.job_texts = TextStore.from_texts([str(100 + i) for i in range(50)],
+                                                                [f"vaga {i}" for i in range(50)])
+        
+        with patch('app.main.job_catalog', catalog):
+            response = client.post("/catalog/match", json={
+                "candidate": {"cv_pt": "Desenvolvedor Python"}, "top_k": 5, "threshold": 0.0
+            })
+        
+        assert response.status_code == 200
+        assert response.headers["X-Partial-Result"] == "false"
+        recommendations = response.json()["recommendations"]
+        assert len(recommendations) == 5
+        assert all(r["job_id"] == str(100 + r["job_index"]) for r in recommendations)
+        assert recommendations[0]["job_preview"] == f"vaga {recommendations[0]['job_index']}"
+    
+    def test_catalog_match_partial_result(self, client, mock_model_manager_api):
+        """Testa a sinalização de resultado parcial quando um shard falha"""
+        catalog = Mock()
+        catalog.top_k.return_value = CatalogResult(
+            np.array([3]), np.array([0.9], dtype=np.float32), np.array([0.8], dtype=np.float32), 2, [1]
+        )
+        mock_model_manager_api.job_texts = TextStore.from_texts([str(i) for i in range(10)], ["vaga"] * 10)
+        
+        with patch('app.main.job_catalog', catalog):
+            response = client.post("/catalog/match", json={"candidate": {"cv_pt": "Desenvolvedor Python"}})
+        
+        assert response.status_code == 200
+        assert response.headers["X-Partial-Result"] == "true"
+        assert response.headers["X-Missing-Shards"] == "1"
+        assert response.json()["recommendations"][0]["job_id"] == "3"
+    
+    def test_catalog_match_hybrid(self, client, mock_model_manager_api):
+        """Testa o pré-filtro BM25: só vagas com os termos do candidato são pontuadas"""
+        texts = [f"vaga {'python' if i % 5 == 0 else 'java'} numero{i}" for i in range(50)]
+        mock_model_manager_api.extract_candidate_text.return_value = "desenvolvedor python"
+        mock_model_manager_api.job_embeddings = np.random.rand(50, 384).astype(np.float32)
+        mock_model_manager_api.job_texts = TextStore.from_texts([str(i) for i in range(50)], texts)
+        mock_model_manager_api.job_lexical = LexicalIndex.build(texts)
+        
+        with patch('app.main.job_catalog', None):
+            response = client.post("/catalog/match", json={
+                "candidate": {"cv_pt": "Desenvolvedor Python"}, "top_k": 20, "threshold": 0.0,
+                "retrieval": "hybrid", "lexical_weight": 0.5
+            })
+        
+        assert response.status_code == 200
+        assert response.headers["X-Retrieval"] == "hybrid"
+        recommendations = response.json()["recommendations"]
+        assert sorted(r["job_index"] for r in recommendations) == list(range(0, 50, 5))
+        assert len(mock_model_manager_api.predict_matches.call_args[0][1]) == 10
+    
+    def test_catalog_match_hybrid_falls_back_to_dense(self, client, mock_model_manager_api):
+        mock_model_manager_api.job_lexical = LexicalIndex.build(["vaga java", "vaga sap"])
+        mock_model_manager_api.job_texts = TextStore.from_texts(["1", "2"], ["vaga java", "vaga sap"])
+        catalog = Mock()
+        catalog.top_k.return_value = CatalogResult(
+            np.array([1]), np.array([0.9], dtype=np.float32), np.array([0.8], dtype=np.float32), 1, []
+        )
+        
+        with patch('app.main.job_catalog', catalog):
+            response = client.post("/catalog/match", json={
+                "candidate": {"cv_pt": "Desenvolvedor Python"}, "retrieval": "hybrid"
+            })
+        
+        assert response.status_code == 200
+        assert response.headers["X-Retrieval"] == "dense"
+        catalog.top_k.assert_called_once()
+    
+    def test_catalog_match_hybrid_without_index(self, client, mock_model_manager_api):
+        mock_model_manager_api.job_lexical = None
+        
+        response = client.post("/catalog/match", json={
+            "candidate": {"cv_pt": "Desenvolvedor Python"}, "retrieval": "hybrid"
+        })
+        
+        assert response.status_code == 503
+
+    def test_drift_monitor_defers_network(self, mock_model_manager_api):
+        """Testa que criar o monitor (no master pré-carregado) não roda a rede neural"""
+        mock_model_manager_api.candidate_embeddings = np.random.rand(30, 384).astype(np.float32)
+        mock_model_manager_api.job_embeddings = np.random.rand(20, 384).astype(np.float32)
+        mock_model_manager_api.predict_matches.side_effect = lambda c, jobs: np.full(len(jobs), 0.5)
+        
+        with patch('app.main.DRIFT_MONITOR_ENABLED', True):
+            monitor = create_drift_monitor()
+        
+        mock_model_manager_api.predict_matches.assert_not_called()
+        monitor.load_score_references()
+        assert "ml_score" in monitor.score_references
+    
+    def test_projection_ignored_after_reencode(self, mock_model_manager_api):
+        """Testa que job_embeddings.npy regravado com as mesmas linhas não usa a projeção antiga"""
+        jobs = np.random.rand(20, 384).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "projection")
+            write_projection(path, PcaProjection.fit([jobs], dim=4), {"job": jobs})
+            with patch('app.main.PROJECTION_DIR', path), patch('app.main.CATALOG_SHORTLIST', 5):
+                mock_model_manager_api.job_embeddings = jobs
+                current = open_job_projection()
+                mock_model_manager_api.job_embeddings = np.random.rand(20, 384).astype(np.float32)
+                reencoded = open_job_projection()
+        
+        assert current is not None and len(current) == 20
+        assert reencoded is None
+    
+    def test_stored_recommendations_endpoint(self, client, mock_model_manager_api):
+        """Testa a leitura da tabela materializada com ids, previews e idade"""
+        indices = np.array([[2, 0, -1], [1, 2, 0]], dtype=np.int32)
+        scores = np.array([[0.9, 0.7, np.nan], [0.8, 0.6, 0.5]], dtype=np.float32)
+        candidate_texts = TextStore.from_texts(["c1", "c2"], ["cv 1", "cv 2"])
+        job_texts = TextStore.from_texts(["v1", "v2", "v3"], ["vaga 1", "vaga 2", "vaga 3"])
+        ids = {"candidate": candidate_texts.ids_fingerprint(), "job": job_texts.ids_fingerprint()}
+        table = RecommendationTable(
+            {"model_version": "abc123", "built_at": time.time() - 120, "ids": ids},
+            {"candidate_jobs": TopKTable(indices, scores, scores), "job_candidates": TopKTable(indices, scores, scores)}
+        )
+        mock_model_manager_api.model_version = "abc123"
+        mock_model_manager_api.candidate_texts = candidate_texts
+        mock_model_manager_api.job_texts = job_texts
+        
+        with patch('app.main.recommendation_refresher', Mock(table=table)):
+            response = client.get("/recommendations/candidates/c1")
+            by_job = client.get("/recommendations/jobs/v2", params={"top_k": 1})
+            unknown = client.get("/recommendations/candidates/c9")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["id"] for r in data["recommendations"]] == ["v3", "v1"]
+        assert data["recommendations"][0]["preview"] == "vaga 3"
+        assert data["table_age_s"] >= 120
+        assert data["stale"] is False
+        assert [r["id"] for r in by_job.json()["recommendations"]] == ["c2"]
+        assert unknown.status_code == 404
+    
+    def test_stored_recommendations_stale_ids(self, client, mock_model_manager_api):
+        """Testa que uma tabela gerada com outros ids por linha é marcada como desatualizada"""
+        indices = np.array([[1, 0]], dtype=np.int32)
+        scores = np.array([[0.9, 0.7]], dtype=np.float32)
+        mock_model_manager_api.model_version = "abc123"
+        mock_model_manager_api.candidate_texts = TextStore.from_texts(["c1"], ["cv 1"])
+        mock_model_manager_api.job_texts = TextStore.from_texts(["v1", "v2"], ["vaga 1", "vaga 2"])
+        # Tabela atualizada depois que uma vaga foi inserida antes das carregadas no worker
+        ids = {"candidate": mock_model_manager_api.candidate_texts.ids_fingerprint(),
+               "job": TextStore.from_texts(["v0", "v1", "v2"], ["vaga 0", "vaga 1", "vaga 2"]).ids_fingerprint()}
+        table = RecommendationTable(
+            {"model_version": "abc123", "built_at": time.time(), "ids": ids},
+            {"candidate_jobs": TopKTable(indices, scores, scores), "job_candidates": TopKTable(indices, scores, scores)}
+        )
+        
+        with patch('app.main.recommendation_refresher', Mock(table=table)):
+            response = client.get("/recommendations/candidates/c1")
+        
+        assert response.status_code == 200
+        assert response.json()["stale"] is True
+    
+    def test_stored_recommendations_without_table(self, client, mock_model_manager_api):
+        with patch('app.main.recommendation_refresher', Mock(table=None)):
+            response = client.get("/recommendations/candidates/c1")
+        
+        assert response.status_code == 503
+    
+    def test_profile_endpoint_disabled_without_token(self, client):
+        """Testa que o profiling fica desabilitado sem ADMIN_TOKEN"""
+        with patch('app.main.ADMIN_TOKEN', ""):
+            response = client.post("/admin/profile?seconds=0.1")
+
+        assert response.status_code == 404
+
+    def test_profile_endpoint_invalid_token(self, client):
+        """Testa rejeição de token administrativo inválido"""
+        with patch('app.main.ADMIN_TOKEN', "segredo"):
+            response = client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Token": "errado"})
+
+        assert response.status_code == 403
+
+    def test_profile_endpoint_returns_folded_stacks(self, client):
+        """Testa captura de profile com token válido"""
+        with patch('app.main.ADMIN_TOKEN', "segredo"):
+            response = client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Token": "segredo"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert int(response.headers["X-Profile-Samples"]) > 0
+
 class TestDataModels:
     """Testes para os modelos de dados Pydantic"""
     
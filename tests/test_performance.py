@@ -3,12 +3,21 @@ Testes de performance e carga para a API
 """
 import pytest
 import time
+import json
 import concurrent.futures
 from fastapi.testclient import TestClient
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from unittest.mock import patch
 import numpy as np
+import torch
 
-from app.main import app
+from app.main import app, PredictionResponse, JobMatch
+from app.serialization import prediction_response, rank_matches, job_preview, decode_scores, MEDIA_JSON, MEDIA_SCORES
+from app.lexical import LexicalIndex, benchmark
+from app.network import JobCandidateMatchingNet
+from app.sharding import ShardScorer
+from app.projection import PcaProjection, ProjectedCatalog, recall_report
 
 class TestPerformance:
     """Testes de performance"""
@@ -213,5 +222,136 @@ class TestEdgeCases:
         response = client.post("/predict", json=request_data)
         assert response.status_code == 200
 
+class TestSerializationPerformance:
+    """Benchmarks do caminho rápido de serialização contra o JSON via Pydantic"""
+    
+    N_RESULTS = 5000
+    
+    @pytest.fixture
+    def results(self):
+        rng = np.random.default_rng(0)
+        ml_scores = rng.random(self.N_RESULTS)
+        similarity_scores = rng.random(self.N_RESULTS)
+        job_texts = [f"vaga {i} desenvolvedor python" for i in range(self.N_RESULTS)]
+        return similarity_scores, ml_scores, job_texts
+    
+    def pydantic_path(self, similarity_scores, ml_scores, job_texts):
+        """Caminho anterior: um JobMatch por vaga + PredictionResponse + jsonable_encoder"""
+        recommendations = [
+            JobMatch(job_index=i, similarity_score=float(s), ml_score=float(m), job_preview=job_preview(t))
+            for i, (s, m, t) in enumerate(zip(similarity_scores, ml_scores, job_texts))
+        ]
+        recommendations.sort(key=lambda x: x.ml_score, reverse=True)
+        response = PredictionResponse(candidate_processed_text="candidato", recommendations=recommendations,
+                                      processing_time_ms=1.0, timestamp="2024-01-01T00:00:00")
+        return JSONResponse(jsonable_encoder(response)).body
+    
+    def fast_path(self, media_type, similarity_scores, ml_scores, job_texts):
+        selected = rank_matches(ml_scores, 0.0, len(ml_scores))
+        return prediction_response(
+            media_type, "candidato", selected, similarity_scores[selected], ml_scores[selected],
+            [job_preview(job_texts[i]) for i in selected], 1.0, "2024-01-01T00:00:00"
+        ).body
+    
+    def best_time(self, fn, repeat=5):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+    
+    def test_fast_json_matches_pydantic(self, results):
+        """Testa que o caminho rápido gera o mesmo conteúdo JSON"""
+        expected = json.loads(self.pydantic_path(*results))
+        actual = json.loads(self.fast_path(MEDIA_JSON, *results))
+        
+        assert actual == expected
+    
+    def test_fast_paths_faster_than_pydantic(self, results):
+        """Compara o tempo de serialização de 5000 resultados"""
+        pydantic_time = self.best_time(lambda: self.pydantic_path(*results))
+        json_time = self.best_time(lambda: self.fast_path(MEDIA_JSON, *results))
+        binary_time = self.best_time(lambda: self.fast_path(MEDIA_SCORES, *results))
+        
+        print(f"\npydantic: {pydantic_time * 1000:.1f}ms  json: {json_time * 1000:.1f}ms  binário: {binary_time * 1000:.1f}ms")
+        assert json_time < pydantic_time
+        assert binary_time < json_time
+    
+    def test_binary_is_compact(self, results):
+        """Testa o tamanho do formato binário (12 bytes por resultado)"""
+        body = self.fast_path(MEDIA_SCORES, *results)
+        
+        assert len(body) == 12 * self.N_RESULTS
+        assert len(body) < len(self.pydantic_path(*results)) / 10
+        np.testing.assert_allclose(np.sort(decode_scores(body)["ml_score"])[::-1], np.sort(results[1])[::-1], rtol=1e-6)
+
+class TestLexicalPrefilterPerformance:
+    """Benchmark da busca híbrida (BM25 + rerank) contra o score denso do catálogo inteiro"""
+    
+    N_JOBS = 20000
+    SKILLS = ["python", "java", "sap", "sql", "react", "django", "spring", "aws", "excel", "linux",
+              "kotlin", "golang", "scala", "oracle", "salesforce", "tableau", "docker", "kafka", "php", "ruby"]
+    
+    @pytest.fixture(scope="class")
+    def catalog(self):
+        rng = np.random.default_rng(0)
+        words = [f"termo{i}" for i in range(2000)]
+        texts = [" ".join(rng.choice(words, 40).tolist() + rng.choice(self.SKILLS, 2).tolist())
+                 for _ in range(self.N_JOBS)]
+        embeddings = rng.normal(size=(self.N_JOBS, 384)).astype(np.float32)
+        torch.manual_seed(0)
+        scorer = ShardScorer(embeddings, model=JobCandidateMatchingNet(embedding_dim=384).eval())
+        queries = [(f"desenvolvedor {skill} sênior", rng.normal(size=384).astype(np.float32))
+                   for skill in self.SKILLS]
+        return LexicalIndex.build(texts), scorer, queries
+    
+    def test_hybrid_faster_than_dense(self, catalog):
+        index, scorer, queries = catalog
+        
+        report = benchmark(index, queries, scorer, top_k=10, candidates=500)
+        
+        print(f"\ndenso: p50 {report['dense']['p50_ms']:.1f}ms  híbrido: p50 {report['hybrid']['p50_ms']:.1f}ms"
+              f"  ({report['candidates']} de {report['catalog_size']} vagas)")
+        assert report["queries"] == len(queries)
+        assert report["hybrid"]["p50_ms"] < report["dense"]["p50_ms"]
+
+class TestProjectionShortlistPerformance:
+    """Benchmark do primeiro passo na projeção PCA contra o score completo do catálogo"""
+    
+    N_JOBS = 20000
+    
+    @pytest.fixture(scope="class")
+    def catalog(self):
+        rng = np.random.default_rng(0)
+        # Embeddings reais concentram a variância em poucas direções
+        basis = rng.normal(size=(48, 384))
+        embeddings = (rng.normal(size=(self.N_JOBS, 48)) @ basis + 0.3 * rng.normal(size=(self.N_JOBS, 384)) + 2.0)
+        embeddings = embeddings.astype(np.float32)
+        projected = ProjectedCatalog.build(PcaProjection.fit([embeddings], dim=64), embeddings)
+        torch.manual_seed(0)
+        model = JobCandidateMatchingNet(embedding_dim=384).eval()
+        queries = embeddings[rng.choice(self.N_JOBS, 20, replace=False)] + 0.1 * rng.normal(size=(20, 384)).astype(np.float32)
+        return (ShardScorer(embeddings, model=model), ShardScorer(embeddings, model=model, projection=projected, shortlist=1000),
+                projected, embeddings, queries)
+    
+    def test_shortlist_faster_than_full_scan(self, catalog):
+        full, shortlisted, projected, embeddings, queries = catalog
+        
+        def p50(scorer, score):
+            times = []
+            for query in queries:
+                start = time.perf_counter()
+                scorer.top_k(query, 10, score=score)
+                times.append((time.perf_counter() - start) * 1000)
+            return float(np.percentile(times, 50))
+        
+        report = recall_report(projected, embeddings, queries, k=10, shortlist=1000)
+        for score in ("similarity", "ml"):
+            print(f"\n{score}: completo p50 {p50(full, score):.1f}ms  projeção p50 {p50(shortlisted, score):.1f}ms")
+        print(f"recall@10 {report['recall_similarity']:.3f} (dim {report['dim']})")
+        assert report["recall_similarity"] > 0.9
+        assert p50(shortlisted, "ml") < p50(full, "ml")
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Testes para o profiling sob demanda
+"""
+import os
+import sys
+import time
+import threading
+import tempfile
+import pytest
+from collections import Counter
+
+from app.profiling import SamplingProfiler, fold_stack, render_folded, save_profile
+
+def busy_loop(stop_event):
+    """Função que mantém a CPU ocupada para aparecer nas amostras"""
+    while not stop_event.is_set():
+        sum(i * i for i in range(1000))
+
+class TestSamplingProfiler:
+    """Testes para o profiler por amostragem"""
+
+    def test_fold_stack_root_first(self):
+        """Testa que a pilha folded vai da raiz para a folha"""
+        stack = fold_stack(sys._getframe())
+        frames = stack.split(";")
+
+        assert "test_fold_stack_root_first" in frames[-1]
+        assert len(frames) > 1
+
+    def test_render_folded_format(self):
+        """Testa formato 'pilha contagem' por linha"""
+        output = render_folded(Counter({"main;a;b": 3, "main;a": 1, "main;c": 0}))
+        lines = output.strip().split("\n")
+
+        assert lines == ["main;a 1", "main;a;b 3"]
+        assert render_folded(Counter()) == ""
+
+    def test_capture_busy_thread(self):
+        """Testa que a thread ocupada aparece no profile"""
+        profiler = SamplingProfiler(interval=0.001)
+        stop_event = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop_event,), name="busy-worker")
+        worker.start()
+
+        try:
+            profiler.start()
+            assert profiler.active
+            time.sleep(0.2)
+            result = profiler.stop()
+        finally:
+            stop_event.set()
+            worker.join()
+
+        assert not profiler.active
+        assert result["samples"] > 0
+        assert "busy-worker;" in result["python"]
+        assert "busy_loop" in result["python"]
+        assert "sampling-profiler" not in result["python"]
+
+    def test_start_twice_fails(self):
+        """Testa que apenas um profiling roda por vez"""
+        profiler = SamplingProfiler(interval=0.01)
+        profiler.start()
+        try:
+            with pytest.raises(RuntimeError):
+                profiler.start()
+        finally:
+            profiler.stop()
+
+        with pytest.raises(RuntimeError):
+            profiler.stop()
+
+    def test_torch_section_disabled_is_noop(self):
+        """Testa que sem profiling ativo a seção do torch não coleta nada"""
+        profiler = SamplingProfiler()
+
+        with profiler.torch_section("encode"):
+            pass
+
+        assert not profiler.torch_enabled
+
+    def test_torch_section_collects_ops(self):
+        """Testa coleta do profiler do torch em volta de uma chamada de modelo"""
+        torch = pytest.importorskip("torch")
+        profiler = SamplingProfiler(interval=0.01)
+        model = torch.nn.Linear(8, 2)
+
+        profiler.start(torch_profile=True)
+        try:
+            with profiler.torch_section("predict_match"):
+                model(torch.randn(4, 8))
+        finally:
+            result = profiler.stop()
+
+        assert result["torch"].startswith("predict_match;")
+        assert "aten::" in result["torch"]
+
+    def test_save_profile(self):
+        """Testa persistência do profile em disco"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = save_profile("main;a 1\n", os.path.join(tmp_dir, "profiles"))
+
+            assert path.endswith(".folded")
+            with open(path, encoding="utf-8") as f:
+                assert f.read() == "main;a 1\n"
@@ -0,0 +1,163 @@
+"""
+Testes para a projeção PCA do primeiro passo do catálogo
+"""
+import os
+import json
+import tempfile
+import numpy as np
+import pytest
+import torch
+from unittest.mock import patch
+
+from app.network import JobCandidateMatchingNet
+from app.projection import (
+    PcaProjection, ProjectedCatalog, main, projection_matches, recall_report, write_projection
+)
+from app.sharding import ShardScorer
+
+def low_rank(rows, rank=8, dim=64, noise=0.01, seed=0):
+    """Embeddings com média comum e variância em `rank` direções (rank + 1 depois de normalizar)"""
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(rank, dim))
+    center = rng.normal(size=dim)
+    return (center + rng.normal(size=(rows, rank)) @ basis + noise * rng.normal(size=(rows, dim))).astype(np.float32)
+
+class TestPcaProjection:
+    """Testes para o ajuste e o score aproximado"""
+
+    def test_fit_captures_low_rank_variance(self):
+        projection = PcaProjection.fit([low_rank(300), low_rank(200, seed=0)], dim=8)
+
+        assert projection.components.shape == (8, 64)
+        assert projection.explained_variance_ratio.sum() > 0.98
+        np.testing.assert_allclose(projection.components @ projection.components.T, np.eye(8), atol=1e-5)
+
+    def test_fit_in_blocks_matches_single_block(self):
+        embeddings = low_rank(100)
+
+        single = PcaProjection.fit([embeddings], dim=4, block_rows=1000)
+        blocked = PcaProjection.fit([embeddings[:30], embeddings[30:]], dim=4, block_rows=7)
+
+        np.testing.assert_allclose(single.mean, blocked.mean, atol=1e-6)
+        np.testing.assert_allclose(np.abs(single.components @ blocked.components.T), np.eye(4), atol=1e-4)
+
+    def test_invalid_dim(self):
+        with pytest.raises(ValueError, match="dim"):
+            PcaProjection.fit([low_rank(10)], dim=65)
+
+    def test_scores_preserve_cosine_order(self):
+        """Testa que o score aproximado ordena como a similaridade coseno em dados de posto baixo"""
+        jobs = low_rank(500)
+        catalog = ProjectedCatalog.build(PcaProjection.fit([jobs], dim=9), jobs)
+        query = low_rank(1, seed=1)[0]
+
+        unit = jobs / np.linalg.norm(jobs, axis=1, keepdims=True)
+        exact = unit @ (query / np.linalg.norm(query))
+        approximate = catalog.scores(query)
+
+        # Difere da coseno só por uma constante da consulta
+        np.testing.assert_allclose(approximate - approximate.mean(), exact - exact.mean(), atol=5e-3)
+        assert np.all(np.diff(catalog.shortlist(query, 20)) > 0)
+
+    def test_write_and_open(self):
+        jobs, candidates = low_rank(50), low_rank(30, seed=2)
+        projection = PcaProjection.fit([jobs, candidates], dim=4)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "projection")
+
+            write_projection(path, projection, {"job": jobs, "candidate": candidates}, {"recall_similarity": 1.0})
+            catalog = ProjectedCatalog.open(path, "candidate")
+            with open(os.path.join(path, "manifest.json")) as f:
+                manifest = json.load(f)
+
+            assert len(catalog) == 30 and catalog.vectors.shape == (30, 4)
+            assert manifest["dim"] == 4 and manifest["rows"] == {"job": 50, "candidate": 30}
+            np.testing.assert_allclose(catalog.scores(jobs[0]), ProjectedCatalog.build(projection, candidates).scores(jobs[0]))
+
+    def test_projection_matches_embeddings(self):
+        """Testa que embeddings regravados com o mesmo número de linhas não usam a projeção antiga"""
+        jobs, candidates = low_rank(50), low_rank(30, seed=2)
+        reencoded = jobs.copy()
+        reencoded[7] = low_rank(1, seed=3)[0]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "projection")
+            write_projection(path, PcaProjection.fit([jobs, candidates], dim=4), {"job": jobs, "candidate": candidates})
+
+            assert projection_matches(path, "job", jobs) and projection_matches(path, "candidate", candidates)
+            assert not projection_matches(path, "job", reencoded)
+            assert not projection_matches(path, "job", jobs[:40])
+            assert not projection_matches(os.path.join(tmp_dir, "ausente"), "job", jobs)
+
+    def test_shard_ignores_projection_of_other_embeddings(self):
+        jobs = low_rank(40, dim=384)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "projection")
+            embeddings_path = os.path.join(tmp_dir, "job_embeddings.npy")
+            write_projection(path, PcaProjection.fit([jobs], dim=4), {"job": jobs})
+            np.save(embeddings_path, jobs)
+            matching = ShardScorer.from_file(embeddings_path, 1, 2, projection_path=path, shortlist=5)
+            np.save(embeddings_path, low_rank(40, dim=384, seed=4))
+
+            stale = ShardScorer.from_file(embeddings_path, 1, 2, projection_path=path, shortlist=5)
+
+            assert len(matching.projection) == 20
+            assert stale.projection is None
+
+    def test_recall_report(self):
+        jobs = low_rank(400)
+        catalog = ProjectedCatalog.build(PcaProjection.fit([jobs], dim=8), jobs)
+
+        report = recall_report(catalog, jobs, low_rank(10, seed=3), k=5, shortlist=50)
+
+        assert report["recall_similarity"] == pytest.approx(1.0)
+        assert report["scan_ratio"] == pytest.approx(8 / 64)
+        assert "recall_ml" not in report
+
+    def test_cli_writes_projection_and_report(self, capsys):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            np.save(os.path.join(tmp_dir, "job_embeddings.npy"), low_rank(200))
+            np.save(os.path.join(tmp_dir, "candidate_embeddings.npy"), low_rank(100, seed=4))
+
+            assert main(["--model-dir", tmp_dir, "--dim", "8", "--shortlist", "40", "--queries", "20"]) == 0
+            with open(os.path.join(tmp_dir, "projection", "manifest.json")) as f:
+                manifest = json.load(f)
+
+            assert manifest["recall"]["recall_similarity"] > 0.9
+            assert '"dim": 8' in capsys.readouterr().out
+
+class TestProjectedShardScorer:
+    """Testes para a shortlist do catálogo reduzido no ShardScorer"""
+
+    @pytest.fixture
+    def scorer(self):
+        torch.manual_seed(0)
+        jobs = low_rank(300, dim=384)
+        catalog = ProjectedCatalog.build(PcaProjection.fit([jobs], dim=9), jobs)
+        return ShardScorer(jobs, model=JobCandidateMatchingNet(embedding_dim=384).eval(),
+                           projection=catalog, shortlist=30)
+
+    def test_only_shortlist_is_scored(self, scorer):
+        query = low_rank(1, dim=384, seed=5)[0]
+
+        with patch.object(scorer, "ml_scores", wraps=scorer.ml_scores) as ml_scores:
+            result = scorer.top_k(query, k=5, score="ml")
+
+        assert len(ml_scores.call_args[0][1]) == 30
+        assert set(result["indices"]) <= set(scorer.shortlist_rows(query))
+
+    def test_similarity_matches_full_scan(self, scorer):
+        query = low_rank(1, dim=384, seed=6)[0]
+        full = ShardScorer(scorer.embeddings)
+
+        result = scorer.top_k(query, k=10, score="similarity")
+        expected = full.top_k(query, k=10, score="similarity")
+
+        np.testing.assert_array_equal(result["indices"], expected["indices"])
+        np.testing.assert_allclose(result["similarity_scores"], expected["similarity_scores"], rtol=1e-6)
+
+    def test_projection_rows_must_match(self):
+        jobs = low_rank(20)
+        catalog = ProjectedCatalog.build(PcaProjection.fit([jobs], dim=4), jobs)
+
+        with pytest.raises(ValueError, match="projeção"):
+            ShardScorer(jobs[:10], projection=catalog, shortlist=5)
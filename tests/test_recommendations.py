@@ -0,0 +1,224 @@
+"""
+Testes para a tabela materializada de recomendações
+"""
+import os
+import time
+import fcntl
+import tempfile
+import numpy as np
+import pytest
+import torch
+
+from app.network import JobCandidateMatchingNet
+from app.recommendations import (
+    PairScorer, RecommendationRefresher, RecommendationTable, compute_top_k, refresh_table
+)
+
+DIM = 16
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return JobCandidateMatchingNet(embedding_dim=DIM, hidden_dim=32).eval()
+
+@pytest.fixture
+def catalog():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(40, DIM)).astype(np.float32), rng.normal(size=(30, DIM)).astype(np.float32)
+
+def brute_force(model, candidate, jobs, k):
+    with torch.no_grad():
+        scores = model(torch.from_numpy(np.tile(candidate, (len(jobs), 1))), torch.from_numpy(jobs)).numpy()[:, 0]
+    return np.argsort(-scores, kind="stable")[:k]
+
+class TestComputeTopK:
+    """Testes para o cálculo do top-k por linha"""
+
+    def test_exact_matches_brute_force(self, model, catalog):
+        candidates, jobs = catalog
+
+        table = compute_top_k(candidates, jobs, PairScorer(model), "candidate", k=5)
+
+        for row in (0, 17, 39):
+            np.testing.assert_array_equal(table.indices[row], brute_force(model, candidates[row], jobs, 5))
+        assert (np.diff(table.ml_scores, axis=1) <= 0).all()
+
+    def test_job_direction_scores_candidate_first(self, model, catalog):
+        """Testa que a rede recebe (candidato, vaga) também no top-k de candidatos por vaga"""
+        candidates, jobs = catalog
+
+        table = compute_top_k(jobs, candidates, PairScorer(model), "job", k=3)
+
+        with torch.no_grad():
+            expected = model(torch.from_numpy(candidates[table.indices[0]]),
+                             torch.from_numpy(np.tile(jobs[0], (3, 1)))).numpy()[:, 0]
+        np.testing.assert_allclose(table.ml_scores[0], expected, rtol=1e-5)
+
+    def test_shortlist_limits_to_most_similar(self, model, catalog):
+        candidates, jobs = catalog
+
+        table = compute_top_k(candidates, jobs, PairScorer(model), "candidate", k=3, shortlist=8)
+
+        unit = jobs / np.linalg.norm(jobs, axis=1, keepdims=True)
+        similar = set(np.argsort(-(unit @ candidates[0]))[:8])
+        assert set(table.indices[0]) <= similar
+
+class TestRefreshTable:
+    """Testes para a geração e a atualização incremental"""
+
+    def test_build_and_lookup(self, model, catalog):
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+
+            result = refresh_table(path, candidates, jobs, model, k=5, shortlist=0, block_rows=8)
+            table = RecommendationTable.open(path)
+
+            assert result["status"] == "rebuilt" and result["reason"] == "missing"
+            entries = table.lookup("candidate_jobs", 3, top_k=2)
+            np.testing.assert_array_equal(entries.indices, brute_force(model, candidates[3], jobs, 2))
+            assert table.lookup("job_candidates", 29).indices.shape == (5,)
+            assert table.lookup("candidate_jobs", 40) is None
+            assert table.age(now=table.built_at + 30) == pytest.approx(30)
+
+    def test_unchanged_catalog_is_fresh(self, model, catalog):
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresh_table(path, candidates, jobs, model, k=5, block_rows=8)
+
+            assert refresh_table(path, candidates, jobs, model, k=5, block_rows=8)["status"] == "fresh"
+
+    def test_changed_ids_recorded_in_manifest(self, model, catalog):
+        """Testa que ids novos com os mesmos embeddings regravam o manifest em vez de responder fresh"""
+        candidates, jobs = catalog
+        ids = {"candidate": "c" * 40, "job": "v" * 40}
+        new_ids = {"candidate": "c" * 40, "job": "w" * 40}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresh_table(path, candidates, jobs, model, k=5, block_rows=8, ids=ids)
+            assert RecommendationTable.open(path).matches_ids(ids)
+
+            result = refresh_table(path, candidates, jobs, model, k=5, block_rows=8, ids=new_ids)
+            table = RecommendationTable.open(path)
+
+            assert result["status"] == "updated"
+            assert result["recomputed_rows"] == {"candidate_jobs": 0, "job_candidates": 0}
+            assert table.matches_ids(new_ids) and not table.matches_ids(ids)
+
+    def test_incremental_update_matches_rebuild(self, model, catalog):
+        """Testa que vagas novas e candidatos alterados dão o mesmo resultado da reconstrução"""
+        candidates, jobs = catalog
+        rng = np.random.default_rng(1)
+        new_jobs = np.concatenate([jobs, rng.normal(size=(5, DIM)).astype(np.float32)])
+        new_candidates = candidates.copy()
+        new_candidates[2] = rng.normal(size=DIM)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresh_table(path, candidates, jobs, model, k=5, shortlist=0, block_rows=8)
+
+            result = refresh_table(path, new_candidates, new_jobs, model, k=5, shortlist=0, block_rows=8)
+            updated = RecommendationTable.open(path)
+            rebuilt_path = os.path.join(tmp_dir, "rebuilt")
+            refresh_table(rebuilt_path, new_candidates, new_jobs, model, k=5, shortlist=0, block_rows=8)
+            rebuilt = RecommendationTable.open(rebuilt_path)
+
+            assert result["status"] == "updated"
+            assert result["recomputed_rows"]["candidate_jobs"] < len(new_candidates)
+            for direction in ("candidate_jobs", "job_candidates"):
+                np.testing.assert_array_equal(updated.tables[direction].indices, rebuilt.tables[direction].indices)
+                np.testing.assert_allclose(updated.tables[direction].ml_scores, rebuilt.tables[direction].ml_scores)
+
+    def test_incremental_update_with_shortlist_matches_rebuild(self, model, catalog):
+        """Testa que vagas e candidatos novos disputam a shortlist global como na reconstrução"""
+        candidates, jobs = catalog
+        rng = np.random.default_rng(2)
+        new_jobs = np.concatenate([jobs, rng.normal(size=(12, DIM)).astype(np.float32)])
+        new_candidates = np.concatenate([candidates, rng.normal(size=(9, DIM)).astype(np.float32)])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresh_table(path, candidates, jobs, model, k=5, shortlist=6, block_rows=8)
+
+            result = refresh_table(path, new_candidates, new_jobs, model, k=5, shortlist=6, block_rows=8)
+            updated = RecommendationTable.open(path)
+            rebuilt_path = os.path.join(tmp_dir, "rebuilt")
+            refresh_table(rebuilt_path, new_candidates, new_jobs, model, k=5, shortlist=6, block_rows=8)
+            rebuilt = RecommendationTable.open(rebuilt_path)
+
+            assert result["status"] == "updated"
+            assert result["recomputed_rows"]["candidate_jobs"] < len(new_candidates)
+            for direction in ("candidate_jobs", "job_candidates"):
+                np.testing.assert_array_equal(updated.tables[direction].indices, rebuilt.tables[direction].indices)
+                np.testing.assert_allclose(updated.tables[direction].ml_scores, rebuilt.tables[direction].ml_scores,
+                                           rtol=1e-5)
+
+    def test_model_version_change_rebuilds(self, model, catalog):
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresh_table(path, candidates, jobs, model, k=5)
+            other_model = JobCandidateMatchingNet(embedding_dim=DIM, hidden_dim=32).eval()
+
+            result = refresh_table(path, candidates, jobs, other_model, k=5)
+
+            assert result["status"] == "rebuilt" and result["reason"] == "model_version"
+
+    def test_shrunk_catalog_rebuilds(self, model, catalog):
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresh_table(path, candidates, jobs, model, k=5)
+
+            result = refresh_table(path, candidates, jobs[:20], model, k=5)
+
+            assert result["reason"] == "shrunk"
+            assert RecommendationTable.open(path).tables["candidate_jobs"].indices.max() < 20
+
+class TestRecommendationRefresher:
+    """Testes para a atualização em background"""
+
+    def test_refresh_and_reload(self, model, catalog):
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresher = RecommendationRefresher(path, lambda: (candidates, jobs, model), k=5)
+            reader = RecommendationRefresher(path, lambda: (candidates, jobs, model), k=5)
+            assert refresher.table is None
+
+            refresher.refresh()
+
+            assert refresher.table is not None
+            assert reader.reload() and reader.table.built_at == refresher.table.built_at
+            assert not reader.reload()
+
+    def test_refresh_skipped_while_locked(self, model, catalog):
+        """Testa que só um processo recalcula a tabela por vez"""
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            refresher = RecommendationRefresher(path, lambda: (candidates, jobs, model), k=5)
+
+            with open(path + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                assert refresher.refresh() is None
+
+            assert refresher.refresh()["status"] == "rebuilt"
+
+    def test_reload_only_without_interval(self, model, catalog):
+        """Testa que sem intervalo a thread do worker só reabre a tabela gravada por outro processo"""
+        candidates, jobs = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "recommendations")
+            calls = []
+            worker = RecommendationRefresher(path, lambda: calls.append(1), k=5, interval=0, reload_interval=0.01)
+            worker.start()
+            try:
+                refresh_table(path, candidates, jobs, model, k=5)
+                deadline = time.monotonic() + 5
+                while worker.table is None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            finally:
+                worker.stop()
+
+            assert worker.table is not None
+            assert not calls
@@ -0,0 +1,45 @@
+"""
+Testes para os utilitários de runtime (CPUs e threads do torch)
+"""
+import pytest
+from unittest.mock import patch
+
+from app.runtime import available_cpus, torch_threads_per_worker, configure_torch_threads
+
+class TestRuntime:
+    """Testes para divisão de CPUs entre workers"""
+
+    def test_available_cpus_positive(self):
+        """Testa que sempre há ao menos uma CPU"""
+        assert available_cpus() >= 1
+
+    def test_available_cpus_respects_quota(self):
+        """Testa limite pela quota de CPU do container"""
+        with patch('app.runtime.os.sched_getaffinity', return_value=set(range(8))), \
+             patch('app.runtime._cgroup_cpu_quota', return_value=2.5):
+            assert available_cpus() == 2
+
+    def test_threads_divided_between_workers(self, monkeypatch):
+        """Testa divisão das threads pelo número de workers"""
+        monkeypatch.delenv("TORCH_NUM_THREADS", raising=False)
+        with patch('app.runtime.available_cpus', return_value=8):
+            assert torch_threads_per_worker(1) == 8
+            assert torch_threads_per_worker(4) == 2
+            assert torch_threads_per_worker(16) == 1
+
+    def test_threads_env_override(self, monkeypatch):
+        """Testa TORCH_NUM_THREADS sobrescrevendo o cálculo automático"""
+        monkeypatch.setenv("TORCH_NUM_THREADS", "3")
+        assert torch_threads_per_worker(4) == 3
+
+    def test_configure_torch_threads(self, monkeypatch):
+        """Testa aplicação das threads no torch"""
+        torch = pytest.importorskip("torch")
+        original = torch.get_num_threads()
+        monkeypatch.setenv("TORCH_NUM_THREADS", "1")
+
+        try:
+            assert configure_torch_threads(2) == 1
+            assert torch.get_num_threads() == 1
+        finally:
+            torch.set_num_threads(original)
@@ -0,0 +1,65 @@
+"""
+Testes para o cache de scores por par (candidato, vaga)
+"""
+from app.score_cache import PairScoreCache, text_hash
+
+class TestPairScoreCache:
+    """Testes para o cache LRU de scores"""
+
+    def test_miss_then_hit(self):
+        """Testa que pares calculados passam a vir do cache"""
+        cache = PairScoreCache(maxsize=10)
+
+        assert cache.get_many("v1", "candidato", ["vaga a", "vaga b"]) == [None, None]
+
+        cache.put_many("v1", "candidato", ["vaga a"], [0.7], [0.9])
+        results = cache.get_many("v1", "candidato", ["vaga a", "vaga b"])
+
+        assert results[0] == (0.7, 0.9)
+        assert results[1] is None
+        assert cache.hits == 1
+        assert cache.misses == 3
+        assert cache.hit_ratio == 0.25
+
+    def test_key_includes_candidate(self):
+        """Testa que o mesmo texto de vaga com outro candidato não é reaproveitado"""
+        cache = PairScoreCache(maxsize=10)
+        cache.put_many("v1", "candidato 1", ["vaga"], [0.5], [0.6])
+
+        assert cache.get_many("v1", "candidato 2", ["vaga"]) == [None]
+
+    def test_model_version_invalidates(self):
+        """Testa descarte do cache quando a versão do modelo muda"""
+        cache = PairScoreCache(maxsize=10)
+        cache.put_many("v1", "candidato", ["vaga"], [0.5], [0.6])
+
+        assert cache.get_many("v2", "candidato", ["vaga"]) == [None]
+        assert len(cache) == 0
+        assert cache.model_version == "v2"
+
+    def test_lru_eviction(self):
+        """Testa limite de tamanho descartando o par menos usado"""
+        cache = PairScoreCache(maxsize=2)
+        cache.put_many("v1", "c", ["a", "b"], [0.1, 0.2], [0.3, 0.4])
+
+        # "a" passa a ser o mais recente
+        cache.get_many("v1", "c", ["a"])
+        cache.put_many("v1", "c", ["d"], [0.5], [0.6])
+
+        assert len(cache) == 2
+        assert cache.get_many("v1", "c", ["a", "b", "d"]) == [(0.1, 0.3), None, (0.5, 0.6)]
+
+    def test_disabled_cache(self):
+        """Testa que maxsize=0 desabilita o cache"""
+        cache = PairScoreCache(maxsize=0)
+        cache.put_many("v1", "c", ["a"], [0.1], [0.2])
+
+        assert not cache.enabled
+        assert cache.get_many("v1", "c", ["a"]) == [None]
+        assert len(cache) == 0
+
+    def test_text_hash(self):
+        """Testa hash compacto e determinístico"""
+        assert text_hash("vaga python") == text_hash("vaga python")
+        assert text_hash("vaga python") != text_hash("vaga java")
+        assert len(text_hash("vaga python")) == 16
@@ -0,0 +1,104 @@
+"""
+Testes para a serialização rápida e negociação de formato
+"""
+import json
+import numpy as np
+import pytest
+
+from app.serialization import (
+    negotiate, rank_matches, prediction_response, encode_scores, decode_scores,
+    MEDIA_JSON, MEDIA_MSGPACK, MEDIA_SCORES, SCORES_LAYOUT
+)
+
+class TestNegotiate:
+    """Testes para a escolha do formato pelo header Accept"""
+
+    def test_defaults_to_json(self):
+        assert negotiate(None) == MEDIA_JSON
+        assert negotiate("*/*") == MEDIA_JSON
+        assert negotiate("text/html") == MEDIA_JSON
+
+    def test_binary_scores(self):
+        assert negotiate("application/octet-stream") == MEDIA_SCORES
+
+    def test_quality_order(self):
+        """Testa que o formato com maior q vence"""
+        assert negotiate("application/json;q=0.5, application/octet-stream") == MEDIA_SCORES
+        assert negotiate("application/octet-stream;q=0.1, application/json") == MEDIA_JSON
+        assert negotiate("application/octet-stream;q=0, */*;q=0.1") == MEDIA_JSON
+
+    def test_msgpack(self):
+        pytest.importorskip("msgpack")
+        assert negotiate("application/x-msgpack, application/json;q=0.9") == MEDIA_MSGPACK
+
+class TestRankMatches:
+    """Testes para threshold, ordenação e top_k sobre arrays"""
+
+    def reference(self, ml_scores, threshold, top_k):
+        # Comportamento anterior: filtro, sort estável decrescente e corte
+        positions = [i for i, score in enumerate(ml_scores) if score >= threshold]
+        positions.sort(key=lambda i: ml_scores[i], reverse=True)
+        return positions[:top_k]
+
+    def test_matches_sorted_reference(self):
+        rng = np.random.default_rng(0)
+        # Scores discretizados para forçar empates na fronteira do top_k
+        ml_scores = np.round(rng.random(1000), 2)
+
+        for threshold, top_k in [(0.0, 5), (0.5, 20), (0.9, 1000), (1.1, 5)]:
+            expected = self.reference(ml_scores.tolist(), threshold, top_k)
+            assert rank_matches(ml_scores, threshold, top_k).tolist() == expected
+
+    def test_empty(self):
+        assert rank_matches(np.array([]), 0.5, 5).tolist() == []
+
+class TestPredictionResponse:
+    """Testes para os formatos de resposta"""
+
+    @pytest.fixture
+    def columns(self):
+        return {
+            "job_indices": np.array([3, 0, 7]),
+            "similarity_scores": np.array([0.9, 0.5, 0.25]),
+            "ml_scores": np.array([0.8, 0.75, 0.5]),
+            "previews": ["vaga 3", "vaga 0", "vaga 7 ç"],
+        }
+
+    def test_json_schema(self, columns):
+        response = prediction_response(MEDIA_JSON, "candidato", processing_time_ms=1.5,
+                                       timestamp="2024-01-01T00:00:00", **columns)
+        data = json.loads(response.body)
+
+        assert response.media_type == MEDIA_JSON
+        assert response.headers["X-Result-Count"] == "3"
+        assert data["candidate_processed_text"] == "candidato"
+        assert data["processing_time_ms"] == 1.5
+        assert data["recommendations"][0] == {
+            "job_index": 3, "similarity_score": 0.9, "ml_score": 0.8, "job_preview": "vaga 3"
+        }
+        assert data["recommendations"][2]["job_preview"] == "vaga 7 ç"
+
+    def test_binary_round_trip(self, columns):
+        response = prediction_response(MEDIA_SCORES, "candidato", processing_time_ms=1.5,
+                                       timestamp="2024-01-01T00:00:00", **columns)
+        decoded = decode_scores(response.body)
+
+        assert response.headers["X-Score-Layout"] == SCORES_LAYOUT
+        assert len(response.body) == 3 * 12
+        assert decoded["job_index"].tolist() == [3, 0, 7]
+        np.testing.assert_allclose(decoded["similarity_score"], columns["similarity_scores"], rtol=1e-6)
+        np.testing.assert_allclose(decoded["ml_score"], columns["ml_scores"], rtol=1e-6)
+
+    def test_msgpack_columns(self, columns):
+        msgpack = pytest.importorskip("msgpack")
+        response = prediction_response(MEDIA_MSGPACK, "candidato", processing_time_ms=1.5,
+                                       timestamp="2024-01-01T00:00:00", **columns)
+        data = msgpack.unpackb(response.body)
+
+        assert data["job_index"] == [3, 0, 7]
+        assert data["job_preview"] == columns["previews"]
+        np.testing.assert_allclose(data["ml_score"], columns["ml_scores"], rtol=1e-6)
+
+    def test_encode_scores_empty(self):
+        assert encode_scores(np.array([]), np.array([]), np.array([])) == b""
+        assert decode_scores(b"")["ml_score"].size == 0
@@ -0,0 +1,131 @@
+"""
+Testes para o armazenamento de sessões de candidato
+"""
+import os
+import errno
+import tempfile
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.sessions import CandidateSessionStore
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def session_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield os.path.join(tmp_dir, "sessions")
+
+
+class TestCandidateSessionStore:
+    """Testes para registro, expiração e limpeza das sessões"""
+
+    def test_register_and_get(self, session_dir):
+        store = CandidateSessionStore(session_dir)
+        embedding = np.random.rand(384).astype(np.float32)
+
+        handle, session = store.register("desenvolvedor python", embedding)
+        loaded = store.get(handle)
+
+        assert loaded.text == "desenvolvedor python"
+        assert loaded.encoded is True
+        np.testing.assert_array_equal(loaded.embedding, embedding)
+        assert loaded.expires_at == pytest.approx(session.expires_at)
+
+    def test_text_stored_as_utf8(self, session_dir):
+        """Testa que o texto ocupa seus bytes UTF-8 no arquivo, não 4 bytes por caractere"""
+        store = CandidateSessionStore(session_dir)
+        text = "engenheiro de dados sênior " * 400
+
+        handle, _ = store.register(text, np.zeros(4))
+
+        assert store.get(handle).text == text
+        assert os.path.getsize(os.path.join(session_dir, f"{handle}.npz")) < 2 * len(text.encode("utf-8"))
+
+    def test_failed_write_removes_tmp(self, session_dir):
+        """Testa que um diretório sem espaço propaga o erro sem deixar o temporário"""
+        store = CandidateSessionStore(session_dir)
+
+        def savez_until_full(f, **arrays):
+            f.write(b"parcial")
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        with patch('app.sessions.np.savez', side_effect=savez_until_full):
+            with pytest.raises(OSError):
+                store.register("cv", np.zeros(4))
+
+        assert not os.listdir(session_dir)
+
+    def test_shared_between_workers(self, session_dir):
+        """Testa que outro processo (outra instância do store) encontra o handle"""
+        handle, _ = CandidateSessionStore(session_dir).register("cv", np.zeros(4), encoded=False)
+
+        session = CandidateSessionStore(session_dir).get(handle)
+
+        assert session is not None and session.encoded is False
+
+    def test_expired_session(self, session_dir):
+        clock = FakeClock()
+        store = CandidateSessionStore(session_dir, ttl=60, clock=clock)
+        handle, _ = store.register("cv", np.zeros(4))
+
+        clock.now += 61
+
+        assert store.get(handle) is None
+        assert not os.listdir(session_dir)
+
+    def test_invalid_handles(self, session_dir):
+        store = CandidateSessionStore(session_dir)
+        store.register("cv", np.zeros(4))
+
+        assert store.get("../../etc/passwd") is None
+        assert store.get("curto") is None
+        assert store.get("a" * 24) is None
+        assert not store.delete("../sessions")
+
+    def test_delete(self, session_dir):
+        store = CandidateSessionStore(session_dir)
+        handle, _ = store.register("cv", np.zeros(4))
+
+        assert store.delete(handle)
+        assert store.get(handle) is None
+        assert not store.delete(handle)
+
+    def test_sweep_removes_expired_and_oldest(self, session_dir):
+        clock = FakeClock()
+        store = CandidateSessionStore(session_dir, ttl=100, max_sessions=2, clock=clock)
+        expired, _ = store.register("cv 0", np.zeros(4))
+        clock.now += 50
+        handles = []
+        for i in range(3):
+            clock.now += 1
+            handles.append(store.register(f"cv {i + 1}", np.zeros(4))[0])
+        clock.now += 50
+
+        removed = store.sweep()
+
+        assert removed == 2
+        assert store.get(expired) is None and store.get(handles[0]) is None
+        assert store.get(handles[1]) is not None and store.get(handles[2]) is not None
+
+    def test_sweep_removes_abandoned_tmp(self, session_dir):
+        clock = FakeClock()
+        store = CandidateSessionStore(session_dir, ttl=100, clock=clock)
+        handle, _ = store.register("cv", np.zeros(4))
+        abandoned = os.path.join(session_dir, "abandonado.npz.123.tmp")
+        writing = os.path.join(session_dir, "gravando.npz.456.tmp")
+        for path, mtime in ((abandoned, clock.now - 200), (writing, clock.now)):
+            with open(path, "wb") as f:
+                f.write(b"parcial")
+            os.utime(path, (mtime, mtime))
+
+        assert store.sweep() == 1
+        assert sorted(os.listdir(session_dir)) == sorted([f"{handle}.npz", "gravando.npz.456.tmp"])
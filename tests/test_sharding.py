@@ -0,0 +1,208 @@
+"""
+Testes para o catálogo em shards (scatter-gather de top-k)
+"""
+import os
+import time
+import atexit
+import tempfile
+import threading
+import numpy as np
+import pytest
+import torch
+
+from app.network import JobCandidateMatchingNet
+from app.sharding import (
+    ShardScorer, ShardClient, ShardedCatalog, InProcessCatalog, LocalShardCluster,
+    shard_bounds, merge_top_k, parse_address, serve
+)
+
+DIM = 16
+AUTHKEY = b"test-authkey"
+
+@pytest.fixture
+def catalog():
+    rng = np.random.default_rng(0)
+    torch.manual_seed(0)
+    return rng.normal(size=(500, DIM)).astype(np.float32), JobCandidateMatchingNet(embedding_dim=DIM).eval()
+
+@pytest.fixture
+def query():
+    return np.random.default_rng(1).normal(size=DIM).astype(np.float32)
+
+@pytest.fixture
+def socket_dir():
+    # Os servidores de teste vivem até o fim do processo e removem os próprios sockets
+    return tempfile.mkdtemp(prefix="test-shards-")
+
+def start_server(scorer, address):
+    threading.Thread(target=serve, args=(scorer, address, AUTHKEY), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(address):
+            return address
+        time.sleep(0.01)
+    raise RuntimeError("servidor de teste não iniciou")
+
+def split_scorers(embeddings, model, num_shards):
+    return [ShardScorer(embeddings[start:end], start=start, model=model)
+            for start, end in shard_bounds(len(embeddings), num_shards)]
+
+class SlowScorer(ShardScorer):
+    def top_k(self, *args, **kwargs):
+        time.sleep(0.5)
+        return super().top_k(*args, **kwargs)
+
+class TestShardScorer:
+    """Testes para o top-k de uma faixa do catálogo"""
+
+    def test_shard_bounds(self):
+        bounds = shard_bounds(10, 3)
+
+        assert bounds[0][0] == 0 and bounds[-1][1] == 10
+        assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+
+    def test_parse_address(self):
+        assert parse_address("10.0.0.1:7100") == ("10.0.0.1", 7100)
+        assert parse_address("/tmp/shard-0.sock") == "/tmp/shard-0.sock"
+
+    def test_similarity_top_k_matches_brute_force(self, catalog, query):
+        embeddings, model = catalog
+        scorer = ShardScorer(embeddings, model=model)
+
+        result = scorer.top_k(query, 10, threshold=-1.0, score="similarity")
+
+        similarities = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+        assert result["indices"].tolist() == np.argsort(-similarities)[:10].tolist()
+        np.testing.assert_allclose(result["similarity_scores"], np.sort(similarities)[::-1][:10], rtol=1e-5)
+
+    def test_ml_top_k_matches_model(self, catalog, query):
+        embeddings, model = catalog
+        scorer = ShardScorer(embeddings, model=model, batch_size=64)
+
+        result = scorer.top_k(query, 5, threshold=0.0, score="ml")
+
+        with torch.no_grad():
+            expected = model(torch.from_numpy(np.tile(query, (len(embeddings), 1))),
+                             torch.from_numpy(embeddings)).numpy()[:, 0]
+        assert result["indices"].tolist() == np.argsort(-expected, kind="stable")[:5].tolist()
+        np.testing.assert_allclose(result["ml_scores"], np.sort(expected)[::-1][:5], rtol=1e-5)
+
+    def test_ml_requires_model(self, catalog, query):
+        scorer = ShardScorer(catalog[0])
+
+        with pytest.raises(ValueError):
+            scorer.top_k(query, 5, score="ml")
+
+    def test_merge_equals_single_shard(self, catalog, query):
+        """Testa que o merge dos top-k parciais é o top-k global"""
+        embeddings, model = catalog
+        expected = ShardScorer(embeddings, model=model).top_k(query, 20, 0.0, "ml")
+
+        partials = [scorer.top_k(query, 20, 0.0, "ml") for scorer in split_scorers(embeddings, model, 4)]
+        indices, _, ml_scores = merge_top_k(partials, 20, "ml")
+
+        assert indices.tolist() == expected["indices"].tolist()
+        np.testing.assert_allclose(ml_scores, expected["ml_scores"])
+
+class TestShardedCatalog:
+    """Testes para o coordenador com shards atendendo por socket"""
+
+    def test_matches_in_process(self, catalog, query, socket_dir):
+        embeddings, model = catalog
+        addresses = [start_server(scorer, os.path.join(socket_dir, f"shard-{i}.sock"))
+                     for i, scorer in enumerate(split_scorers(embeddings, model, 3))]
+        sharded = ShardedCatalog.connect(addresses, AUTHKEY, deadline=5.0)
+
+        expected = InProcessCatalog(ShardScorer(embeddings, model=model)).top_k(query, 15, 0.0, "ml")
+        result = sharded.top_k(query, 15, 0.0, "ml")
+
+        assert not result.partial
+        assert result.shards == 3
+        assert result.indices.tolist() == expected.indices.tolist()
+
+        # Conexões reaproveitadas entre consultas
+        assert sharded.top_k(query, 15, 0.0, "ml").indices.tolist() == expected.indices.tolist()
+
+    def test_partial_result_on_deadline(self, catalog, query, socket_dir):
+        """Testa que um shard lento fica de fora sem atrasar a resposta"""
+        embeddings, model = catalog
+        scorers = split_scorers(embeddings, model, 2)
+        slow = SlowScorer(scorers[1].embeddings, start=scorers[1].start, model=model)
+        addresses = [start_server(scorers[0], os.path.join(socket_dir, "fast.sock")),
+                     start_server(slow, os.path.join(socket_dir, "slow.sock"))]
+        failures = []
+        sharded = ShardedCatalog.connect(addresses, AUTHKEY, deadline=0.2)
+        sharded.on_shard_failure = failures.append
+
+        started = time.monotonic()
+        result = sharded.top_k(query, 10, 0.0, "ml")
+        elapsed = time.monotonic() - started
+
+        assert result.partial
+        assert result.missing_shards == [1]
+        assert failures == [1]
+        assert elapsed < 0.45
+        assert all(index < scorers[1].start for index in result.indices)
+
+    def test_unavailable_shards(self, catalog, query, socket_dir):
+        embeddings, model = catalog
+        alive = start_server(ShardScorer(embeddings, model=model), os.path.join(socket_dir, "alive.sock"))
+        missing = os.path.join(socket_dir, "missing.sock")
+
+        result = ShardedCatalog.connect([alive, missing], AUTHKEY).top_k(query, 5)
+        assert result.missing_shards == [1]
+
+        with pytest.raises(RuntimeError):
+            ShardedCatalog.connect([missing], AUTHKEY).top_k(query, 5)
+
+    def test_rejects_wrong_authkey(self, catalog, query, socket_dir):
+        embeddings, model = catalog
+        address = start_server(ShardScorer(embeddings, model=model), os.path.join(socket_dir, "shard.sock"))
+
+        with pytest.raises(RuntimeError):
+            ShardedCatalog([ShardClient(address, b"outra-chave")]).top_k(query, 5)
+
+class TestLocalShardCluster:
+    """Teste de ponta a ponta com shards como processos locais"""
+
+    def test_local_processes(self, catalog, query):
+        embeddings, model = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            embeddings_path = os.path.join(tmp_dir, "job_embeddings.npy")
+            model_path = os.path.join(tmp_dir, "job_matching_neural_model.pth")
+            np.save(embeddings_path, embeddings)
+            torch.save(model.state_dict(), model_path)
+
+            cluster = LocalShardCluster(embeddings_path, 2, model_path=model_path).start()
+            processes = list(cluster.processes)
+            try:
+                result = cluster.catalog(deadline=10.0).top_k(query, 10, 0.0, "ml")
+            finally:
+                cluster.stop()
+
+        expected = ShardScorer(embeddings, model=model).top_k(query, 10, 0.0, "ml")
+        assert not result.partial
+        assert result.indices.tolist() == expected["indices"].tolist()
+        assert all(process.poll() is not None for process in processes)
+
+    def test_forked_worker_does_not_stop_shards(self, catalog, query):
+        """Testa que um worker criado por fork do master (preload) não encerra os shards ao sair"""
+        embeddings, _ = catalog
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            embeddings_path = os.path.join(tmp_dir, "job_embeddings.npy")
+            np.save(embeddings_path, embeddings)
+            cluster = LocalShardCluster(embeddings_path, 1).start()
+            try:
+                pid = os.fork()
+                if pid == 0:
+                    # Worker: roda os handlers de atexit herdados (inclusive cluster.stop) e sai
+                    try:
+                        atexit._run_exitfunctions()
+                    finally:
+                        os._exit(0)
+                _, status = os.waitpid(pid, 0)
+
+                assert os.waitstatus_to_exitcode(status) == 0
+                assert all(process.poll() is None for process in cluster.processes)
+                assert cluster.catalog(deadline=10.0).top_k(query, 5, 0.0, "similarity").shards == 1
+            finally:
+                cluster.stop()
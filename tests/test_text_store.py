@@ -0,0 +1,103 @@
+"""
+Testes para o store compacto de textos
+"""
+import os
+import tempfile
+import joblib
+import numpy as np
+import pytest
+
+from app.serialization import job_preview
+from app.text_store import TextStore, load_text_store, main, write_text_store
+
+IDS = ["5185", "42", "10001", "7", "a-13"]
+TEXTS = ["vaga python sênior", "", "analista sap " * 40, "ção" * 150, "java"]
+
+@pytest.fixture
+def store_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "job_texts")
+        write_text_store(path, zip(IDS, TEXTS))
+        yield path
+
+class TestTextStore:
+    """Testes para leitura por linha, preview e busca por id"""
+
+    def test_texts_and_ids(self, store_dir):
+        store = TextStore.open(store_dir)
+
+        assert len(store) == len(IDS)
+        assert [store.text(row) for row in range(len(store))] == TEXTS
+        assert [store.id(row) for row in range(len(store))] == IDS
+        assert isinstance(store.blob, np.memmap)
+
+    def test_preview_matches_job_preview(self, store_dir):
+        """Testa o preview lido do começo do blob, inclusive com UTF-8 multibyte"""
+        store = TextStore.open(store_dir)
+
+        assert [store.preview(row) for row in range(len(store))] == [job_preview(text) for text in TEXTS]
+
+    def test_row_lookup(self, store_dir):
+        store = TextStore.open(store_dir)
+
+        assert [store.row(record_id) for record_id in IDS] == list(range(len(IDS)))
+        assert store.row("999") is None
+        assert store.row("um-id-maior-que-todos-os-outros") is None
+        assert store.row(5185) == 0
+
+    def test_out_of_range(self, store_dir):
+        store = TextStore.open(store_dir)
+
+        with pytest.raises(IndexError):
+            store.text(len(IDS))
+        with pytest.raises(IndexError):
+            store.id(-1)
+
+    def test_in_memory_equals_file(self, store_dir):
+        in_memory = TextStore.from_texts(IDS, TEXTS)
+        on_disk = TextStore.open(store_dir)
+
+        assert list(in_memory.texts()) == list(on_disk.texts())
+        assert in_memory.row("a-13") == on_disk.row("a-13") == 4
+
+    def test_rewrite_replaces_store(self, store_dir):
+        write_text_store(store_dir, [("1", "nova vaga")])
+
+        store = TextStore.open(store_dir)
+        assert list(store.texts()) == ["nova vaga"]
+        assert not os.path.exists(store_dir + ".tmp")
+
+    def test_empty_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "job_texts")
+            write_text_store(path, [])
+            store = TextStore.open(path)
+
+            assert len(store) == 0
+            assert store.row("1") is None
+
+class TestConversion:
+    """Testes para a conversão dos artefatos em joblib"""
+
+    def test_convert_and_load(self):
+        records = [{"job_id": record_id, "text": text.upper(), "processed_text": text}
+                   for record_id, text in zip(IDS, TEXTS)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            legacy = os.path.join(tmp_dir, "job_texts_processed.joblib")
+            joblib.dump(records, legacy)
+
+            # Sem o store, o joblib é compactado em memória
+            fallback = load_text_store(tmp_dir, "job")
+            assert fallback.row("42") == 1
+
+            assert main(["--input", legacy, "--output", os.path.join(tmp_dir, "job_texts")]) == 0
+            store = load_text_store(tmp_dir, "job")
+
+            assert isinstance(store.blob, np.memmap)
+            assert list(store.texts()) == TEXTS
+            assert store.id(2) == "10001"
+
+    def test_missing_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with pytest.raises(FileNotFoundError):
+                load_text_store(tmp_dir, "candidate")
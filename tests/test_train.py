@@ -0,0 +1,126 @@
+"""
+Testes para o amostrador de pares em blocos e o treino
+"""
+import io
+import os
+import tempfile
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import DataLoader
+
+from app.network import JobCandidateMatchingNet
+from app.train import BlockedPairSampler, train
+
+DIM = 16
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return (rng.normal(size=(230, DIM)).astype(np.float32),
+            rng.normal(size=(150, DIM)).astype(np.float32))
+
+def cosine(a, b):
+    return (a @ b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+def collect(sampler, workers=0):
+    pairs = []
+    loader = DataLoader(sampler, batch_size=None, num_workers=workers)
+    for candidate_emb, job_emb, labels in loader:
+        pairs.extend(zip(candidate_emb.numpy(), job_emb.numpy(), labels.numpy()[:, 0]))
+    return pairs
+
+class TestBlockedPairSampler:
+    """Testes para a amostragem sem matriz de similaridade completa"""
+
+    def test_labels_follow_threshold(self, embeddings):
+        """Testa rótulo 1 exatamente para similaridade acima do threshold"""
+        candidates, jobs = embeddings
+        sampler = BlockedPairSampler(candidates, jobs, threshold=0.2, block_size=50, job_block_size=32,
+                                     pairs_per_block=10, batch_size=8)
+
+        pairs = collect(sampler)
+
+        assert pairs
+        for candidate, job, label in pairs:
+            assert label == float(cosine(candidate, job) > 0.2)
+
+    def test_block_sample_sizes(self, embeddings):
+        """Testa até pairs_per_block positivos e negativos, sem repetição"""
+        candidates, jobs = embeddings
+        sampler = BlockedPairSampler(candidates, jobs, threshold=0.2, block_size=50, job_block_size=32,
+                                     pairs_per_block=10)
+
+        pairs, labels = sampler.sample_block(candidates, jobs, 0, np.random.default_rng(0))
+
+        assert (labels == 1).sum() == 10
+        assert (labels == 0).sum() == 10
+        assert len({tuple(p) for p in pairs}) == 20
+        assert pairs[:, 0].min() >= 0 and pairs[:, 0].max() < 50
+
+    def test_uniform_across_job_blocks(self, embeddings):
+        """Testa que os pares vêm de todas as vagas, não só dos primeiros blocos"""
+        candidates, jobs = embeddings
+        sampler = BlockedPairSampler(candidates, jobs, threshold=2.0, block_size=230, job_block_size=16,
+                                     pairs_per_block=3000)
+        rng = np.random.default_rng(1)
+
+        columns = np.concatenate([sampler.sample_block(candidates, jobs, 0, rng)[0][:, 1] for _ in range(5)])
+        counts = np.bincount(columns, minlength=jobs.shape[0])
+
+        # 15000 pares / 150 vagas = 100 esperados por vaga
+        assert counts.min() > 60 and counts.max() < 140
+
+    def test_workers_split_blocks(self, embeddings):
+        """Testa que workers do DataLoader não repetem blocos"""
+        candidates, jobs = embeddings
+        args = dict(threshold=0.2, block_size=20, job_block_size=64, pairs_per_block=5, batch_size=4)
+
+        single = collect(BlockedPairSampler(candidates, jobs, **args))
+        multi = collect(BlockedPairSampler(candidates, jobs, **args), workers=2)
+
+        assert len(single) == len(multi) == 12 * 10
+
+    def test_validation_split(self, embeddings):
+        """Testa blocos de validação disjuntos dos de treino"""
+        candidates, jobs = embeddings
+        train_set = BlockedPairSampler(candidates, jobs, block_size=20, validation_every=4, split="train")
+        validation_set = BlockedPairSampler(candidates, jobs, block_size=20, validation_every=4, split="validation")
+
+        assert validation_set.blocks == [3, 7, 11]
+        assert not set(train_set.blocks) & set(validation_set.blocks)
+        assert len(train_set.blocks) + len(validation_set.blocks) == 12
+
+    def test_epochs_resample(self, embeddings):
+        """Testa que cada época sorteia outros pares"""
+        candidates, jobs = embeddings
+        sampler = BlockedPairSampler(candidates, jobs, threshold=0.2, block_size=50, pairs_per_block=10)
+
+        first = np.stack([candidate for candidate, _, _ in collect(sampler)])
+        sampler.set_epoch(1)
+        second = np.stack([candidate for candidate, _, _ in collect(sampler)])
+
+        assert first.shape == second.shape
+        assert not np.array_equal(first, second)
+
+class TestTrain:
+    """Testes para o loop de treino e o artefato gerado"""
+
+    def test_writes_loadable_state_dict(self, embeddings):
+        candidates, jobs = embeddings
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            candidate_path = os.path.join(tmp_dir, "candidate_embeddings.npy")
+            job_path = os.path.join(tmp_dir, "job_embeddings.npy")
+            np.save(candidate_path, candidates)
+            np.save(job_path, jobs)
+            output = os.path.join(tmp_dir, "job_matching_neural_model.pth")
+
+            result = train(candidate_path, job_path, output, epochs=2, workers=2, block_size=20,
+                           pairs_per_block=10, validation_every=4, stream=io.StringIO())
+
+            model = JobCandidateMatchingNet(embedding_dim=DIM)
+            model.load_state_dict(torch.load(output, map_location="cpu"))
+
+        assert len(result["epochs"]) == 2
+        assert result["epochs"][0]["pairs"] > 0
+        assert 0.0 <= result["epochs"][-1]["validation"]["accuracy"] <= 1.0